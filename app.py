@@ -3,10 +3,27 @@ import streamlit as st
 import numpy as np
 import pandas as pd
 from src.ui.sidebar import render_sidebar
-from src.ui.visualization import plot_geometry, plot_impedance_interactive, plot_phase_interactive
+from src.ui.visualization import (plot_comparison, plot_geometry, plot_impedance_interactive, plot_phase_interactive,
+                                  plot_sensitivity_heatmap, plot_temperature_sweep)
 from src.simulation.physics import SimulationEngine
+from src.simulation.cache import ImpedanceCache
+from src.simulation.fingerings import peak_table
+from src.simulation.comparison import ComparisonStore
+from src.simulation.archive import ArchivedResult, result_to_bytes
+from src.simulation.sweep import run_sweep, sweep_points
+from src.simulation.jacobian import geometry_parameters, resonance_jacobian
+from src.simulation.playing import PlayingSimulation
+from src.simulation.environment import temperature_sweep
+from src.models.diff import diff_designs
 from src.optimization.optimizer import Optimizer
+from src.ui.jobs import get_job_manager, render_job_progress, submit_job
+from src.ui.performance import keep_trace, new_trace, render_performance_panel
+from src.instrumentation import recording
+import copy
+import hashlib
 import io
+import json
+import os
 
 # Set page config at the very top
 st.set_page_config(
@@ -43,7 +60,131 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_impedance_cache():
+    """Process-wide impedance cache shared by all reruns and sessions, persisted to disk."""
+    return ImpedanceCache(max_entries=256, cache_dir=".cache/impedance")
+
+def get_simulation_engine(temperature):
+    """Creates a SimulationEngine bound to the shared impedance cache, using the sidebar's solver."""
+    sim = SimulationEngine(cache=get_impedance_cache())
+    sim.temperature = temperature
+    sim.backend = st.session_state.get('solver_backend', 'fem')
+    return sim
+
+# Jobs fingerprinted with the page's engine.cache_key; the others carry their own fingerprint
+PAGE_JOBS = ('simulation', 'optimization', 'jacobian', 'sweep')
+
+def _drop_stale_jobs(jobs, fingerprint, kinds):
+    for stale in jobs.drop_stale(fingerprint, kinds):
+        if stale.active:
+            st.toast(f"Geometry changed: cancelled the running {stale.kind}.")
+
+def _temperature_fingerprint(engine, clarinet):
+    """Fingerprint of a temperature sweep: the page's, without the sidebar temperature it never uses."""
+    reference = SimulationEngine.from_config({**engine.config(), "temperature": 25.0}, cache=engine.cache)
+    return reference.cache_key(clarinet)
+
+def _playing_fingerprint(clarinet, temperature, losses, sample_rate):
+    """Fingerprint of a playing run: the temporal solver ignores the solver backend and frequency grid."""
+    return ImpedanceCache.make_key(clarinet.bore_array(), clarinet.holes_array(), temperature, losses, [],
+                                   sample_rate=sample_rate, fingerings=clarinet.fingerings)
+
+def _dedup_key(kind, fingerprint, **params):
+    """Identifies a background request, so identical ones from several sessions share one run."""
+    return f"{kind}:{fingerprint}:" + json.dumps(params, sort_keys=True, default=str)
+
+def _simulation_job(job, sim, clarinet):
+    """Background work: streaming impedance solve, publishing each partial curve."""
+    for update in sim.iter_impedance_simulation(clarinet):
+        job.partial = update
+        job.report(len(update.frequencies), update.total)
+    return update.frequencies, update.impedance
+
+def _preview_sweep(update):
+    """Live view of a running sweep: the curve so far and the resonances already bracketed."""
+    plot_impedance_interactive(update.frequencies, update.impedance, title="Input Impedance (solving...)")
+    if len(update.peaks):
+        st.dataframe(pd.DataFrame({
+            "Frequency (Hz)": update.peaks.frequency,
+            "Magnitude (dB)": update.peaks.magnitude_db,
+        }), use_container_width=True)
+
+def _optimization_job(job, sim, clarinet, target_freq, hole_idx, surrogate):
+    """Background work: single-hole tuning reporting simulations run."""
+    res = Optimizer(clarinet, sim).tune_hole_position(target_freq, hole_idx, surrogate=surrogate,
+                                                     progress=job.report)
+    return {**res, 'hole_index': hole_idx}
+
+def _sweep_job(job, sim, points):
+    """Background work: design sweep reporting designs done."""
+    return run_sweep(points, sim, progress=job.report)
+
+def _jacobian_job(job, sim, clarinet, n_modes, parameters):
+    """Background work: resonance Jacobian reporting perturbed designs done."""
+    return resonance_jacobian(sim, clarinet, n_modes=n_modes, parameters=parameters, progress=job.report)
+
+def _temperature_job(job, sim, clarinet, temperatures, method):
+    """Background work: temperature sweep reporting exact solves done."""
+    return temperature_sweep(sim, clarinet, temperatures, method=method, progress=job.report)
+
+def _playing_job(job, clarinet, note, temperature, losses, sample_rate, duration, path):
+    """Background work: time-domain playing written to a WAV file, publishing each chunk."""
+    player = PlayingSimulation(clarinet, note, temperature=temperature, losses=losses, sample_rate=sample_rate)
+
+    def on_chunk(chunk):
+        job.partial = chunk
+        job.report(chunk.stop, chunk.total)
+    return player.write_wav(path, duration, on_chunk=on_chunk)
+
+def _preview_playing(chunk):
+    """Live view of a running playing simulation: the latest chunk of sound and the speed so far."""
+    st.caption(f"{chunk.stop / chunk.sample_rate:.2f} s of {chunk.total / chunk.sample_rate:.2f} s played, "
+               f"{chunk.real_time_factor:.0f}x slower than real time. Latest chunk:")
+    st.audio(chunk.radiated, sample_rate=chunk.sample_rate)
+
+def _sweep_parameter_label(clarinet, name):
+    if name == "temperature":
+        return "Temperature"
+    table, index, field = name.split(".")
+    if table == "bore":
+        return f"Bore @ {clarinet.bore[int(index)].position:.3f} m {field}"
+    return f"{clarinet.holes[int(index)].label} {field}"
+
+def _store_results(freqs, imp, clarinet, temperature, key):
+    """Keeps a solved impedance together with the design state it belongs to."""
+    st.session_state['freqs'] = freqs
+    st.session_state['imp'] = imp
+    st.session_state['sim_done'] = True
+    st.session_state['result_key'] = key
+    st.session_state['result_design'] = (copy.deepcopy(clarinet), temperature)
+
+def _refresh_fingering_table(clarinet, temperature):
+    """
+    Drops fingering results invalidated since they were computed: all of them
+    if the geometry or temperature changed, otherwise only edited or removed
+    notes. Label-only edits keep everything.
+    """
+    if not st.session_state.get('fingering_table'):
+        return
+    old_design, old_temp = st.session_state['fingering_design']
+    diff = diff_designs(old_design, clarinet, old_temp, temperature)
+    if diff.is_noop:
+        return
+    if diff.physics_changed:
+        st.session_state['fingering_table'] = []
+    else:
+        dropped = set(diff.fingerings_changed) | set(diff.fingerings_removed)
+        st.session_state['fingering_table'] = [row for row in st.session_state['fingering_table']
+                                               if row["Note"] not in dropped]
+    st.session_state['fingering_design'] = (copy.deepcopy(clarinet), temperature)
+
 def main():
+    # Chart timings of this rerun, shown in the Performance panel
+    with recording(name="page") as page:
+        _render_page(page)
+
+def _render_page(page):
     # Header
     st.markdown('<div class="main-header">Clarinet R&D Prototyping Lab</div>', unsafe_allow_html=True)
     st.markdown('<div class="sub-header">Advanced Acoustic Simulation & Optimization Environment</div>', unsafe_allow_html=True)
@@ -51,6 +192,13 @@ def main():
     # Sidebar & Model Creation
     clarinet, temperature = render_sidebar()
 
+    # One engine per rerun, for the page and the jobs it starts
+    engine = get_simulation_engine(temperature)
+    jobs = get_job_manager()
+    fingerprint = engine.cache_key(clarinet)
+    # Background jobs started for a previous geometry are cancelled and discarded
+    _drop_stale_jobs(jobs, fingerprint, PAGE_JOBS)
+
     # Session State Initialization for Analysis
     if 'freqs' not in st.session_state:
         st.session_state['freqs'] = None
@@ -59,13 +207,26 @@ def main():
     if 'sim_done' not in st.session_state:
         st.session_state['sim_done'] = False
 
-    # Reference Trace for Comparison
-    if 'ref_freqs' not in st.session_state:
-        st.session_state['ref_freqs'] = None
-    if 'ref_imp' not in st.session_state:
-        st.session_state['ref_imp'] = None
-    if 'ref_name' not in st.session_state:
-        st.session_state['ref_name'] = None
+    # Results remember the design they were computed for; when the design
+    # has changed since, reuse a cached result or flag them as stale.
+    stale_summary = None
+    if st.session_state.get('sim_done') and st.session_state.get('result_key') != fingerprint:
+        hit = None
+        # Looked up once per design: a miss on every rerun would skew the cache counters
+        if st.session_state.get('result_lookup') != fingerprint:
+            st.session_state['result_lookup'] = fingerprint
+            hit = get_impedance_cache().get(fingerprint)
+        if hit is not None:
+            _store_results(*hit, clarinet, temperature, fingerprint)
+        else:
+            old_design, old_temp = st.session_state['result_design']
+            stale_summary = diff_designs(old_design, clarinet, old_temp, temperature).summary()
+    _refresh_fingering_table(clarinet, temperature)
+
+    # Stored results for the Compare Designs tab
+    if 'comparison_store' not in st.session_state:
+        st.session_state['comparison_store'] = ComparisonStore()
+    store = st.session_state['comparison_store']
 
     # Main Tabs
     tab1, tab2, tab3 = st.tabs(["📊 Dashboard", "🔬 Detailed Analysis", "⚖️ Compare Designs"])
@@ -82,31 +243,37 @@ def main():
                 st.json({
                     "Bore Points": len(clarinet.bore),
                     "Tone Holes": len(clarinet.holes),
-                    "Total Length (m)": f"{clarinet.get_bore_list()[-1][0]:.4f}" if clarinet.bore else "0.0000"
+                    "Total Length (m)": f"{clarinet.bore.positions[-1]:.4f}" if clarinet.bore else "0.0000"
                 })
 
         with col2:
             st.markdown("### Simulation Control")
 
-            if st.button("🚀 Run Physics Simulation", type="primary", use_container_width=True):
-                with st.spinner("Computing Finite Element Model (FEM)..."):
-                    sim = SimulationEngine()
-                    sim.temperature = temperature
-
-                    try:
-                        freqs, imp = sim.run_impedance_simulation(clarinet)
+            sim_job = jobs.get('simulation')
+            if sim_job is not None and not sim_job.active:
+                # Pick up the result of a finished background solve
+                jobs.pop('simulation')
+                keep_trace(sim_job)
+                if sim_job.finished_ok:
+                    _store_results(*sim_job.result, clarinet, temperature, fingerprint)
+                    stale_summary = None
+                    st.success(f"Simulation completed successfully ({sim_job.elapsed:.1f}s).")
+                elif sim_job.status == "failed":
+                    st.error(f"Simulation Failed: {sim_job.error}")
+                else:
+                    st.info("Simulation cancelled.")
 
-                        # Store results
-                        st.session_state['freqs'] = freqs
-                        st.session_state['imp'] = imp
-                        st.session_state['sim_done'] = True
-                        st.success("Simulation completed successfully.")
+            if st.button("🚀 Run Physics Simulation", type="primary", use_container_width=True):
+                submit_job('simulation', _simulation_job, engine, copy.deepcopy(clarinet), fingerprint=fingerprint,
+                           trace=new_trace('simulation'), dedup_key=_dedup_key('simulation', fingerprint))
 
-                    except Exception as e:
-                        st.error(f"Simulation Failed: {e}")
+            render_job_progress('simulation', "Computing Finite Element Model (FEM)", "frequencies",
+                                preview=_preview_sweep)
 
             if st.session_state.get('sim_done'):
                 st.markdown("### Key Results")
+                if stale_summary:
+                    st.warning(f"These results are for a previous design ({stale_summary}). Run the simulation again.")
                 freqs = st.session_state['freqs']
                 imp = st.session_state['imp']
 
@@ -114,8 +281,7 @@ def main():
                 plot_impedance_interactive(freqs, imp, title="Input Impedance Magnitude")
 
                 # Peak Detection
-                sim_engine = SimulationEngine()
-                peaks = sim_engine.detect_peaks(freqs, imp)
+                peaks = engine.detect_peaks(freqs, imp)
 
                 if len(peaks) > 0:
                     st.markdown("#### Detected Resonances")
@@ -128,10 +294,11 @@ def main():
     # --- TAB 2: DETAILED ANALYSIS ---
     with tab2:
         if st.session_state.get('sim_done'):
+            if stale_summary:
+                st.warning(f"These results are for a previous design ({stale_summary}).")
             freqs = st.session_state['freqs']
             imp = st.session_state['imp']
-            sim_engine = SimulationEngine()
-            peaks = sim_engine.detect_peaks(freqs, imp)
+            peaks = engine.detect_peaks(freqs, imp)
 
             col_a, col_b = st.columns([2, 1])
 
@@ -167,22 +334,45 @@ def main():
                     else:
                         hole_selection = st.selectbox("Select Hole to Tune", hole_options)
 
+                    use_surrogate = st.checkbox(
+                        "Use surrogate model",
+                        help="Fit a response surface from a few solves and confirm its optimum, instead of solving at every search step."
+                    )
+
+                    opt_job = jobs.get('optimization')
+                    if opt_job is not None and not opt_job.active:
+                        jobs.pop('optimization')
+                        keep_trace(opt_job)
+                        res = opt_job.result
+                        if opt_job.finished_ok and res['success']:
+                            st.session_state['opt_notice'] = (
+                                f"Converged! New Position: {res['new_position']:.4f} m, "
+                                f"frequency error {res['error']:.4f} Hz after {res['solves']} simulations"
+                                + (f", about {res['solves_saved']} saved by the surrogate "
+                                   f"(fit error {res['surrogate_rms_cents']:.1f} cents)" if 'solves_saved' in res else "")
+                            )
+
+                            # Update Session State
+                            st.session_state['holes_config'][res['hole_index']]['pos'] = res['new_position']
+                            st.rerun()
+                        elif opt_job.status == "cancelled":
+                            st.info("Optimization cancelled.")
+                        elif opt_job.status == "failed":
+                            st.error(f"Optimization failed: {opt_job.error}")
+                        else:
+                            st.error("Optimization failed to converge. Try a closer target or different hole.")
+
                     if hole_selection and st.button("Optimize Position"):
                         hole_idx = int(hole_selection.split(":")[0])
+                        submit_job('optimization', _optimization_job, engine, copy.deepcopy(clarinet), target_freq,
+                                   hole_idx, use_surrogate, fingerprint=fingerprint, trace=new_trace('optimization'),
+                                   dedup_key=_dedup_key('optimization', fingerprint, target=target_freq,
+                                                        hole=hole_idx, surrogate=use_surrogate))
 
-                        with st.spinner("Running Optimization Loop..."):
-                            opt = Optimizer(clarinet, sim_engine)
-                            res = opt.tune_hole_position(target_freq, hole_idx)
+                    render_job_progress('optimization', "Running Optimization Loop", "simulations")
 
-                            if res['success']:
-                                st.success(f"Converged! New Position: {res['new_position']:.4f} m")
-                                st.metric("Frequency Error", f"{res['error']:.4f} Hz")
-
-                                # Update Session State
-                                st.session_state['holes_config'][hole_idx]['pos'] = res['new_position']
-                                st.rerun()
-                            else:
-                                st.error("Optimization failed to converge. Try a closer target or different hole.")
+                    if st.session_state.get('opt_notice'):
+                        st.success(st.session_state.pop('opt_notice'))
 
                 # --- EXPORT ---
                 st.divider()
@@ -198,16 +388,269 @@ def main():
                 })
 
                 csv = df_export.to_csv(index=False).encode('utf-8')
-                st.download_button(
+                col_csv, col_npz = st.columns(2)
+                col_csv.download_button(
                     label="📥 Download Simulation Data (CSV)",
                     data=csv,
                     file_name="simulation_results.csv",
                     mime="text/csv"
                 )
 
+                # Binary bundle of the result and the design/settings it was computed for
+                result_design, result_temp = st.session_state['result_design']
+                bundle = ArchivedResult.from_simulation(get_simulation_engine(result_temp), result_design, freqs, imp)
+                col_npz.download_button(
+                    label="📦 Download Result Bundle (NPZ)",
+                    data=result_to_bytes(bundle),
+                    file_name="simulation_result.npz",
+                    mime="application/octet-stream",
+                    help="Geometry, solver settings, complex impedance and peaks in one file (numpy.load)."
+                )
+
+            # --- FINGERING CHART ---
+            st.divider()
+            st.subheader("🎼 Fingering Chart Analysis")
+            if not clarinet.fingerings:
+                st.info("Add fingerings in the sidebar to simulate every note of the chart.")
+            else:
+                missing = [n for n in clarinet.fingerings
+                           if n not in {row["Note"] for row in st.session_state.get('fingering_table') or []}]
+                if st.session_state.get('fingering_table') and missing:
+                    st.caption(f"Not simulated yet: {', '.join(missing)}")
+                if missing and st.button("Simulate Fingerings"):
+                    # Notes already in the table (or in the cache) are not solved again
+                    with st.spinner(f"Solving {len(missing)} fingerings..."):
+                        try:
+                            results = engine.simulate_fingerings(clarinet, notes=missing)
+                            rows = {row["Note"]: row for row in st.session_state.get('fingering_table') or []}
+                            rows.update({row["Note"]: row for row in peak_table(results)})
+                            st.session_state['fingering_table'] = [rows[n] for n in clarinet.fingerings]
+                            st.session_state['fingering_design'] = (copy.deepcopy(clarinet), temperature)
+                        except Exception as e:
+                            st.error(f"Fingering simulation failed: {e}")
+
+            if st.session_state.get('fingering_table'):
+                st.dataframe(pd.DataFrame(st.session_state['fingering_table']), use_container_width=True)
+
         else:
             st.info("Run a simulation in the Dashboard to view detailed analysis.")
 
+        # --- RESONANCE SENSITIVITY ---
+        st.divider()
+        st.subheader("🎯 Resonance Sensitivity")
+        st.caption("Cents each resonance moves per millimetre of every dimension"
+                   + (", for every fingering of the chart." if clarinet.fingerings else ", all holes open."))
+        groups = {"Hole positions": ("hole", "position"), "Hole radii": ("hole", "radius"),
+                  "Chimneys": ("hole", "chimney"), "Bore radii": ("bore", "radius")}
+        c_groups, c_modes = st.columns([3, 1])
+        chosen = c_groups.multiselect("Dimensions", list(groups), default=list(groups), key="jacobian_groups")
+        n_modes = c_modes.number_input("Modes", min_value=1, max_value=6, value=3, key="jacobian_modes")
+        wanted = {groups[g] for g in chosen}
+        jacobian_params = [name for name in geometry_parameters(clarinet)
+                           if (name.split(".")[0], name.split(".")[2]) in wanted]
+
+        jacobian_job = jobs.get('jacobian')
+        if jacobian_job is not None and not jacobian_job.active:
+            jobs.pop('jacobian')
+            keep_trace(jacobian_job)
+            if jacobian_job.finished_ok:
+                st.session_state['jacobian_result'] = (jacobian_job.result, copy.deepcopy(clarinet), fingerprint)
+            elif jacobian_job.status == "failed":
+                st.error(f"Sensitivity analysis failed: {jacobian_job.error}")
+
+        if jacobian_params and st.button("Compute Sensitivities"):
+            submit_job('jacobian', _jacobian_job, engine, copy.deepcopy(clarinet), int(n_modes), jacobian_params,
+                       fingerprint=fingerprint, trace=new_trace('jacobian'),
+                       dedup_key=_dedup_key('jacobian', fingerprint, modes=int(n_modes), parameters=jacobian_params,
+                                            fingerings=clarinet.fingerings))
+        render_job_progress('jacobian', "Differentiating resonances", "designs")
+
+        if st.session_state.get('jacobian_result'):
+            jacobian, jacobian_design, jacobian_key = st.session_state['jacobian_result']
+            if jacobian_key != fingerprint:
+                st.warning("These sensitivities were computed for an earlier design.")
+            labels = [_sweep_parameter_label(jacobian_design, name) for name in jacobian.parameters]
+            plot_sensitivity_heatmap(jacobian, labels)
+            table = pd.DataFrame(jacobian.cents * 1e-3, index=jacobian.row_labels, columns=labels)
+            with st.expander("Table (cents / mm)"):
+                st.dataframe(table.round(3), use_container_width=True)
+
+        # --- TEMPERATURE SWEEP ---
+        st.divider()
+        st.subheader("🌡️ Temperature Sweep")
+        st.caption("Resonances of the design (all holes open) across a range of air temperatures. "
+                   "Rescaled sweeps solve three temperatures and map the rest by the speed of sound.")
+        c_range, c_step, c_method = st.columns([3, 1, 2])
+        t_low, t_high = c_range.slider("Temperatures (°C)", 0, 40, (15, 35), key="temp_range")
+        t_step = c_step.number_input("Step (°C)", min_value=0.5, max_value=10.0, value=1.0, step=0.5, key="temp_step")
+        t_method = c_method.radio("Method", ["rescaled", "exact"], horizontal=True, key="temp_method",
+                                  format_func=lambda m: "Rescaled (fast)" if m == "rescaled" else "Exact")
+
+        temperature_fingerprint = _temperature_fingerprint(engine, clarinet)
+        _drop_stale_jobs(jobs, temperature_fingerprint, ['temperature'])
+        temperature_job = jobs.get('temperature')
+        if temperature_job is not None and not temperature_job.active:
+            jobs.pop('temperature')
+            keep_trace(temperature_job)
+            if temperature_job.finished_ok:
+                st.session_state['temperature_sweep'] = (temperature_job.result, copy.deepcopy(clarinet))
+            elif temperature_job.status == "failed":
+                st.error(f"Temperature sweep failed: {temperature_job.error}")
+
+        if st.button("Run Temperature Sweep"):
+            temperatures = np.arange(t_low, t_high + t_step / 2, t_step)
+            submit_job('temperature', _temperature_job, engine, copy.deepcopy(clarinet), temperatures, t_method,
+                       fingerprint=temperature_fingerprint, trace=new_trace('temperature'),
+                       dedup_key=_dedup_key('temperature', temperature_fingerprint,
+                                            temperatures=temperatures.tolist(), method=t_method))
+        render_job_progress('temperature', "Solving temperatures", "solves")
+
+        if st.session_state.get('temperature_sweep'):
+            t_sweep, swept_design = st.session_state['temperature_sweep']
+            if diff_designs(swept_design, clarinet).geometry_changed:
+                st.warning("This sweep was computed for an earlier design.")
+            t_modes = t_sweep.resonances(engine)
+            nearest = int(np.argmin(np.abs(t_sweep.temperatures - temperature)))
+            plot_temperature_sweep(t_sweep.temperatures, t_modes, nearest,
+                                   t_sweep.error_cents if t_sweep.method == "rescaled" else None)
+            summary = f"{len(t_sweep)} temperatures from {t_sweep.solves} exact solves in {t_sweep.elapsed:.1f}s"
+            if t_sweep.method == "rescaled":
+                summary += (f", rescaled from {t_sweep.reference:.1f} °C; estimated error up to "
+                            f"{t_sweep.error_cents.max():.2f} cents and {t_sweep.error_db.max():.2f} dB")
+            st.caption(summary)
+            table = pd.DataFrame(t_modes, columns=[f"Mode {m + 1} (Hz)" for m in range(t_modes.shape[1])])
+            table.insert(0, "Temperature (°C)", t_sweep.temperatures)
+            table["Solved"] = np.where(t_sweep.exact, "exact", "rescaled")
+            table["Error bound (cents)"] = t_sweep.error_cents
+            with st.expander("Table"):
+                st.dataframe(table.round(3), use_container_width=True, hide_index=True)
+
+        # --- PLAYING SIMULATION ---
+        st.divider()
+        st.subheader("🎵 Playing Simulation")
+        st.caption("Blows the design with a reed model in the time domain and records the radiated sound at 1 m. "
+                   "Expect roughly a minute of computation per second of sound.")
+        c_note, c_duration, c_rate, c_losses = st.columns([2, 2, 1, 1])
+        play_note = c_note.selectbox("Fingering", [None] + list(clarinet.fingerings), key="play_note",
+                                     format_func=lambda note: "All holes open" if note is None else note)
+        play_duration = c_duration.slider("Duration (s)", 0.1, 3.0, 0.5, 0.1, key="play_duration")
+        play_rate = c_rate.selectbox("Sample rate (Hz)", [22050, 44100, 48000], index=1, key="play_rate")
+        play_losses = c_losses.checkbox("Losses", key="play_losses",
+                                        help="Viscothermal losses: more realistic timbre, about 2-3x slower.")
+
+        play_fingerprint = _playing_fingerprint(clarinet, temperature, play_losses, play_rate)
+        _drop_stale_jobs(jobs, play_fingerprint, ['playing'])
+        playing_job = jobs.get('playing')
+        if playing_job is not None and not playing_job.active:
+            jobs.pop('playing')
+            keep_trace(playing_job)
+            if playing_job.finished_ok:
+                st.session_state['playing_result'] = (playing_job.result, playing_job.fingerprint)
+            elif playing_job.status == "failed":
+                st.error(f"Playing simulation failed: {playing_job.error}")
+
+        if st.button("Play Note"):
+            os.makedirs(".cache/audio", exist_ok=True)
+            name = "open" if play_note is None else "".join(c if c.isalnum() else "_" for c in play_note)
+            play_key = _dedup_key('playing', play_fingerprint, note=play_note, duration=play_duration)
+            # Named after the request, so different notes never write to the same file at once
+            path = os.path.join(".cache/audio", f"{hashlib.sha256(play_key.encode()).hexdigest()[:16]}_{name}.wav")
+            submit_job('playing', _playing_job, copy.deepcopy(clarinet), play_note, temperature, play_losses,
+                       play_rate, play_duration, path, fingerprint=play_fingerprint, trace=new_trace('playing'),
+                       dedup_key=play_key)
+        render_job_progress('playing', "Playing", "samples", preview=_preview_playing)
+
+        if st.session_state.get('playing_result'):
+            played, played_key = st.session_state['playing_result']
+            if played_key != play_fingerprint:
+                st.warning("This recording was made with an earlier design or other settings.")
+            st.audio(played.path)
+            # The resonance the note should sound near, if it has been computed for this design
+            resonance = None
+            if played_key == play_fingerprint and played.note is None and st.session_state.get('sim_done') \
+                    and not stale_summary:
+                found = engine.detect_peaks(st.session_state['freqs'], st.session_state['imp'])
+                resonance = found[0][0] if len(found) else None
+            elif played_key == play_fingerprint:
+                rows = {row["Note"]: row for row in st.session_state.get('fingering_table') or []}
+                resonance = rows.get(played.note, {}).get("Mode 1 (Hz)")
+            cents = 1200 * np.log2(played.sounding_frequency / resonance) \
+                if resonance and np.isfinite(played.sounding_frequency) else None
+            cols = st.columns(4)
+            cols[0].metric("Sounding pitch", f"{played.sounding_frequency:.1f} Hz",
+                           f"{cents:+.0f} cents vs. first resonance" if cents is not None else None,
+                           delta_color="off")
+            cols[1].metric("Level at 1 m", f"{20 * np.log10(max(played.rms_pressure, 2e-5) / 2e-5):.0f} dB SPL")
+            cols[2].metric("Real-time factor", f"{played.real_time_factor:.0f}x")
+            cols[3].metric("Duration", f"{played.duration:.2f} s")
+            if played.clipped:
+                st.caption(f"{played.clipped} samples exceeded the 2 Pa full scale of the WAV file and were clipped.")
+
+        # --- DESIGN SPACE EXPLORATION ---
+        st.divider()
+        st.subheader("🧭 Design Space Exploration")
+        param_options = ["temperature"] + [f"hole.{i}.{field}" for i in range(len(clarinet.holes))
+                                           for field in ("position", "radius", "chimney")]
+        sweep_params = st.multiselect("Parameters", param_options, key="sweep_params",
+                                      format_func=lambda name: _sweep_parameter_label(clarinet, name))
+        c_span, c_method, c_n = st.columns(3)
+        span = c_span.slider("Range (± % of each dimension, ± °C)", 1, 20, 5)
+        method = c_method.selectbox("Sampling", ["Latin hypercube", "Sobol", "Full factorial"])
+        factorial = method == "Full factorial"
+        n_samples = c_n.number_input("Levels per parameter" if factorial else "Designs",
+                                     min_value=2, max_value=256, value=3 if factorial else 16)
+
+        sweep_job = jobs.get('sweep')
+        if sweep_job is not None and not sweep_job.active:
+            jobs.pop('sweep')
+            keep_trace(sweep_job)
+            if sweep_job.finished_ok:
+                st.session_state['sweep_results'] = sweep_job.result
+            elif sweep_job.status == "failed":
+                st.error(f"Sweep failed: {sweep_job.error}")
+
+        if sweep_params and st.button("Run Sweep"):
+            ranges = {}
+            for name in sweep_params:
+                if name == "temperature":
+                    low, high = temperature - span, temperature + span
+                else:
+                    _, index, field = name.split(".")
+                    value = getattr(clarinet.holes[int(index)], field)
+                    low, high = value * (1 - span / 100), value * (1 + span / 100)
+                ranges[name] = {"start": low, "stop": high, "num": n_samples}
+            spec = {"method": "grid" if factorial else {"Latin hypercube": "lhs", "Sobol": "sobol"}[method],
+                    "samples": n_samples, "parameters": ranges}
+            try:
+                points = sweep_points(clarinet, spec)
+                submit_job('sweep', _sweep_job, engine, points, fingerprint=fingerprint, trace=new_trace('sweep'),
+                           dedup_key=_dedup_key('sweep', fingerprint, spec=spec))
+            except ValueError as e:
+                st.error(f"Invalid sweep: {e}")
+
+        render_job_progress('sweep', "Running Design Sweep", "designs")
+
+        sweep_results = st.session_state.get('sweep_results')
+        if sweep_results is not None:
+            table = sweep_results.table()
+            failed = sweep_results.status.count("failed")
+            st.caption(f"{len(sweep_results)} designs"
+                       + (f", {failed} failed" if failed else "")
+                       + f" around {sweep_results.points[0].clarinet.name.split(' [')[0]}")
+            st.dataframe(table.drop(columns=["key"]), use_container_width=True)
+
+            sensitivity = {}
+            for mode in (1, 2, 3):
+                try:
+                    sensitivity[f"Mode {mode} (cents / unit)"] = sweep_results.sensitivity(mode)
+                except ValueError:
+                    pass
+            if sensitivity:
+                st.markdown("##### Linear sensitivity")
+                st.dataframe(pd.DataFrame(sensitivity), use_container_width=True)
+            st.download_button("📥 Download Sweep Results (CSV)", table.to_csv(index=False).encode('utf-8'),
+                               file_name="sweep_results.csv", mime="text/csv")
+
     # --- TAB 3: COMPARE DESIGNS ---
     with tab3:
         st.subheader("Design Comparison")
@@ -215,40 +658,53 @@ def main():
         col_c, col_d = st.columns([3, 1])
 
         with col_d:
-            st.markdown("#### Reference Management")
-            if st.session_state.get('sim_done'):
-                if st.button("Set Current as Reference"):
-                    st.session_state['ref_freqs'] = st.session_state['freqs']
-                    st.session_state['ref_imp'] = st.session_state['imp']
-                    st.session_state['ref_name'] = f"Ref ({clarinet.name})"
-                    st.success("Reference trace set!")
+            st.markdown("#### Stored Designs")
+            if st.session_state.get('sim_done') and stale_summary is None:
+                store_name = st.text_input("Name", value=clarinet.name, key="store_name")
+                if st.button("Add Current Result"):
+                    key = st.session_state['result_key']
+                    existing = store.find(key)
+                    if existing is not None:
+                        st.info(f"This result is already stored as '{existing.name}'.")
+                    elif store_name in store:
+                        st.error(f"A design named '{store_name}' is already stored.")
+                    else:
+                        freqs, imp = st.session_state['freqs'], st.session_state['imp']
+                        peaks = engine.analyze_peaks(freqs, imp)
+                        store.add(store_name, key, freqs, imp, peaks)
+                        st.success(f"Stored '{store_name}'.")
             else:
-                st.warning("Run simulation to set reference.")
-
-            if st.session_state['ref_imp'] is not None:
-                if st.button("Clear Reference"):
-                    st.session_state['ref_imp'] = None
+                st.warning("Run simulation to store the current design.")
+
+            if len(store):
+                st.caption(f"{len(store)} designs stored ({store.nbytes / 1024:.0f} KB)")
+                to_remove = st.selectbox("Remove", store.names, key="store_remove")
+                c_rm, c_clear = st.columns(2)
+                if c_rm.button("Remove"):
+                    store.remove(to_remove)
+                    st.rerun()
+                if c_clear.button("Clear All"):
+                    store.clear()
                     st.rerun()
 
         with col_c:
-            if st.session_state.get('sim_done'):
-                # Prepare comparison plot
-                freqs = st.session_state['freqs']
-                imp = st.session_state['imp']
-
-                ref_freqs = st.session_state.get('ref_freqs')
-                ref_imp = st.session_state.get('ref_imp')
-                ref_name = st.session_state.get('ref_name', "Reference")
-
-                plot_impedance_interactive(
-                    freqs, imp,
-                    title="Impedance Comparison",
-                    ref_freqs=ref_freqs,
-                    ref_imp=ref_imp,
-                    ref_label=ref_name
-                )
+            if len(store):
+                selected = st.multiselect("Designs", store.names, default=store.names)
+                if selected:
+                    reference = st.selectbox("Reference", selected)
+                    view = st.radio("View", ["Overlay", "Difference to reference"], horizontal=True)
+                    plot_comparison(store, selected, reference, difference=view != "Overlay")
+
+                    metrics = store.pairwise_metrics(selected)
+                    st.markdown(f"##### Compared to {reference}")
+                    st.dataframe(pd.DataFrame(metrics.against(reference)).round(2), use_container_width=True)
+                    with st.expander("Pairwise RMS difference (dB)"):
+                        st.dataframe(pd.DataFrame(metrics.rms_db, index=selected, columns=selected).round(2),
+                                     use_container_width=True)
             else:
-                st.info("Run a simulation to compare against reference.")
+                st.info("Store simulation results to compare designs.")
+
+    render_performance_panel(page)
 
     # Footer
     st.markdown("---")
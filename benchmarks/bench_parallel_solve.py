@@ -0,0 +1,53 @@
+"""
+Wall-clock speedup of the frequency-chunked parallel FEM solve.
+
+Usage:
+    python -m benchmarks.bench_parallel_solve [--workers 1 2 4 8 16] [--repeat 3]
+"""
+import argparse
+import os
+import time
+import numpy as np
+from src.simulation.cache import ImpedanceCache
+from src.simulation.physics import SimulationEngine
+from benchmarks.designs import default_clarinet, twenty_hole_clarinet
+
+
+def time_solve(clarinet, workers, repeat):
+    """Best-of-repeat wall time of an uncached dense solve."""
+    best = np.inf
+    for _ in range(repeat):
+        # Fresh, empty cache so every repeat really solves
+        sim = SimulationEngine(cache=ImpedanceCache(max_entries=1))
+        sim.workers = workers
+        start = time.perf_counter()
+        sim.run_impedance_simulation(clarinet)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cpus = os.cpu_count() or 1
+    default_workers = [w for w in (1, 2, 4, 8, 16) if w <= cpus] or [1]
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"CPUs available: {cpus}")
+    for clarinet in (default_clarinet(), twenty_hole_clarinet()):
+        # Warm the pools so process start-up is not charged to the first run
+        for w in args.workers:
+            time_solve(clarinet, w, 1)
+
+        print(f"\n{clarinet.name} ({len(clarinet.holes)} holes)")
+        print(f"{'workers':>8} {'wall (s)':>10} {'speedup':>8}")
+        baseline = None
+        for w in args.workers:
+            t = time_solve(clarinet, w, args.repeat)
+            baseline = baseline or t
+            print(f"{w:>8} {t:>10.3f} {baseline / t:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
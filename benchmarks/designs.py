@@ -0,0 +1,52 @@
+"""
+Representative designs shared by the benchmark scripts.
+"""
+import numpy as np
+from src.models.clarinet import Clarinet
+
+
+def default_clarinet() -> Clarinet:
+    """The two-hole starter design used by the app and tests."""
+    return Clarinet.default_clarinet()
+
+
+def twenty_hole_clarinet() -> Clarinet:
+    """
+    A realistic soprano layout: cylindrical bore flaring into a bell, with
+    20 tone holes whose size grows towards the lower end.
+    """
+    inst = Clarinet(name="20-Hole Benchmark Clarinet")
+    inst.add_bore_point(0.0, 0.0073)
+    inst.add_bore_point(0.52, 0.0073)
+    inst.add_bore_point(0.58, 0.0090)
+    inst.add_bore_point(0.62, 0.0140)
+    inst.add_bore_point(0.66, 0.0300)
+
+    positions = np.linspace(0.16, 0.57, 20)
+    radii = np.linspace(0.0015, 0.0060, 20)
+    chimneys = np.linspace(0.0090, 0.0035, 20)
+    for i, (x, r, c) in enumerate(zip(positions, radii, chimneys)):
+        inst.add_hole(float(x), float(r), float(c), f"Hole {i + 1}")
+
+    # Simplified chart: each note opens one more hole from the bell upwards
+    for k in range(len(positions) + 1):
+        inst.add_fingering(f"Note {k}", "x" * (len(positions) - k) + "o" * k)
+    return inst
+
+
+def digitized_clarinet(n_points: int = 2000) -> Clarinet:
+    """
+    The 20-hole layout on a bore measured at n_points stations, as a bore
+    digitized from a real instrument would be: a slightly wavy cylinder
+    (+/- 0.02 mm machining ripple) flaring into the bell.
+    """
+    layout = twenty_hole_clarinet()
+    x = np.linspace(0.0, 0.66, n_points)
+    r = 0.0073 + 2e-5 * np.sin(2 * np.pi * x / 0.013)
+    bell = x > 0.52
+    r[bell] += 0.0227 * ((x[bell] - 0.52) / 0.14) ** 3
+    holes = layout.holes_array()
+    return Clarinet.from_arrays(
+        x, r, holes[:, 0], holes[:, 1], holes[:, 2], [h.label for h in layout.holes],
+        name=f"{n_points}-Point Digitized Clarinet", fingerings=layout.fingerings,
+    )
@@ -0,0 +1,295 @@
+"""
+Benchmark suite: simulation, peak detection, optimization and model
+construction on representative designs, with machine-readable baselines.
+
+Usage:
+    python -m benchmarks.suite [--only 'simulate/*'] [--repeat 3] [--all]
+                               [--save baseline.json] [--compare baseline.json]
+
+Each workload reports its best and median wall time over --repeat runs, its
+throughput (frequency solves/s for solver workloads, curves/s or designs/s
+otherwise) and the peak Python heap during one extra run under tracemalloc.
+Workloads marked slow (the FEM on the 2000-point bore, minutes per solve)
+only run with --all. --compare exits with status 1 if any workload got more
+than --threshold times slower than the baseline.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+import numpy as np
+from src.models.clarinet import Clarinet
+from src.optimization.optimizer import Optimizer
+from src.simulation.cache import ImpedanceCache
+from src.simulation.physics import SimulationEngine
+from src.simulation.tmm import tmm_impedance
+from benchmarks.designs import default_clarinet, digitized_clarinet, twenty_hole_clarinet
+
+# Frequency grids (Hz): the engine's default and the coarse grid used for exploration
+GRIDS = {"dense": np.arange(20, 2500, 2), "coarse": np.arange(20, 2500, 10)}
+DESIGNS = {"default": default_clarinet, "20-hole": twenty_hole_clarinet, "digitized-2000": digitized_clarinet}
+
+
+@dataclass
+class Workload:
+    """
+    One benchmark. setup() is untimed and returns the timed run(), which
+    returns how many units of work it did (frequency solves, curves, designs).
+    """
+    name: str
+    setup: Callable[[], Callable[[], int]]
+    unit: str = "solves"
+    slow: bool = False
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    best: float          # Fastest run (s)
+    median: float        # Median run (s)
+    work: int            # Units of work per run
+    unit: str
+    peak_memory: float   # Peak traced Python allocations during one run (MB)
+    repeat: int
+
+    @property
+    def rate(self) -> float:
+        """Units of work per second of the best run."""
+        return self.work / self.best if self.best > 0 else np.inf
+
+
+def _engine(backend, grid) -> SimulationEngine:
+    # A fresh, empty cache for every run, so each run really solves
+    sim = SimulationEngine(cache=ImpedanceCache(max_entries=1))
+    sim.backend = backend
+    sim.frequencies = GRIDS[grid]
+    return sim
+
+
+def _simulate(design, grid, backend):
+    def setup():
+        clarinet, sim = DESIGNS[design](), _engine(backend, grid)
+
+        def run():
+            sim.run_impedance_simulation(clarinet)
+            return sim.solve_count
+        return run
+    return setup
+
+
+def _peaks(n_curves):
+    def setup():
+        clarinet = twenty_hole_clarinet()
+        notes = list(clarinet.fingerings)[:n_curves]
+        states = [clarinet.get_fingering_states(note) for note in notes]
+        sim = _engine("tmm", "dense")
+        impedance = tmm_impedance(clarinet.bore_array(), clarinet.holes_array(), sim.temperature,
+                                  sim.frequencies, open_holes=states)
+        curves = impedance[0] if n_curves == 1 else impedance
+
+        def run():
+            # Repeated so the timing is well above the timer resolution
+            for _ in range(20):
+                sim.detect_peaks(sim.frequencies, curves)
+            return 20 * n_curves
+        return run
+    return setup
+
+
+def _tune_hole(backend):
+    def setup():
+        clarinet = default_clarinet()
+        sim = _engine(backend, "dense")
+        sim.frequencies = np.arange(100, 600, 2)
+        natural = sim.detect_peaks(*sim.run_impedance_simulation(clarinet))[0][0]
+        sim = _engine(backend, "dense")
+        sim.frequencies = np.arange(100, 600, 2)
+        optimizer = Optimizer(clarinet, sim)
+
+        def run():
+            optimizer.tune_hole_position(natural + 20, 0, search_range=0.1)
+            return sim.solve_count
+        return run
+    return setup
+
+
+def _build_bore(method, n_points=2000):
+    def setup():
+        x = np.linspace(0.0, 0.66, n_points)
+        r = 0.0073 + 2e-5 * np.sin(2 * np.pi * x / 0.013)
+        # Shuffled, as points arrive from editing or file imports
+        order = np.random.default_rng(0).permutation(n_points)
+        x, r = x[order], r[order]
+
+        def run():
+            if method == "from_arrays":
+                # Repeated so the timing is well above the timer resolution
+                for _ in range(100):
+                    Clarinet.from_arrays(x, r)
+                return 100
+            inst = Clarinet()
+            for position, radius in zip(x.tolist(), r.tolist()):
+                inst.add_bore_point(position, radius)
+            return 1
+        return run
+    return setup
+
+
+def _build_holes():
+    def setup():
+        holes = twenty_hole_clarinet().holes_array()[::-1]
+
+        def run():
+            for _ in range(1000):
+                inst = Clarinet()
+                for x, r, c in holes.tolist():
+                    inst.add_hole(x, r, c)
+            return 1000
+        return run
+    return setup
+
+
+def workloads() -> List[Workload]:
+    """Every workload of the suite, in run order."""
+    items = []
+    for design in DESIGNS:
+        for grid in GRIDS:
+            for backend in ("fem", "tmm"):
+                items.append(Workload(f"simulate/{design}/{grid}/{backend}", _simulate(design, grid, backend),
+                                      slow=backend == "fem" and design == "digitized-2000"))
+    items += [
+        Workload("peaks/single-curve", _peaks(1), unit="curves"),
+        Workload("peaks/21-curve-stack", _peaks(21), unit="curves"),
+        Workload("optimize/tune-hole/fem", _tune_hole("fem")),
+        Workload("optimize/tune-hole/tmm", _tune_hole("tmm")),
+        Workload("model/bore-2000/add_bore_point", _build_bore("add_bore_point"), unit="designs"),
+        Workload("model/bore-2000/from_arrays", _build_bore("from_arrays"), unit="designs"),
+        Workload("model/20-holes/add_hole", _build_holes(), unit="designs"),
+    ]
+    return items
+
+
+def select(items: List[Workload], patterns=None, include_slow: bool = False) -> List[Workload]:
+    """Workloads matching any of the fnmatch patterns (all if None), slow ones only if asked."""
+    return [w for w in items
+            if (include_slow or not w.slow) and (not patterns or any(fnmatch.fnmatch(w.name, p) for p in patterns))]
+
+
+def measure(workload: Workload, repeat: int = 3) -> BenchmarkResult:
+    """Times repeat runs of workload, then measures its peak memory in one more traced run."""
+    times = []
+    for _ in range(repeat):
+        run = workload.setup()
+        start = time.perf_counter()
+        work = run()
+        times.append(time.perf_counter() - start)
+
+    # Traced separately: tracemalloc slows allocation-heavy code down
+    run = workload.setup()
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return BenchmarkResult(workload.name, min(times), statistics.median(times), work, workload.unit,
+                           peak / 2 ** 20, repeat)
+
+
+def machine_info() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_baseline(results: List[BenchmarkResult], path: str):
+    """Writes results with the machine description as JSON."""
+    data = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": machine_info(),
+        "results": {r.name: {**asdict(r), "rate": r.rate} for r in results},
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def load_baseline(path: str) -> Dict[str, BenchmarkResult]:
+    with open(path) as f:
+        data = json.load(f)
+    fields = BenchmarkResult.__dataclass_fields__
+    return {name: BenchmarkResult(**{k: v for k, v in row.items() if k in fields})
+            for name, row in data["results"].items()}
+
+
+def compare(results: List[BenchmarkResult], baseline: Dict[str, BenchmarkResult],
+            threshold: float = 1.25) -> List[dict]:
+    """
+    Time-per-unit-of-work ratio (current / baseline) of the best runs of
+    every workload present in both.
+
+    Returns:
+        list of dict: name, baseline, current, ratio and regressed (ratio > threshold).
+    """
+    rows = []
+    for r in results:
+        if r.name in baseline:
+            base = baseline[r.name]
+            ratio = base.rate / r.rate if r.rate > 0 else np.inf
+            rows.append({"name": r.name, "baseline": base.best, "current": r.best,
+                         "ratio": ratio, "regressed": ratio > threshold})
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", help="fnmatch patterns of workload names, e.g. 'simulate/*/tmm'.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--all", action="store_true", help="Include the slow workloads.")
+    parser.add_argument("--list", action="store_true", help="List the workloads and exit.")
+    parser.add_argument("--save", help="Write the results as a JSON baseline.")
+    parser.add_argument("--compare", help="Baseline JSON to compare against.")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio counted as a regression.")
+    args = parser.parse_args(argv)
+
+    chosen = select(workloads(), args.only, args.all)
+    if args.list:
+        for w in chosen:
+            print(w.name + (" (slow)" if w.slow else ""))
+        return 0
+
+    results = []
+    print(f"{'workload':<40} {'best (s)':>9} {'median (s)':>10} {'rate':>12} {'unit':<8} {'peak MB':>8}")
+    for w in chosen:
+        r = measure(w, args.repeat)
+        results.append(r)
+        print(f"{r.name:<40} {r.best:>9.4f} {r.median:>10.4f} {r.rate:>12.1f} {r.unit + '/s':<8} {r.peak_memory:>8.2f}",
+              flush=True)
+
+    if args.save:
+        save_baseline(results, args.save)
+        print(f"\nSaved baseline to {args.save}")
+    if args.compare:
+        rows = compare(results, load_baseline(args.compare), args.threshold)
+        print(f"\n{'workload':<40} {'baseline (s)':>12} {'now (s)':>9} {'ratio':>7}")
+        for row in rows:
+            flag = "  REGRESSION" if row["regressed"] else ""
+            print(f"{row['name']:<40} {row['baseline']:>12.4f} {row['current']:>9.4f} {row['ratio']:>6.2f}x{flag}")
+        if any(row["regressed"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""
+Accuracy and speed of the transfer-matrix backend against the FEM reference.
+
+Usage:
+    python -m benchmarks.validate_tmm [design.json ...] [--modes 6] [--tolerance 5]
+
+Without design files the benchmark designs are checked, with and without
+losses. Exits with status 1 if any resonance is off by more than --tolerance
+cents, so it can gate changes to either backend.
+"""
+import argparse
+import sys
+import numpy as np
+from src.models.clarinet import Clarinet
+from src.simulation.cache import ImpedanceCache
+from src.simulation.physics import SimulationEngine
+from src.simulation.validation import compare_backends
+from benchmarks.designs import default_clarinet, twenty_hole_clarinet
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("designs", nargs="*", help="Design JSON files (default: the benchmark designs).")
+    parser.add_argument("--modes", type=int, default=6, help="Resonances compared per design.")
+    parser.add_argument("--tolerance", type=float, default=5.0, help="Largest acceptable error (cents).")
+    args = parser.parse_args(argv)
+
+    designs = [Clarinet.load_from_file(path) for path in args.designs] or [default_clarinet(), twenty_hole_clarinet()]
+    worst = 0.0
+    print(f"{'design':<32} {'losses':>6} {'max err (c)':>11} {'max dB':>8} {'fem (s)':>8} {'tmm (s)':>8} {'speedup':>8}")
+    for clarinet in designs:
+        for losses in (True, False):
+            sim = SimulationEngine(cache=ImpedanceCache(max_entries=1))
+            sim.losses = losses
+            result = compare_backends(clarinet, sim, n_modes=args.modes)
+            worst = np.nanmax([worst, result.max_peak_error_cents])
+            print(f"{clarinet.name[:32]:<32} {str(losses):>6} {result.max_peak_error_cents:>11.4f} "
+                  f"{result.max_magnitude_error_db:>8.4f} {result.reference_time:>8.3f} "
+                  f"{result.candidate_time:>8.4f} {result.speedup:>7.0f}x")
+    return 1 if worst > args.tolerance else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Headless command-line runner: simulates designs without the Streamlit UI.
+
+Usage:
+    python -m src.cli simulate design1.json [design2.json ...] --out results/
+    python -m src.cli sweep sweep.json --out results/ --workers 4
+    python -m src.cli play design.json --note low --duration 1 --out low.wav
+
+Sweeps are full-factorial grids or Latin hypercube / Sobol samples of
+parameter ranges. Results are appended to a ResultArchive in --out
+(designs already archived with the same settings are skipped), and a
+summary table is written to <out>/summary.csv. See
+src.simulation.sweep.load_sweep for the sweep format.
+
+play runs the time-domain reed simulation and writes the radiated sound to a
+WAV file chunk by chunk, reporting the real-time factor and sounding pitch.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from typing import List
+import numpy as np
+from src.models.clarinet import Clarinet
+from src.simulation.archive import ResultArchive
+from src.simulation.cache import ImpedanceCache
+from src.simulation.physics import SimulationEngine
+from src.simulation.playing import DEFAULT_SAMPLE_RATE, PlayingSimulation
+from src.simulation.sweep import SweepPoint, SweepResults, load_sweep, run_sweep
+
+N_MODES = 3
+
+
+def _engine(args) -> SimulationEngine:
+    sim = SimulationEngine(cache=ImpedanceCache(cache_dir=args.cache_dir))
+    sim.frequencies = np.arange(args.fmin, args.fmax, args.step)
+    sim.temperature = args.temperature
+    sim.losses = not args.no_losses
+    return sim
+
+
+def summary_rows(results: SweepResults, n_modes: int = N_MODES) -> List[dict]:
+    """One row per design: status, parameter values, first resonances, result key and error."""
+    rows = []
+    for i, (point, result) in enumerate(zip(results.points, results.results)):
+        row = {"index": i, "name": point.clarinet.name, "status": results.status[i], **point.values,
+               "elapsed_s": round(results.elapsed[i], 3)}
+        peaks = result.peaks if result is not None else None
+        row["n_peaks"] = len(peaks) if peaks is not None else ""
+        for m in range(n_modes):
+            has_mode = peaks is not None and m < len(peaks)
+            row[f"mode{m + 1}_hz"] = round(float(peaks.frequency[m]), 3) if has_mode else ""
+            row[f"mode{m + 1}_q"] = round(float(peaks.q_factor[m]), 2) if has_mode else ""
+        row["key"] = result.key if result is not None else ""
+        row["error"] = results.errors[i]
+        rows.append(row)
+    return rows
+
+
+def write_summary(rows: List[dict], path: str):
+    """Writes summary rows as CSV (columns are the union of the rows' keys, in first-seen order)."""
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def run(points: List[SweepPoint], engine: SimulationEngine, out: str, workers: int = 1,
+        force: bool = False, summary: str = None, log=sys.stderr) -> List[dict]:
+    """
+    Simulates sweep points into the archive at out and writes the summary.
+
+    Args:
+        points (list): SweepPoint per design.
+        engine (SimulationEngine): Default settings and result cache.
+        out (str): ResultArchive directory.
+        workers (int): Worker processes.
+        force (bool): Re-simulate designs that are already archived.
+        summary (str): Summary CSV path (default: <out>/summary.csv).
+        log: Stream for progress lines (None for silence).
+
+    Returns:
+        list: Summary rows, in the order of points.
+    """
+    def progress(done, total, message=""):
+        if log is not None and message:
+            print(f"[{done}/{total}] {message}", file=log)
+
+    start = time.perf_counter()
+    results = run_sweep(points, engine, ResultArchive(out), workers=workers, force=force, progress=progress)
+    rows = summary_rows(results)
+    write_summary(rows, summary or os.path.join(out, "summary.csv"))
+    if log is not None:
+        counts = {status: results.status.count(status) for status in ("ok", "cached", "archived", "failed")}
+        print(", ".join(f"{n} {status}" for status, n in counts.items()) + f" in {time.perf_counter() - start:.1f}s",
+              file=log)
+    return rows
+
+
+def play(args, log=sys.stderr) -> int:
+    """Plays one note of a design into a WAV file (the `play` command)."""
+    def progress(chunk):
+        if log is not None:
+            print(f"[{chunk.stop}/{chunk.total}] {chunk.stop / chunk.sample_rate:.2f}s simulated, "
+                  f"{chunk.real_time_factor:.0f}x real time", file=log)
+
+    player = PlayingSimulation(Clarinet.load_from_file(args.design), args.note, temperature=args.temperature,
+                               losses=args.losses, sample_rate=args.sample_rate,
+                               mouth_pressure=args.mouth_pressure)
+    result = player.write_wav(args.out, args.duration, full_scale=args.full_scale, on_chunk=progress)
+    if log is not None:
+        print(f"Wrote {result.duration:.2f}s to {result.path} in {result.elapsed:.1f}s "
+              f"({result.real_time_factor:.0f}x real time); sounding {result.sounding_frequency:.1f} Hz, "
+              f"{result.rms_pressure:.3f} Pa RMS at 1 m"
+              + (f", {result.clipped} samples clipped" if result.clipped else ""), file=log)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    simulate = commands.add_parser("simulate", help="Simulate design JSON files.")
+    simulate.add_argument("designs", nargs="+", help="Design files saved from the app (Clarinet.save_to_file).")
+    sweep = commands.add_parser("sweep", help="Simulate a parameter sweep (grid, Latin hypercube or Sobol).")
+    sweep.add_argument("spec", help="Sweep spec JSON.")
+    playing = commands.add_parser("play", help="Play a note in the time domain and write it to a WAV file.")
+    playing.add_argument("design", help="Design file saved from the app.")
+    playing.add_argument("--out", required=True, help="Output WAV file.")
+    playing.add_argument("--note", help="Fingering to play (default: all holes open).")
+    playing.add_argument("--duration", type=float, default=1.0, help="Simulated time (s).")
+    playing.add_argument("--sample-rate", type=int, default=DEFAULT_SAMPLE_RATE, help="Audio sample rate (Hz).")
+    playing.add_argument("--mouth-pressure", type=float, default=2000.0, help="Blowing pressure (Pa).")
+    playing.add_argument("--full-scale", type=float, default=2.0, help="Pressure (Pa) at the WAV full scale.")
+    playing.add_argument("--temperature", type=float, default=25.0, help="Temperature (Celsius).")
+    playing.add_argument("--losses", action="store_true", help="Viscothermal losses (slower).")
+    playing.add_argument("--quiet", action="store_true", help="No progress output.")
+
+    for command in (simulate, sweep):
+        command.add_argument("--out", required=True, help="Result archive directory.")
+        command.add_argument("--summary", help="Summary CSV path (default: <out>/summary.csv).")
+        command.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1).")
+        command.add_argument("--fmin", type=float, default=20.0, help="Lowest frequency (Hz).")
+        command.add_argument("--fmax", type=float, default=2500.0, help="Highest frequency (Hz, exclusive).")
+        command.add_argument("--step", type=float, default=2.0, help="Frequency step (Hz).")
+        command.add_argument("--temperature", type=float, default=25.0, help="Temperature (Celsius).")
+        command.add_argument("--no-losses", action="store_true", help="Disable viscothermal losses.")
+        command.add_argument("--cache-dir", default=os.environ.get("CLARINET_CACHE_DIR"),
+                             help="On-disk impedance cache shared between runs.")
+        command.add_argument("--force", action="store_true", help="Re-simulate designs already in the archive.")
+        command.add_argument("--quiet", action="store_true", help="No progress output.")
+    args = parser.parse_args(argv)
+
+    if args.command == "play":
+        try:
+            return play(args, log=None if args.quiet else sys.stderr)
+        except (OSError, ValueError, KeyError) as e:
+            parser.error(str(e))
+
+    try:
+        if args.command == "simulate":
+            points = [SweepPoint(Clarinet.load_from_file(path)) for path in args.designs]
+        else:
+            points = load_sweep(args.spec)
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(str(e))
+
+    rows = run(points, _engine(args), args.out, workers=args.workers, force=args.force,
+               summary=args.summary, log=None if args.quiet else sys.stderr)
+    return 1 if any(row["status"] == "failed" for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
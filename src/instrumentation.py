@@ -0,0 +1,246 @@
+"""
+Lightweight instrumentation of the hot paths.
+
+Code marks its stages with span("name") and its events with count("name").
+Both do nothing (one attribute lookup) unless a Recorder is active on the
+calling thread:
+
+    with recording(Recorder("simulation", profile=True)) as rec:
+        sim.run_impedance_simulation(clarinet)
+    rec.breakdown()   # time per stage
+    rec.to_dict()     # structured records for export
+
+Recording is per thread, so background jobs each record their own work.
+"""
+import cProfile
+import functools
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+_state = threading.local()
+_DISABLED = nullcontext()
+# cProfile and tracemalloc are process-wide: held by at most one recording at a time
+_exclusive = threading.Lock()
+
+
+@dataclass
+class Span:
+    """One timed stage of a recording."""
+    name: str
+    start: float                     # Seconds since the recording started
+    duration: float
+    depth: int                       # Nesting level (0 = top level)
+    parent: Optional[int]            # Index of the enclosing span, None at top level
+    attributes: dict = field(default_factory=dict)
+    memory: Optional[int] = None     # Net bytes allocated (recordings with trace_memory only)
+
+
+class Recorder:
+    """
+    Collects spans and counters of one run, optionally with a cProfile
+    profile and the tracemalloc peak of the whole run.
+
+    Args:
+        name (str): Label of the run (e.g. the job kind).
+        profile (bool): Run cProfile while recording.
+        trace_memory (bool): Trace Python allocations with tracemalloc (process-wide,
+            so allocations of other threads count towards the peak).
+        profile_rows (int): Functions kept from the profile.
+
+    Only one recording profiles or traces memory at a time; the others run
+    without and say so in notes.
+    """
+
+    def __init__(self, name: str = "run", profile: bool = False, trace_memory: bool = False,
+                 profile_rows: int = 30):
+        self.name = name
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profile_rows = profile_rows
+        self.spans: List[Span] = []
+        self.counters: Dict[str, float] = {}
+        self.started: Optional[float] = None   # Wall-clock time (epoch seconds)
+        self.duration: float = 0.0
+        self.peak_memory: Optional[int] = None  # Bytes (trace_memory only)
+        self.profile_stats: List[dict] = []
+        self.profile_text: str = ""
+        self.notes: List[str] = []
+        self._origin = 0.0
+        self._open: List[int] = []
+        self._profiler = None
+        self._owns_tracemalloc = False
+        self._exclusive = False
+
+    # --- Recording -----------------------------------------------------------
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        index = len(self.spans)
+        parent = self._open[-1] if self._open else None
+        memory = tracemalloc.get_traced_memory()[0] if self._tracing else None
+        start = time.perf_counter()
+        self.spans.append(Span(name, start - self._origin, 0.0, len(self._open), parent, attributes))
+        self._open.append(index)
+        try:
+            yield self.spans[index]
+        finally:
+            self._open.pop()
+            record = self.spans[index]
+            record.duration = time.perf_counter() - start
+            if memory is not None:
+                record.memory = tracemalloc.get_traced_memory()[0] - memory
+
+    def count(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @property
+    def _tracing(self) -> bool:
+        return self.trace_memory and self._exclusive
+
+    def _start(self):
+        self.started = time.time()
+        if self.profile or self.trace_memory:
+            self._exclusive = _exclusive.acquire(blocking=False)
+            if not self._exclusive:
+                self.notes.append("Profiling and memory tracing skipped: another run was using them.")
+        if self._tracing:
+            self._owns_tracemalloc = not tracemalloc.is_tracing()
+            if self._owns_tracemalloc:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        if self.profile and self._exclusive:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._origin = time.perf_counter()
+
+    def _stop(self):
+        self.duration += time.perf_counter() - self._origin
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._collect_profile(self._profiler)
+            self._profiler = None
+        if self._tracing:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+        if self._exclusive:
+            self._exclusive = False
+            _exclusive.release()
+
+    def _collect_profile(self, profiler):
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream).sort_stats("cumulative")
+        stats.print_stats(self.profile_rows)
+        self.profile_text = stream.getvalue()
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:self.profile_rows]
+        self.profile_stats = [
+            {"function": f"{func} ({filename}:{line})", "calls": calls, "tottime": tottime, "cumtime": cumtime}
+            for (filename, line, func), (_, calls, tottime, cumtime, _) in rows
+        ]
+
+    # --- Results -------------------------------------------------------------
+
+    def breakdown(self) -> List[dict]:
+        """
+        Time per stage (span name), slowest first: calls, total seconds,
+        self seconds (excluding nested spans) and share of the run's wall time.
+        """
+        child_time = [0.0] * len(self.spans)
+        for s in self.spans:
+            if s.parent is not None:
+                child_time[s.parent] += s.duration
+        rows = {}
+        for s, children in zip(self.spans, child_time):
+            row = rows.setdefault(s.name, {"stage": s.name, "calls": 0, "total_s": 0.0, "self_s": 0.0})
+            row["calls"] += 1
+            row["self_s"] += s.duration - children
+            # Nested calls of the same stage are counted once
+            if not self._inside(s, s.name):
+                row["total_s"] += s.duration
+        for row in rows.values():
+            row["share"] = row["self_s"] / self.duration if self.duration > 0 else 0.0
+        return sorted(rows.values(), key=lambda row: row["self_s"], reverse=True)
+
+    def _inside(self, span: Span, name: str) -> bool:
+        parent = span.parent
+        while parent is not None:
+            if self.spans[parent].name == name:
+                return True
+            parent = self.spans[parent].parent
+        return False
+
+    def to_dict(self) -> dict:
+        """Structured record of the run (JSON-serializable)."""
+        return {
+            "name": self.name,
+            "started": self.started,
+            "duration": self.duration,
+            "counters": dict(self.counters),
+            "peak_memory": self.peak_memory,
+            "breakdown": self.breakdown(),
+            "spans": [asdict(s) for s in self.spans],
+            "profile": self.profile_stats,
+            "notes": list(self.notes),
+        }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), default=str, **kwargs)
+
+
+def current() -> Optional[Recorder]:
+    """The recorder active on this thread, or None."""
+    return getattr(_state, "recorder", None)
+
+
+@contextmanager
+def recording(recorder: Recorder = None, **options):
+    """
+    Activates recorder (or a new Recorder(**options)) on this thread for the
+    duration of the block and yields it. Recordings may be nested; the inner
+    one receives the spans until it ends.
+    """
+    recorder = recorder if recorder is not None else Recorder(**options)
+    previous = current()
+    _state.recorder = recorder
+    recorder._start()
+    try:
+        yield recorder
+    finally:
+        recorder._stop()
+        _state.recorder = previous
+
+
+def span(name: str, **attributes):
+    """Context manager timing a stage; a shared no-op when nothing is recording."""
+    recorder = getattr(_state, "recorder", None)
+    if recorder is None:
+        return _DISABLED
+    return recorder.span(name, **attributes)
+
+
+def count(name: str, value: float = 1):
+    """Adds value to a counter of the active recording, if any."""
+    recorder = getattr(_state, "recorder", None)
+    if recorder is not None:
+        recorder.count(name, value)
+
+
+def timed(name: str):
+    """Decorator recording every call of a function as a span called name."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            recorder = getattr(_state, "recorder", None)
+            if recorder is None:
+                return fn(*args, **kwargs)
+            with recorder.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -1,9 +1,12 @@
 
+from collections.abc import Sequence
 from dataclasses import dataclass, field
 from typing import List, Tuple, Dict
+import hashlib
 import json
+import numpy as np
 
-@dataclass
+@dataclass(slots=True)
 class Hole:
     """
     Represents a tone hole on the instrument.
@@ -19,69 +22,276 @@ class Hole:
         """
         return [self.position, self.radius, self.chimney]
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class BoreSection:
     """
     Represents a point in the bore profile (radius at a specific position).
+    Frozen: it is a snapshot of the profile, so assigning to it would not
+    change the design (see BoreProfile.replace).
     """
     position: float
     radius: float
 
+
+class BoreProfile(Sequence):
+    """
+    Columnar bore profile: one (N, 2) float64 array of [position, radius]
+    rows sorted by position.
+
+    The array is never modified in place (inserts build a new one), so the
+    read-only views returned by as_array(), positions and radii can be handed
+    to plotting and hashing code without copying. Indexing and iteration
+    yield frozen BoreSection snapshots. To change a design's bore, assign it
+    a new profile: clarinet.add_bore_point(x, r), or
+    clarinet.bore = clarinet.bore.replace(i, radius=r).
+    """
+    __slots__ = ("_data",)
+
+    def __init__(self, data=None):
+        data = np.zeros((0, 2)) if data is None else np.array(data, dtype=np.float64).reshape(-1, 2)
+        data.flags.writeable = False
+        self._data = data
+
+    @classmethod
+    def from_arrays(cls, positions, radii):
+        """Validates and sorts a whole profile at once (stable for equal positions)."""
+        positions = np.asarray(positions, dtype=np.float64).ravel()
+        radii = np.asarray(radii, dtype=np.float64).ravel()
+        if positions.shape != radii.shape:
+            raise ValueError("Bore positions and radii must have the same length.")
+        if not np.all(np.isfinite(positions)) or not np.all(np.isfinite(radii)):
+            raise ValueError("Bore positions and radii must be finite numbers.")
+        if np.any(radii <= 0):
+            raise ValueError("Bore radius must be positive.")
+        order = np.argsort(positions, kind="stable")
+        return cls(np.column_stack([positions[order], radii[order]]))
+
+    def insert(self, position: float, radius: float) -> "BoreProfile":
+        """Returns a new profile with the point added at its sorted place (after equal positions)."""
+        index = int(np.searchsorted(self._data[:, 0], position, side="right"))
+        return BoreProfile(np.insert(self._data, index, [position, radius], axis=0))
+
+    def replace(self, index: int, position: float = None, radius: float = None) -> "BoreProfile":
+        """Returns a new profile with point index moved and/or resized (re-sorted if moved)."""
+        data = self._data.copy()
+        if position is not None:
+            data[index, 0] = position
+        if radius is not None:
+            data[index, 1] = radius
+        return BoreProfile.from_arrays(data[:, 0], data[:, 1])
+
+    def as_array(self) -> np.ndarray:
+        """Read-only (N, 2) view of [position, radius] rows."""
+        return self._data
+
+    @property
+    def positions(self) -> np.ndarray:
+        return self._data[:, 0]
+
+    @property
+    def radii(self) -> np.ndarray:
+        return self._data[:, 1]
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [BoreSection(float(x), float(r)) for x, r in self._data[index]]
+        x, r = self._data[index]
+        return BoreSection(float(x), float(r))
+
+    def __copy__(self):
+        return self  # Immutable
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __eq__(self, other):
+        if isinstance(other, BoreProfile):
+            return np.array_equal(self._data, other._data)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"BoreProfile({len(self)} points)"
+
 @dataclass
 class Clarinet:
     """
     Main data model for the Clarinet geometry.
-    Manages bore profile and tone holes.
+    Manages bore profile, tone holes and the fingering chart.
+
+    The fingering chart maps a note name to a pattern with one character per
+    hole, in position order: 'o' = open, 'x' = closed (e.g. "xxo").
     """
     name: str = "Prototype Clarinet"
-    bore: List[BoreSection] = field(default_factory=list)
+    bore: BoreProfile = field(default_factory=BoreProfile)
     holes: List[Hole] = field(default_factory=list)
+    fingerings: Dict[str, str] = field(default_factory=dict)
+
+    def __post_init__(self):
+        # Accept a plain list of BoreSection (or [x, r] pairs) for the bore
+        if not isinstance(self.bore, BoreProfile):
+            points = [(b.position, b.radius) if isinstance(b, BoreSection) else tuple(b) for b in self.bore]
+            self.bore = BoreProfile.from_arrays(*(zip(*points) if points else ([], [])))
+
+    @classmethod
+    def from_arrays(cls, bore_positions, bore_radii, hole_positions=(), hole_radii=(),
+                    hole_chimneys=(), hole_labels=None, name: str = "Prototype Clarinet",
+                    fingerings: Dict[str, str] = None):
+        """
+        Builds a design from columns in one validation and sort pass per
+        table, instead of sorting on every add_bore_point/add_hole call.
+
+        Args:
+            bore_positions, bore_radii (array): Bore profile points (m), any order.
+            hole_positions, hole_radii, hole_chimneys (array): Tone holes (m), any order.
+            hole_labels (list): Optional label per hole.
+            name (str): Design name.
+            fingerings (dict): note -> 'o'/'x' pattern, in sorted hole order.
+
+        Returns:
+            Clarinet
+        """
+        inst = cls(name=name, bore=BoreProfile.from_arrays(bore_positions, bore_radii))
+
+        holes = np.column_stack([
+            np.asarray(hole_positions, dtype=np.float64).ravel(),
+            np.asarray(hole_radii, dtype=np.float64).ravel(),
+            np.asarray(hole_chimneys, dtype=np.float64).ravel(),
+        ]) if len(hole_positions) else np.zeros((0, 3))
+        labels = list(hole_labels) if hole_labels is not None else [""] * len(holes)
+        if len(labels) != len(holes):
+            raise ValueError("Hole columns must have the same length.")
+        if not np.all(np.isfinite(holes)):
+            raise ValueError("Hole dimensions must be finite numbers.")
+        if np.any(holes[:, 1] <= 0):
+            raise ValueError("Hole radius must be positive.")
+
+        order = np.argsort(holes[:, 0], kind="stable")
+        inst.holes = [Hole(x, r, c, labels[i]) for i, (x, r, c) in zip(order.tolist(), holes[order].tolist())]
+        for note, pattern in (fingerings or {}).items():
+            inst.add_fingering(note, pattern)
+        return inst
 
     def add_bore_point(self, position: float, radius: float):
-        """Adds a point to the bore profile and sorts by position."""
+        """Adds a point to the bore profile at its sorted place."""
         if radius <= 0:
             raise ValueError("Bore radius must be positive.")
-        self.bore.append(BoreSection(position, radius))
-        self.bore.sort(key=lambda x: x.position)
+        self.bore = self.bore.insert(position, radius)
 
     def add_hole(self, position: float, radius: float, chimney: float, label: str = ""):
-        """Adds a tone hole and sorts by position."""
+        """Adds a tone hole at its sorted place."""
         if radius <= 0:
             raise ValueError("Hole radius must be positive.")
         self.holes.append(Hole(position, radius, chimney, label))
-        self.holes.sort(key=lambda x: x.position)
+        # In-order builds skip the sort entirely
+        if len(self.holes) > 1 and position < self.holes[-2].position:
+            self.holes.sort(key=lambda x: x.position)
+
+    def add_fingering(self, note: str, pattern: str):
+        """Adds (or replaces) the fingering of a note. pattern: 'o'/'x' per hole in position order."""
+        self.fingerings[note] = self._check_pattern(pattern)
+
+    def get_fingering_states(self, note: str) -> List[bool]:
+        """Returns the open (True) / closed (False) state of every hole for note."""
+        if note not in self.fingerings:
+            raise ValueError(f"Unknown note '{note}'")
+        return [c == "o" for c in self._check_pattern(self.fingerings[note])]
+
+    def _check_pattern(self, pattern: str) -> str:
+        pattern = pattern.strip().lower()
+        if len(pattern) != len(self.holes):
+            raise ValueError(f"Fingering '{pattern}' must have one entry per hole ({len(self.holes)}).")
+        if set(pattern) - {"o", "x"}:
+            raise ValueError("Fingering entries must be 'o' (open) or 'x' (closed).")
+        return pattern
 
     def get_bore_list(self) -> List[List[float]]:
         """Returns bore in format expected by OpenWind: [[x, r], ...]"""
-        return [[b.position, b.radius] for b in self.bore]
+        return self.bore.as_array().tolist()
 
     def get_holes_list(self) -> List[List[float]]:
-        """Returns holes in format expected by OpenWind: [[x, r, chimney], ...]"""
+        """Returns holes as numeric rows: [[x, r, chimney], ...] (see get_openwind_holes for the solver format)"""
         return [h.to_list() for h in self.holes]
 
-    def save_to_file(self, filename: str):
-        """Saves geometry to a JSON file."""
-        data = {
+    def bore_array(self) -> np.ndarray:
+        """Read-only (N, 2) array of [x, r] rows, shared with the model (no copy)."""
+        return self.bore.as_array()
+
+    def holes_array(self) -> np.ndarray:
+        """(M, 3) float64 array of [x, r, chimney] rows."""
+        if not self.holes:
+            return np.zeros((0, 3))
+        return np.array([(h.position, h.radius, h.chimney) for h in self.holes], dtype=np.float64)
+
+    def fingerprint(self) -> str:
+        """
+        Content hash of everything that affects the acoustics of the open
+        instrument: bore points and hole dimensions. Name, hole labels and
+        the fingering chart are excluded, so renaming things keeps the hash.
+        """
+        h = hashlib.sha256(self.bore_array().tobytes())
+        h.update(b"|holes|")
+        h.update(self.holes_array().tobytes())
+        return h.hexdigest()
+
+    @staticmethod
+    def openwind_label(index: int) -> str:
+        """
+        Internal OpenWind label of the hole at index (in position order).
+        User labels are free text and may repeat, so they are not used for the physics.
+        """
+        return f"hole{index + 1}"
+
+    def get_openwind_holes(self) -> List[List]:
+        """
+        Returns holes as an OpenWind table with column headers:
+        [['label', 'position', 'radius', 'chimney'], ['hole1', x, r, chimney], ...]
+        The headers are required: OpenWind reads headerless rows as
+        (position, chimney, radius), which would swap radius and chimney.
+        """
+        if not self.holes:
+            return []
+        rows = [[self.openwind_label(i), h.position, h.radius, h.chimney] for i, h in enumerate(self.holes)]
+        return [["label", "position", "radius", "chimney"]] + rows
+
+    def to_dict(self) -> Dict:
+        """
+        Returns the JSON-serializable design: name, bore [[x, r]],
+        holes [[x, r, chimney, label]] and fingerings {note: pattern}.
+        """
+        return {
             "name": self.name,
-            "bore": [[b.position, b.radius] for b in self.bore],
-            "holes": [[h.position, h.radius, h.chimney, h.label] for h in self.holes]
+            "bore": self.get_bore_list(),
+            "holes": [[h.position, h.radius, h.chimney, h.label] for h in self.holes],
+            "fingerings": dict(self.fingerings)
         }
+
+    @classmethod
+    def from_dict(cls, data: Dict):
+        """Builds a Clarinet from the format produced by to_dict()."""
+        bore = data.get("bore", [])
+        holes = data.get("holes", [])
+        return cls.from_arrays(
+            [b[0] for b in bore], [b[1] for b in bore],
+            [h[0] for h in holes], [h[1] for h in holes], [h[2] for h in holes],
+            [h[3] if len(h) > 3 else f"hole_{h[0]}" for h in holes],
+            name=data.get("name", "Loaded Clarinet"),
+            fingerings=data.get("fingerings", {}),
+        )
+
+    def save_to_file(self, filename: str):
+        """Saves geometry to a JSON file."""
         with open(filename, 'w') as f:
-            json.dump(data, f, indent=4)
+            json.dump(self.to_dict(), f, indent=4)
 
     @classmethod
     def load_from_file(cls, filename: str):
         """Loads geometry from a JSON file."""
         with open(filename, 'r') as f:
             data = json.load(f)
-
-        inst = cls(name=data.get("name", "Loaded Clarinet"))
-        for b in data.get("bore", []):
-            inst.add_bore_point(b[0], b[1])
-        for h in data.get("holes", []):
-            label = h[3] if len(h) > 3 else f"hole_{h[0]}"
-            inst.add_hole(h[0], h[1], h[2], label)
-        return inst
+        return cls.from_dict(data)
 
     @classmethod
     def default_clarinet(cls):
@@ -0,0 +1,106 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+import numpy as np
+from src.models.clarinet import Clarinet
+
+
+@dataclass
+class DesignDiff:
+    """
+    Structural difference between two states of a design.
+
+    Hole indices refer to position order and are only reported when both
+    designs have the same number of holes; otherwise holes_changed_count is
+    set and the whole hole layout counts as changed.
+    """
+    bore_changed: bool = False
+    bore_points_changed: List[int] = field(default_factory=list)  # Empty if the point count changed
+    holes_moved: List[int] = field(default_factory=list)
+    holes_resized: List[int] = field(default_factory=list)        # Radius and/or chimney
+    holes_relabelled: List[int] = field(default_factory=list)
+    holes_count_changed: bool = False
+    fingerings_added: List[str] = field(default_factory=list)
+    fingerings_removed: List[str] = field(default_factory=list)
+    fingerings_changed: List[str] = field(default_factory=list)
+    temperature_changed: bool = False
+    name_changed: bool = False
+
+    @property
+    def geometry_changed(self) -> bool:
+        """True if the bore or any hole dimension changed (the physics must be rebuilt)."""
+        return bool(self.bore_changed or self.holes_count_changed or self.holes_moved or self.holes_resized)
+
+    @property
+    def physics_changed(self) -> bool:
+        """True if an impedance computed for the old state is no longer valid."""
+        return self.geometry_changed or self.temperature_changed
+
+    @property
+    def fingerings_touched(self) -> List[str]:
+        """Notes whose results must be (re)computed: added or changed ones."""
+        return self.fingerings_added + self.fingerings_changed
+
+    @property
+    def is_noop(self) -> bool:
+        """True if nothing that affects any simulation changed (labels and name are cosmetic)."""
+        return not (self.physics_changed or self.fingerings_added
+                    or self.fingerings_removed or self.fingerings_changed)
+
+    def summary(self) -> str:
+        """Short human-readable description, e.g. 'holes 1, 3 moved; temperature changed'."""
+        parts = []
+        if self.bore_changed:
+            parts.append("bore changed")
+        if self.holes_count_changed:
+            parts.append("holes added or removed")
+        for indices, verb in ((self.holes_moved, "moved"), (self.holes_resized, "resized")):
+            if indices:
+                noun = "hole" if len(indices) == 1 else "holes"
+                parts.append(f"{noun} {', '.join(str(i + 1) for i in indices)} {verb}")
+        if self.temperature_changed:
+            parts.append("temperature changed")
+        for notes, verb in ((self.fingerings_added, "added"), (self.fingerings_changed, "changed"),
+                            (self.fingerings_removed, "removed")):
+            if notes:
+                parts.append(f"fingerings {', '.join(notes)} {verb}")
+        return "; ".join(parts) if parts else "no changes"
+
+
+def diff_designs(old: Clarinet, new: Clarinet, old_temperature: Optional[float] = None,
+                 new_temperature: Optional[float] = None) -> DesignDiff:
+    """
+    Compares two designs (and optionally the temperatures they are simulated at).
+
+    Args:
+        old (Clarinet): Previous state.
+        new (Clarinet): Current state.
+        old_temperature, new_temperature (float): Temperatures in Celsius (ignored if either is None).
+
+    Returns:
+        DesignDiff
+    """
+    diff = DesignDiff(name_changed=old.name != new.name)
+
+    if old.bore != new.bore:
+        diff.bore_changed = True
+        a, b = old.bore_array(), new.bore_array()
+        if a.shape == b.shape:
+            diff.bore_points_changed = np.flatnonzero(np.any(a != b, axis=1)).tolist()
+
+    if len(old.holes) != len(new.holes):
+        diff.holes_count_changed = True
+    else:
+        a, b = old.holes_array(), new.holes_array()
+        if len(a):
+            diff.holes_moved = np.flatnonzero(a[:, 0] != b[:, 0]).tolist()
+            diff.holes_resized = np.flatnonzero(np.any(a[:, 1:] != b[:, 1:], axis=1)).tolist()
+        diff.holes_relabelled = [i for i, (h0, h1) in enumerate(zip(old.holes, new.holes)) if h0.label != h1.label]
+
+    diff.fingerings_added = [note for note in new.fingerings if note not in old.fingerings]
+    diff.fingerings_removed = [note for note in old.fingerings if note not in new.fingerings]
+    diff.fingerings_changed = [note for note, pattern in new.fingerings.items()
+                               if note in old.fingerings and old.fingerings[note] != pattern]
+
+    if old_temperature is not None and new_temperature is not None:
+        diff.temperature_changed = old_temperature != new_temperature
+    return diff
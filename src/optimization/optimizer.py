@@ -1,29 +1,66 @@
 
+import time
+from collections import OrderedDict
+from typing import Optional, Sequence, Tuple
 import numpy as np
+from src.instrumentation import count, span
 from src.models.clarinet import Clarinet
 from src.simulation.physics import SimulationEngine
-from scipy.optimize import minimize_scalar
+from src.simulation.peaks import find_peaks
+from src.simulation.jacobian import resonance_jacobian
+from src.simulation.tmm import tmm_impedance
+from src.optimization.surrogate import ResponseSurface, latin_hypercube
+from scipy.optimize import least_squares, minimize_scalar
+
+# Parameters tune_scale can adjust, in the order they appear in its parameter vector
+HOLE_PARAMETERS = ("position", "radius", "chimney")
+
+# Early-stopped sweeps remembered per Optimizer, least recently used evicted first
+PARTIAL_PEAKS_ENTRIES = 256
 
 class Optimizer:
     """
     Handles automated optimization of instrument geometry.
-    Currently supports tuning hole positions to match target resonance frequencies.
+    Supports tuning one hole position to a target frequency, and tuning all
+    holes jointly to a scale of (fingering, target frequency) pairs.
     """
     def __init__(self, clarinet: Clarinet, simulation_engine: SimulationEngine):
         self.clarinet = clarinet
         self.sim = simulation_engine
+        # Peaks of sweeps stopped early, by cache key: the engine only caches complete sweeps
+        self._partial_peaks = OrderedDict()
 
-    def tune_hole_position(self, target_frequency: float, hole_index: int, search_range: float = 0.05):
+    def tune_hole_position(self, target_frequency: float, hole_index: int, search_range: float = 0.05,
+                           surrogate: bool = False, n_samples: int = 5, tolerance_cents: float = 1.0,
+                           max_refinements: int = 4, early_stop: bool = True, progress=None):
         """
         Adjusts the position of a specific hole to match the first resonance to target_frequency.
 
+        With surrogate=True the FEM is only solved at a small Latin hypercube
+        design of positions; a quadratic response surface of the resonance
+        (in cents) versus position is searched instead, and its optimum is
+        confirmed with a real solve. Points that miss by more than
+        tolerance_cents are added to the fit and the search is repeated.
+
         Args:
             target_frequency (float): The desired frequency in Hz.
             hole_index (int): The index of the hole in the sorted holes list.
             search_range (float): +/- meters to search around current position.
+            surrogate (bool): Use the response-surface mode.
+            n_samples (int): Design-of-experiments size for the surrogate (at least 3).
+            tolerance_cents (float): Accepted confirmation error for the surrogate.
+            max_refinements (int): Maximum confirmation solves for the surrogate (at least 1).
+            early_stop (bool): Stop each frequency sweep once the resonances needed
+                to score the trial position have been found.
+            progress (callable): Called as progress(solves_done, None) after every
+                solve; an exception it raises aborts the optimization.
 
         Returns:
-            dict: result with keys 'success', 'new_position', 'error'.
+            dict: result with keys 'success', 'new_position', 'error', 'solves'.
+            The surrogate mode adds 'surrogate_rms_cents' (leave-one-out error
+            on the design), 'surrogate_error_cents' (prediction minus the
+            confirming solve) and 'solves_saved' (estimated, versus searching
+            the FEM directly).
         """
         if hole_index >= len(self.clarinet.holes):
             raise ValueError("Invalid hole index")
@@ -32,56 +69,389 @@ class Optimizer:
         hole_to_optimize = self.clarinet.holes[hole_index]
         original_pos = hole_to_optimize.position
 
-        def objective(pos_shift):
-            # Apply shift to the specific hole object
-            new_pos = original_pos + pos_shift
+        # Keep the assembled physics between evaluations: each trial only
+        # moves one hole, so only the pipes around it are reassembled.
+        session = self.sim.open_session(self.clarinet) if self.sim.backend == "fem" else None
+        solves = 0
+
+        def peaks_at(pos_shift, enough=None):
+            nonlocal solves
+            with span("optimizer.evaluation", shift=float(pos_shift)):
+                hole_to_optimize.position = original_pos + pos_shift
+
+                # Sort holes to maintain physics validity (OpenWind might assume sorted)
+                # Note: This changes the order in the list if holes cross!
+                # However, our 'hole_to_optimize' variable still points to the correct object instance.
+                self.clarinet.holes.sort(key=lambda h: h.position)
+
+                # Run simulation
+                # Resonances stream in ascending order; once one lies above the
+                # target no later one can be closer, so the rest of the sweep is
+                # skipped (enough() overrides that test). Complete sweeps land in
+                # the engine's ImpedanceCache and sweeps stopped early in
+                # _partial_peaks, both keyed on the geometry values, so revisited
+                # positions are free either way.
+                enough = enough or (lambda peaks: len(peaks) and peaks[-1] >= target_frequency)
+                key = self.sim.cache_key(self.clarinet)
+                partial = self._partial_peaks.get(key)
+                if early_stop and partial is not None and enough(partial):
+                    self._partial_peaks.move_to_end(key)
+                    peaks = list(partial)
+                else:
+                    for update in self.sim.iter_impedance_simulation(self.clarinet, session=session):
+                        peaks = update.peaks.frequency.tolist()
+                        if early_stop and enough(peaks):
+                            break
+                    if len(update.frequencies) < update.total:
+                        self._partial_peaks[key] = peaks
+                        self._partial_peaks.move_to_end(key)
+                        if len(self._partial_peaks) > PARTIAL_PEAKS_ENTRIES:
+                            self._partial_peaks.popitem(last=False)
+                solves += 1
+                count("optimizer.evaluations")
+                if progress is not None:
+                    progress(solves, None)
+                return peaks
 
-            # Constraint: Keep within bore bounds (rough check)
+        if surrogate:
+            # Trial positions stay within the bore, as in the direct search
+            bore_start = self.clarinet.bore[0].position if self.clarinet.bore else 0.0
+            bore_end = self.clarinet.bore[-1].position if self.clarinet.bore else 1.0
+            bounds = (max(-search_range, bore_start - original_pos), min(search_range, bore_end - original_pos))
+            result = self._tune_with_surrogate(
+                peaks_at, target_frequency, bounds, n_samples, tolerance_cents, max_refinements
+            )
+        else:
             bore_len = self.clarinet.bore[-1].position if self.clarinet.bore else 1.0
-            if new_pos < 0 or new_pos > bore_len:
-                return 1e6
-
-            hole_to_optimize.position = new_pos
-
-            # Sort holes to maintain physics validity (OpenWind might assume sorted)
-            # Note: This changes the order in the list if holes cross!
-            # However, our 'hole_to_optimize' variable still points to the correct object instance.
-            self.clarinet.holes.sort(key=lambda h: h.position)
-
-            # Run simulation
-            # We bypass the cache here because we are modifying geometry in a loop
-            # and want fresh results. The simulation engine cache might need to be mindful,
-            # but since we modify the object, the cache (if hashing value) should update.
-            # Currently our simple cache in physics.py relies on the object reference or value.
-            # To be safe, we might need to rely on the physics engine correctly handling it.
-            # St.cache_data usually hashes input arguments. If 'clarinet' content changes, hash changes.
-
-            freqs, impedance = self.sim.run_impedance_simulation(self.clarinet)
-            peaks = self.sim.detect_peaks(freqs, impedance)
-
-            if not peaks:
-                return 1e6 # Penalty if no peaks found
-
-            # Find the peak closest to target
-            closest_peak = min(peaks, key=lambda p: abs(p[0] - target_frequency))
-            return abs(closest_peak[0] - target_frequency)
-
-        # Optimize
-        # bounded method is good for 1D scalar optimization with limits
-        result = minimize_scalar(
-            objective,
-            bounds=(-search_range, search_range),
-            method='bounded',
-            options={'xatol': 1e-4} # Tolerance of 0.1mm
-        )
+
+            def objective(pos_shift):
+                # Constraint: Keep within bore bounds (rough check)
+                new_pos = original_pos + pos_shift
+                if new_pos < 0 or new_pos > bore_len:
+                    return 1e6
+
+                peaks = peaks_at(pos_shift)
+                if not peaks:
+                    return 1e6 # Penalty if no peaks found
+
+                # Find the peak closest to target
+                closest_peak = min(peaks, key=lambda f: abs(f - target_frequency))
+                return abs(closest_peak - target_frequency)
+
+            # Optimize
+            # bounded method is good for 1D scalar optimization with limits
+            opt = minimize_scalar(
+                objective,
+                bounds=(-search_range, search_range),
+                method='bounded',
+                options={'xatol': 1e-4} # Tolerance of 0.1mm
+            )
+            result = {"success": opt.success, "shift": opt.x, "error": opt.fun}
 
         # Apply best result final time
-        best_pos = original_pos + result.x
+        best_pos = original_pos + result.pop("shift")
         hole_to_optimize.position = best_pos
         self.clarinet.holes.sort(key=lambda h: h.position)
 
+        if surrogate:
+            result["solves_saved"] = max(0, result.pop("direct_estimate") - solves)
+        return {"success": result.pop("success"), "new_position": best_pos,
+                "error": result.pop("error"), "solves": solves, **result}
+
+    def _tune_with_surrogate(self, peaks_at, target_frequency, shift_bounds, n_samples,
+                             tolerance_cents, max_refinements):
+        """
+        Response-surface search used by tune_hole_position(surrogate=True).
+        peaks_at(shift, enough) runs one real solve and returns the peak
+        frequencies, stopping the sweep once enough(peaks) is true.
+        shift_bounds is the (min, max) shift of the hole searched.
+        """
+        if n_samples < 3:
+            raise ValueError("The surrogate needs at least 3 samples.")
+        if max_refinements < 1:
+            raise ValueError("The surrogate needs at least 1 refinement to confirm its optimum.")
+        if shift_bounds[0] >= shift_bounds[1]:
+            raise ValueError("The hole has no room to move within the bore.")
+        bounds = [tuple(shift_bounds)]
+
+        def cents(f):
+            return 1200 * np.log2(f / target_frequency)
+
+        # Track the resonance nearest the target at the starting position
+        start_peaks = peaks_at(0.0)
+        if not start_peaks:
+            raise RuntimeError("Optimization failed: no resonance found at the starting position.")
+        mode = int(np.argmin(np.abs(cents(np.array(start_peaks)))))
+
+        def response(shift):
+            peaks = peaks_at(shift, enough=lambda found: len(found) > mode)
+            return cents(peaks[mode]) if len(peaks) > mode else np.nan
+
+        x = np.concatenate([[0.0], latin_hypercube(n_samples - 1, bounds)[:, 0]])
+        y = np.array([cents(start_peaks[mode])] + [response(s) for s in x[1:]])
+        valid = np.isfinite(y)
+        if valid.sum() < 3:
+            raise RuntimeError("Optimization failed: the tracked resonance was lost in too many samples.")
+        x, y = x[valid], y[valid]
+
+        surface = ResponseSurface(bounds).fit(x[:, None], y)
+        loo = surface.loo_residuals(x[:, None], y)
+
+        direct_estimate = None
+        surrogate_error = np.nan
+        offset = 0.0  # Bias correction so the model passes through the last confirmation
+        for _ in range(max_refinements):
+            opt = minimize_scalar(
+                lambda s: abs(surface.predict([[s]])[0] + offset),
+                bounds=bounds[0], method='bounded', options={'xatol': 1e-4},
+            )
+            # A direct search runs this same bounded search on the FEM, so its
+            # evaluation count estimates the solves the surrogate replaces.
+            if direct_estimate is None:
+                direct_estimate = opt.nfev
+            actual = response(opt.x)
+            if not np.isfinite(actual):
+                break
+            surrogate_error = surface.predict([[opt.x]])[0] + offset - actual
+            x, y = np.append(x, opt.x), np.append(y, actual)
+            if abs(actual) <= tolerance_cents:
+                break
+            # Refine the fit where it matters: around the candidate optimum
+            surface.fit(x[:, None], y)
+            offset = actual - surface.predict([[opt.x]])[0]
+
+        # Best geometry actually solved (normally the last confirmation)
+        best = int(np.argmin(np.abs(y)))
+        found = target_frequency * 2 ** (y[best] / 1200)
+        return {
+            "success": bool(abs(y[best]) <= tolerance_cents),
+            "shift": x[best],
+            "error": abs(found - target_frequency),
+            "surrogate_rms_cents": float(np.sqrt(np.mean(loo ** 2))),
+            "surrogate_error_cents": float(surrogate_error),
+            "direct_estimate": direct_estimate,
+        }
+
+    def tune_scale(self, targets: Sequence[Tuple[Optional[str], float]],
+                   parameters: Sequence[str] = ("position", "radius"),
+                   search_range: float = 0.02,
+                   radius_bounds: Tuple[float, float] = (0.001, 0.006),
+                   chimney_bounds: Tuple[float, float] = (0.002, 0.015),
+                   min_wall: float = 0.002,
+                   window_cents: float = 150.0,
+                   points_per_window: int = 15,
+                   max_evaluations: int = 40,
+                   diff_step: float = 1e-4,
+                   jacobian: bool = False,
+                   progress=None):
+        """
+        Jointly adjusts every hole to match a scale using least squares.
+
+        The residuals are the tuning errors in cents of each target, plus an
+        ordering penalty that keeps at least min_wall of material between
+        neighbouring holes (so holes never overlap or swap order). Each target
+        is only evaluated on a small window of frequencies around it, and all
+        evaluations share one SimulationSession, so a step that changes one
+        hole only reassembles the pipes next to that hole. With the engine's
+        TMM backend every window is solved analytically instead.
+
+        Args:
+            targets (list): (fingering, frequency) pairs. The fingering is a note of
+                the clarinet's fingering chart, or None for all holes open. The
+                resonance of that fingering nearest the frequency is tuned to it.
+            parameters (list): Which of "position", "radius", "chimney" to adjust.
+            search_range (float): +/- meters each hole may move.
+            radius_bounds (tuple): (min, max) hole radius in m.
+            chimney_bounds (tuple): (min, max) chimney height in m.
+            min_wall (float): Minimum gap between neighbouring hole edges (m).
+            window_cents (float): Half-width of the frequency window around each target.
+            points_per_window (int): Frequencies solved per window.
+            max_evaluations (int): Maximum residual evaluations (excluding the Jacobian's).
+            diff_step (float): Relative finite-difference step for the Jacobian.
+            jacobian (bool): Differentiate the tuned resonances with
+                resonance_jacobian (fitted peaks, physical step sizes, same
+                session) instead of differencing the residuals.
+            progress (callable): Called as progress(simulations_done, None) after every
+                evaluation; an exception it raises aborts the optimization.
+
+        Returns:
+            dict: result with keys 'success', 'positions', 'radii', 'chimneys',
+            'frequencies', 'errors_cents', 'rms_cents', 'iterations' (Jacobian
+            updates), 'evaluations' (residual evaluations), 'simulations'
+            (solves, counting the finite-difference ones), 'wall_time', 'message'.
+        """
+        start = time.perf_counter()
+        holes = self.clarinet.holes
+        if not holes:
+            raise ValueError("The design has no holes to tune.")
+        if not targets:
+            raise ValueError("At least one target is required.")
+        unknown = set(parameters) - set(HOLE_PARAMETERS)
+        if unknown or not parameters:
+            raise ValueError(f"Parameters must be chosen from {HOLE_PARAMETERS}.")
+        kinds = [kind for kind in HOLE_PARAMETERS if kind in parameters]
+        n_holes = len(holes)
+
+        # --- Frequency windows: one merged grid per fingering --------------
+        target_freqs = np.array([f for _, f in targets], dtype=float)
+        ratio = 2 ** (window_cents / 1200 * np.linspace(-1, 1, points_per_window))
+        windows = target_freqs[:, None] * ratio  # (n_targets, points)
+        notes = list(dict.fromkeys(note for note, _ in targets))
+        states = {note: (None if note is None else self.clarinet.get_fingering_states(note)) for note in notes}
+        grids, rows_of_note = {}, {}
+        for note in notes:
+            rows = [i for i, (n, _) in enumerate(targets) if n == note]
+            grids[note] = np.unique(windows[rows])
+            rows_of_note[note] = (rows, np.searchsorted(grids[note], windows[rows]))
+
+        # --- Parameter vector and bounds -----------------------------------
+        bore_start = self.clarinet.bore[0].position if self.clarinet.bore else 0.0
+        bore_end = self.clarinet.bore[-1].position if self.clarinet.bore else 1.0
+        x0, lower, upper = [], [], []
+        for kind in kinds:
+            values = np.array([getattr(h, kind) for h in holes], dtype=float)
+            if kind == "position":
+                lo = np.maximum(values - search_range, bore_start)
+                hi = np.minimum(values + search_range, bore_end)
+            else:
+                lo, hi = radius_bounds if kind == "radius" else chimney_bounds
+                lo, hi = np.full(n_holes, lo), np.full(n_holes, hi)
+            # Never exclude the starting design
+            x0.append(values)
+            lower.append(np.minimum(lo, values))
+            upper.append(np.maximum(hi, values))
+        x0, lower, upper = np.concatenate(x0), np.concatenate(lower), np.concatenate(upper)
+
+        def unpack(x):
+            values = {kind: np.array([getattr(h, kind) for h in holes], dtype=float) for kind in HOLE_PARAMETERS}
+            for k, kind in enumerate(kinds):
+                values[kind] = x[k * n_holes:(k + 1) * n_holes]
+            return values
+
+        if self.sim.backend == "tmm":
+            # Analytic solves have nothing to assemble: each note is solved directly
+            bore = self.clarinet.bore_array()
+            session = None
+
+            def solve_note(values, note):
+                rows = np.column_stack([values[kind] for kind in HOLE_PARAMETERS])
+                with span("solve", backend="tmm"):
+                    return tmm_impedance(bore, rows, self.sim.temperature, grids[note], self.sim.losses, states[note])
+        else:
+            # The session is built on the highest window so later windows keep its mesh
+            session = self.sim.open_session(self.clarinet)
+            session.set_frequencies(grids[max(notes, key=lambda n: grids[n][-1])])
+
+            def solve_note(values, note):
+                for i, hole in enumerate(session.clarinet.holes):
+                    if values["position"][i] != hole.position:
+                        session.move_hole(i, values["position"][i])
+                    if values["radius"][i] != hole.radius or values["chimney"][i] != hole.chimney:
+                        session.resize_hole(i, values["radius"][i], values["chimney"][i])
+                session.set_frequencies(grids[note])
+                session.set_fingering(states[note])
+                return session.solve()[1]
+        simulations = 0
+        last = {}
+
+        def tuned_frequencies(x):
+            nonlocal simulations
+            values = unpack(x)
+            mag = np.empty(windows.shape)
+            with span("optimizer.evaluation", notes=len(notes)):
+                for note in notes:
+                    impedance = solve_note(values, note)
+                    simulations += 1
+                    rows, cols = rows_of_note[note]
+                    mag[rows] = 20 * np.log10(np.abs(impedance))[cols]
+            count("optimizer.evaluations")
+            if progress is not None:
+                progress(simulations, None)
+
+            # Nearest resonance to each target; fall back to the window maximum
+            found = windows[np.arange(len(targets)), mag.argmax(axis=1)]
+            peaks = find_peaks(windows, mag_db=mag, min_magnitude_db=-np.inf)
+            if len(peaks):
+                distance = np.abs(np.log2(peaks.frequency / target_freqs[peaks.row]))
+                order = np.lexsort((distance, peaks.row))
+                rows, first = np.unique(peaks.row[order], return_index=True)
+                found[rows] = peaks.frequency[order[first]]
+            return values, found
+
+        def residuals(x):
+            values, found = tuned_frequencies(x)
+            cents = 1200 * np.log2(found / target_freqs)
+            last["x"], last["found"] = x.copy(), found
+
+            # Ordering penalty: 1 mm of missing wall costs 100 cents
+            r = values["radius"]
+            wall = np.diff(values["position"]) - (r[:-1] + r[1:]) - min_wall
+            penalty = 1e5 * np.minimum(wall, 0.0)
+            return np.concatenate([cents, penalty])
+
+        names = [f"hole.{i}.{kind}" for kind in kinds for i in range(n_holes)]
+
+        def jac(x):
+            nonlocal simulations
+            if not np.array_equal(last.get("x"), x):
+                residuals(x)
+            values = unpack(x)
+            design = Clarinet.from_arrays(
+                self.clarinet.bore.positions, self.clarinet.bore.radii, values["position"], values["radius"],
+                values["chimney"], [h.label for h in holes], fingerings=self.clarinet.fingerings,
+            )
+            tracked = [(note, f) for (note, _), f in zip(targets, last["found"])]
+            result = resonance_jacobian(self.sim, design, parameters=names, resonances=tracked,
+                                        central=False, session=session)
+            simulations += result.solves
+            cents = np.nan_to_num(result.cents)
+
+            # Ordering penalty: active rows move with the gap they measure
+            r = values["radius"]
+            active = np.diff(values["position"]) - (r[:-1] + r[1:]) - min_wall < 0
+            penalty = np.zeros((n_holes - 1, len(names)))
+            for k, kind in enumerate(kinds):
+                if kind == "position":
+                    sign = (1, -1)
+                elif kind == "radius":
+                    sign = (-1, -1)
+                else:
+                    continue
+                gaps = np.arange(n_holes - 1)
+                penalty[gaps, k * n_holes + gaps + 1] = 1e5 * sign[0] * active
+                penalty[gaps, k * n_holes + gaps] = 1e5 * sign[1] * active
+            return np.vstack([cents, penalty])
+
+        try:
+            result = least_squares(
+                residuals, x0, jac=jac if jacobian else "2-point", bounds=(lower, upper),
+                x_scale=np.abs(x0) + 1e-6, diff_step=diff_step, max_nfev=max_evaluations, method="trf",
+            )
+            if not np.array_equal(last.get("x"), result.x):
+                residuals(result.x)
+        except Exception as e:
+            raise RuntimeError(f"Optimization failed: {e}")
+
+        # Apply the best design
+        values = unpack(result.x)
+        for i, hole in enumerate(holes):
+            hole.position = float(values["position"][i])
+            hole.radius = float(values["radius"][i])
+            hole.chimney = float(values["chimney"][i])
+        holes.sort(key=lambda h: h.position)
+
+        errors = 1200 * np.log2(last["found"] / target_freqs)
         return {
-            "success": result.success,
-            "new_position": best_pos,
-            "error": result.fun
+            "success": bool(result.success),
+            "positions": values["position"].tolist(),
+            "radii": values["radius"].tolist(),
+            "chimneys": values["chimney"].tolist(),
+            "frequencies": last["found"].tolist(),
+            "errors_cents": errors.tolist(),
+            "rms_cents": float(np.sqrt(np.mean(errors ** 2))),
+            "iterations": int(result.njev or 0),
+            "evaluations": int(result.nfev),
+            "simulations": simulations,
+            "wall_time": time.perf_counter() - start,
+            "message": result.message,
         }
@@ -0,0 +1,94 @@
+import warnings
+from itertools import combinations_with_replacement
+from typing import Sequence, Tuple
+import numpy as np
+from scipy.stats import qmc
+
+
+def latin_hypercube(n_samples: int, bounds: Sequence[Tuple[float, float]], seed: int = 0) -> np.ndarray:
+    """
+    Latin hypercube design over a box.
+
+    Args:
+        n_samples (int): Number of points.
+        bounds (list): (low, high) per parameter.
+        seed (int): Seed, so repeated runs probe the same geometries (and hit the cache).
+
+    Returns:
+        np.ndarray: shape (n_samples, n_parameters).
+    """
+    bounds = np.asarray(bounds, dtype=float)
+    unit = qmc.LatinHypercube(d=len(bounds), seed=seed).random(n_samples)
+    return qmc.scale(unit, bounds[:, 0], bounds[:, 1])
+
+
+def sobol_sequence(n_samples: int, bounds: Sequence[Tuple[float, float]], seed: int = 0) -> np.ndarray:
+    """
+    Scrambled Sobol points over a box (best balanced when n_samples is a power of two).
+
+    Args:
+        n_samples (int): Number of points.
+        bounds (list): (low, high) per parameter.
+        seed (int): Scrambling seed.
+
+    Returns:
+        np.ndarray: shape (n_samples, n_parameters).
+    """
+    bounds = np.asarray(bounds, dtype=float)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)  # Balance warning for non-powers of two
+        unit = qmc.Sobol(d=len(bounds), scramble=True, seed=seed).random(n_samples)
+    return qmc.scale(unit, bounds[:, 0], bounds[:, 1])
+
+
+class ResponseSurface:
+    """
+    Polynomial response surface y ~ f(x) fitted by linear least squares.
+
+    Inputs are rescaled to [-1, 1] over the given bounds so the monomials stay
+    well conditioned. Used by the optimizer to stand in for FEM solves.
+    """
+
+    def __init__(self, bounds: Sequence[Tuple[float, float]], degree: int = 2):
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.degree = degree
+        self.coefficients = None
+        self._terms = [
+            combo for d in range(degree + 1)
+            for combo in combinations_with_replacement(range(len(self.bounds)), d)
+        ]
+
+    @property
+    def n_terms(self) -> int:
+        return len(self._terms)
+
+    def _features(self, x) -> np.ndarray:
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+        low, high = self.bounds[:, 0], self.bounds[:, 1]
+        u = 2 * (x - low) / (high - low) - 1
+        return np.stack([np.prod(u[:, list(combo)], axis=1) for combo in self._terms], axis=1)
+
+    def fit(self, x, y):
+        """Fits the surface to samples x (n, d) and responses y (n,)."""
+        y = np.asarray(y, dtype=float)
+        if len(y) < self.n_terms:
+            raise ValueError(f"A degree-{self.degree} surface needs at least {self.n_terms} samples.")
+        self.coefficients, *_ = np.linalg.lstsq(self._features(x), y, rcond=None)
+        return self
+
+    def predict(self, x) -> np.ndarray:
+        """Evaluates the surface at x (n, d) or a single point (d,)."""
+        if self.coefficients is None:
+            raise RuntimeError("The response surface has not been fitted.")
+        return self._features(x) @ self.coefficients
+
+    def loo_residuals(self, x, y) -> np.ndarray:
+        """
+        Leave-one-out prediction errors of the fitted surface, computed in
+        closed form from the hat matrix (no refitting).
+        """
+        A = self._features(x)
+        y = np.asarray(y, dtype=float)
+        leverage = np.einsum("ij,ji->i", A, np.linalg.pinv(A))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (y - A @ self.coefficients) / (1 - leverage)
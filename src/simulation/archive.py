@@ -0,0 +1,226 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+from src.models.clarinet import Clarinet
+from src.simulation.peaks import PeakTable
+
+# Bump when the layout of result files or archives changes
+FORMAT_VERSION = 1
+
+_PEAK_COLUMNS = tuple(PeakTable.__dataclass_fields__)
+
+
+@dataclass
+class ArchivedResult:
+    """
+    One simulation result with everything needed to interpret it: the design,
+    the solver settings, the frequency grid, the complex impedance and the
+    detected peaks.
+
+    Results read from a ResultArchive hold read-only memory-mapped arrays;
+    the impedance is only read from disk when it is actually used.
+    """
+    key: str                   # Result key (design + settings hash, see SimulationEngine.cache_key)
+    fingerprint: str           # Design hash (Clarinet.fingerprint)
+    design: dict               # Clarinet.to_dict()
+    settings: dict             # SimulationEngine.config() without the frequency grid
+    frequencies: np.ndarray
+    impedance: np.ndarray
+    peaks: PeakTable
+
+    @property
+    def clarinet(self) -> Clarinet:
+        return Clarinet.from_dict(self.design)
+
+    @classmethod
+    def from_simulation(cls, engine, clarinet: Clarinet, frequencies, impedance):
+        """Bundles a result of engine for clarinet (peaks are detected with the engine's thresholds)."""
+        settings = engine.config()
+        del settings["frequencies"]
+        settings = {k: v.item() if isinstance(v, np.generic) else v for k, v in settings.items()}
+        frequencies, impedance = np.asarray(frequencies, dtype=np.float64), np.asarray(impedance, dtype=np.complex128)
+        return cls(engine.cache_key(clarinet), clarinet.fingerprint(), clarinet.to_dict(), settings,
+                   frequencies, impedance, engine.analyze_peaks(frequencies, impedance))
+
+
+def _peaks_to_lists(peaks: PeakTable) -> dict:
+    return {name: getattr(peaks, name).tolist() for name in _PEAK_COLUMNS}
+
+
+def _peaks_from_lists(columns: dict) -> PeakTable:
+    return PeakTable(*(np.asarray(columns[name], dtype=int if name == "row" else float)
+                       for name in _PEAK_COLUMNS))
+
+
+def save_result(result: ArchivedResult, file):
+    """
+    Writes a single result as an uncompressed .npz (readable with numpy alone).
+
+    Args:
+        result (ArchivedResult): The result to save.
+        file (str or file-like): Destination path or binary stream.
+    """
+    meta = {"version": FORMAT_VERSION, "key": result.key, "fingerprint": result.fingerprint,
+            "design": result.design, "settings": result.settings}
+    np.savez(
+        file,
+        meta=np.array(json.dumps(meta)),
+        frequencies=np.asarray(result.frequencies, dtype=np.float64),
+        impedance=np.asarray(result.impedance, dtype=np.complex128),
+        **{f"peaks_{name}": getattr(result.peaks, name) for name in _PEAK_COLUMNS},
+    )
+
+
+def load_result(file) -> ArchivedResult:
+    """Reads a result written by save_result (path or binary stream)."""
+    with np.load(file, allow_pickle=False) as data:
+        meta = json.loads(str(data["meta"]))
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported result format version: {meta.get('version')}")
+        peaks = PeakTable(*(data[f"peaks_{name}"] for name in _PEAK_COLUMNS))
+        return ArchivedResult(meta["key"], meta["fingerprint"], meta["design"], meta["settings"],
+                              data["frequencies"], data["impedance"], peaks)
+
+
+def result_to_bytes(result: ArchivedResult) -> bytes:
+    """save_result into memory, e.g. for a download button."""
+    buffer = io.BytesIO()
+    save_result(result, buffer)
+    return buffer.getvalue()
+
+
+class ResultArchive:
+    """
+    Append-only archive of many results in one directory, readable with numpy.
+
+    Layout:
+        impedance.bin   complex128 samples of every result, back to back
+        grids.bin       float64 frequency grids, each distinct grid stored once
+        index.jsonl     one JSON record per result: keys, design, settings,
+                        peaks and the offsets of its arrays in the .bin files
+
+    Appending writes the arrays first and the index line last, so an
+    interrupted append leaves at worst unreferenced bytes (and a truncated
+    last line, which is ignored on open). Opening reads only the index;
+    impedance arrays are memory-mapped on access. One writer at a time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._records: Dict[str, dict] = {}
+        self._by_fingerprint: Dict[str, List[str]] = {}
+        self._grids: Dict[str, dict] = {}
+        self._load_index()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load_index(self):
+        if not os.path.exists(self._file("index.jsonl")):
+            return
+        with open(self._file("index.jsonl")) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Truncated by an interrupted append
+                self._index(record)
+
+    def _index(self, record):
+        self._records[record["key"]] = record
+        self._by_fingerprint.setdefault(record["fingerprint"], []).append(record["key"])
+        self._grids.setdefault(record["grid"]["hash"], record["grid"])
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, key):
+        return key in self._records
+
+    def __iter__(self) -> Iterator[ArchivedResult]:
+        for key in list(self._records):
+            yield self.get(key)
+
+    def keys(self) -> List[str]:
+        return list(self._records)
+
+    @staticmethod
+    def _append_bytes(filename, array) -> int:
+        """Appends array to filename and returns its byte offset."""
+        with open(filename, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(array).tobytes())
+        return offset
+
+    def append(self, result: ArchivedResult) -> bool:
+        """
+        Adds result unless its key is already archived.
+
+        Returns:
+            bool: True if the result was written, False if it was a duplicate.
+        """
+        frequencies = np.ascontiguousarray(result.frequencies, dtype=np.float64)
+        impedance = np.ascontiguousarray(result.impedance, dtype=np.complex128)
+        if frequencies.shape != impedance.shape:
+            raise ValueError("Frequencies and impedance must have the same length.")
+
+        with self._lock:
+            if result.key in self._records:
+                return False
+
+            grid_hash = hashlib.sha256(frequencies.tobytes()).hexdigest()
+            grid = self._grids.get(grid_hash)
+            if grid is None:
+                grid = {"hash": grid_hash, "offset": self._append_bytes(self._file("grids.bin"), frequencies),
+                        "length": len(frequencies)}
+
+            record = {
+                "version": FORMAT_VERSION,
+                "key": result.key,
+                "fingerprint": result.fingerprint,
+                "design": result.design,
+                "settings": result.settings,
+                "grid": grid,
+                "impedance_offset": self._append_bytes(self._file("impedance.bin"), impedance),
+                "peaks": _peaks_to_lists(result.peaks),
+            }
+            line = (json.dumps(record) + "\n").encode()
+            with open(self._file("index.jsonl"), "a+b") as f:
+                end = f.seek(0, os.SEEK_END)
+                if end:
+                    # Start on a fresh line after a truncated one
+                    f.seek(end - 1)
+                    if f.read(1) != b"\n":
+                        line = b"\n" + line
+                f.write(line)
+            self._index(record)
+        return True
+
+    def _memmap(self, name, dtype, offset, length):
+        if length == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode="r", offset=offset, shape=(length,))
+
+    def get(self, key: str) -> Optional[ArchivedResult]:
+        """Returns the result stored under key (arrays memory-mapped), or None."""
+        record = self._records.get(key)
+        if record is None:
+            return None
+        grid = record["grid"]
+        return ArchivedResult(
+            record["key"], record["fingerprint"], record["design"], record["settings"],
+            self._memmap("grids.bin", np.float64, grid["offset"], grid["length"]),
+            self._memmap("impedance.bin", np.complex128, record["impedance_offset"], grid["length"]),
+            _peaks_from_lists(record["peaks"]),
+        )
+
+    def find(self, fingerprint: str) -> List[ArchivedResult]:
+        """All results for a design hash (e.g. the same design at several temperatures)."""
+        return [self.get(key) for key in self._by_fingerprint.get(fingerprint, [])]
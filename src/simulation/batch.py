@@ -0,0 +1,158 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+import numpy as np
+from src.models.clarinet import Clarinet
+from src.simulation.cache import ImpedanceCache
+from src.simulation.physics import SimulationEngine
+
+
+@dataclass
+class DesignResult:
+    """
+    Outcome of one design in a batch run.
+    """
+    index: int                   # Position of the design in the input sequence
+    name: str
+    frequencies: Optional[np.ndarray] = None
+    impedance: Optional[np.ndarray] = None
+    error: Optional[str] = None  # Set instead of impedance when the design failed
+    elapsed: float = 0.0         # Seconds spent on this design (0 for cache hits)
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+# Per-process engine cache so each worker opens the shared disk tier only once
+_worker_caches = {}
+
+
+def _simulate_payload(payload, cache: ImpedanceCache = None):
+    """
+    Worker entry point. Receives only plain data (design dict + engine config)
+    and never raises: failures are returned as an error string. Pool workers
+    keep one cache per disk directory; in-process runs pass the engine's.
+    """
+    key, design, config, cache_dir = payload
+    start = time.perf_counter()
+    try:
+        if cache is None:
+            if cache_dir not in _worker_caches:
+                _worker_caches[cache_dir] = ImpedanceCache(cache_dir=cache_dir)
+            cache = _worker_caches[cache_dir]
+        sim = SimulationEngine.from_config(config, cache=cache)
+        freqs, imp = sim.run_impedance_simulation(Clarinet.from_dict(design))
+        return key, np.asarray(freqs), np.asarray(imp), None, time.perf_counter() - start
+    except Exception as e:
+        return key, None, None, f"{type(e).__name__}: {e}", time.perf_counter() - start
+
+
+class BatchRun:
+    """
+    Iterable over the results of simulate_many, in completion order.
+
+    Counters (completed, failed, throughput) are updated live while iterating.
+    Identical designs are solved once, and results already in the engine's
+    cache are yielded immediately without touching the pool.
+    """
+
+    def __init__(self, designs, engine: SimulationEngine, workers: int):
+        self.engine = engine
+        self.workers = workers
+        self.designs = [self._normalize(d) for d in designs]
+        self.completed = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+    @staticmethod
+    def _normalize(design):
+        # Accept either a Clarinet or (Clarinet, {engine setting overrides})
+        if isinstance(design, tuple):
+            return design
+        return design, {}
+
+    @property
+    def throughput(self) -> float:
+        """Designs completed per second of wall time so far."""
+        return self.completed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __len__(self):
+        return len(self.designs)
+
+    def __iter__(self) -> Iterator[DesignResult]:
+        start = time.perf_counter()
+        base_config = self.engine.config()
+        cache = self.engine.cache
+
+        # Group identical requests by cache key
+        pending = {}
+        for index, (clarinet, overrides) in enumerate(self.designs):
+            sim = SimulationEngine.from_config({**base_config, **overrides}, cache=cache)
+            key = sim.cache_key(clarinet)
+            if key not in pending:
+                pending[key] = {"indices": [], "clarinet": clarinet, "config": sim.config()}
+            pending[key]["indices"].append(index)
+
+        def emit(key, freqs, imp, error, elapsed, cached=False):
+            job = pending.pop(key)
+            if error is None and not cached and not in_process:
+                # Workers already wrote the disk tier; keep the result in memory here too
+                freqs, imp = cache.put(key, freqs, imp, persist=False)
+            for index in job["indices"]:
+                self.completed += 1
+                self.failed += error is not None
+                self.elapsed = time.perf_counter() - start
+                name = self.designs[index][0].name
+                yield DesignResult(index, name, freqs, imp, error, elapsed, cached)
+
+        in_process = self.workers <= 1
+        for key in list(pending):
+            hit = cache.get(key)
+            if hit is not None:
+                yield from emit(key, *hit, None, 0.0, cached=True)
+
+        payloads = [
+            (key, job["clarinet"].to_dict(), job["config"], cache.cache_dir)
+            for key, job in pending.items()
+        ]
+        if in_process:
+            # Solved through the engine's own cache, which stores the result
+            for key, design, config, _ in payloads:
+                yield from emit(*_simulate_payload((key, design, config, None), cache=cache))
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(_simulate_payload, p): p[0] for p in payloads}
+            for future in as_completed(futures):
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    # The worker process itself died (e.g. out of memory)
+                    outcome = (futures[future], None, None, f"{type(e).__name__}: {e}", 0.0)
+                yield from emit(*outcome)
+
+
+def simulate_many(designs: Iterable, workers: int = None, engine: SimulationEngine = None) -> BatchRun:
+    """
+    Simulates many designs in a process pool.
+
+    Only each design's bore/holes data and the engine settings are sent to the
+    workers. When the engine's cache has a disk tier, workers read and write
+    the same directory, so results are shared across processes and runs.
+
+    Args:
+        designs (iterable): Clarinet objects, or (Clarinet, overrides) tuples where
+            overrides is a dict of SimulationEngine settings (e.g. {"temperature": 30}).
+        workers (int): Number of worker processes (default: CPU count). 1 runs in-process.
+        engine (SimulationEngine): Source of default settings and of the result cache.
+
+    Returns:
+        BatchRun: iterate it to receive DesignResult objects as they complete.
+    """
+    engine = engine or SimulationEngine()
+    workers = workers or os.cpu_count() or 1
+    return BatchRun(designs, engine, workers)
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from src.instrumentation import count
+
+# Bump when the meaning of cached results changes, so stale disk entries are never reused
+KEY_VERSION = 2
+
+
+class ImpedanceCache:
+    """
+    Two-tier cache for impedance simulation results.
+
+    Entries are keyed by a content hash of everything that affects the physics
+    (bore, holes, temperature, loss model, frequency grid), so two runs that
+    differ in any of those can never share a result. The memory tier is a
+    bounded LRU; the optional disk tier stores one `.npz` file per entry and
+    survives process restarts (and can be shared between worker processes).
+    """
+
+    def __init__(self, max_entries: int = 128, cache_dir: str = None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(bore, holes, temperature, losses, frequencies, **extra) -> str:
+        """
+        Returns a canonical SHA-256 key for a simulation request.
+
+        Geometry and frequencies are hashed from their float64 bytes so that
+        equal values always produce the same key regardless of list/array type.
+        Extra keyword arguments (e.g. a fingering) are folded in as JSON.
+        """
+        h = hashlib.sha256(f"v{KEY_VERSION}|".encode())
+        h.update(np.ascontiguousarray(bore, dtype=np.float64).tobytes())
+        h.update(b"|holes|")
+        h.update(np.ascontiguousarray(holes, dtype=np.float64).tobytes())
+        h.update(b"|T|")
+        h.update(np.float64(temperature).tobytes())
+        h.update(b"|losses|")
+        h.update(repr(losses).encode())
+        h.update(b"|freqs|")
+        h.update(np.ascontiguousarray(frequencies, dtype=np.float64).tobytes())
+        if extra:
+            h.update(b"|extra|")
+            h.update(json.dumps(extra, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key):
+        """
+        Returns (frequencies, impedance) for key, or None on a miss.
+        Disk hits are promoted into the memory tier.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                count("cache.hits")
+                return self._memory[key]
+
+        if self.cache_dir and os.path.exists(self._path(key)):
+            try:
+                with np.load(self._path(key)) as data:
+                    entry = (data["frequencies"], data["impedance"])
+            except (OSError, KeyError, ValueError):
+                # Corrupt or partially written file: treat as a miss
+                entry = None
+            if entry is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                count("cache.disk_hits")
+                return self._remember(key, *entry)
+
+        with self._lock:
+            self.misses += 1
+        count("cache.misses")
+        return None
+
+    def put(self, key, frequencies, impedance, persist: bool = True):
+        """
+        Stores a result in the memory tier and, if enabled and persist is
+        True, on disk. Returns the (read-only) cached arrays.
+        """
+        entry = self._remember(key, frequencies, impedance)
+
+        if self.cache_dir and persist:
+            # Write to a temp file then rename, so concurrent readers never
+            # observe a half-written archive.
+            tmp = os.path.join(self.cache_dir, f".{key}.{os.getpid()}.{threading.get_ident()}.tmp.npz")
+            np.savez(tmp, frequencies=np.asarray(frequencies), impedance=np.asarray(impedance))
+            os.replace(tmp, self._path(key))
+        return entry
+
+    def _remember(self, key, frequencies, impedance):
+        freqs = np.array(frequencies, copy=True)
+        imp = np.array(impedance, copy=True)
+        # Cached arrays are shared between callers, so protect them from mutation
+        freqs.flags.writeable = False
+        imp.flags.writeable = False
+
+        with self._lock:
+            self._memory[key] = (freqs, imp)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+        return freqs, imp
+
+    def clear(self, disk: bool = False):
+        """Empties the memory tier (and the disk tier if disk=True)."""
+        with self._lock:
+            self._memory.clear()
+        if disk and self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".npz"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and current tier sizes."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+            }
+
+    def __len__(self):
+        return len(self._memory)
+
+
+_default_cache = None
+
+
+def get_default_cache() -> ImpedanceCache:
+    """
+    Returns the process-wide cache used by engines created without one.
+    The disk tier is enabled when CLARINET_CACHE_DIR is set.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ImpedanceCache(cache_dir=os.environ.get("CLARINET_CACHE_DIR"))
+    return _default_cache
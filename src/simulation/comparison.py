@@ -0,0 +1,198 @@
+import hashlib
+import warnings
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import numpy as np
+from src.simulation.peaks import PeakTable, magnitude_db
+
+
+@dataclass
+class StoredTrace:
+    """
+    A named simulation result kept for comparison.
+
+    The curve is stored as float32 magnitude (dB) and phase (rad), a quarter
+    of the complex128 impedance, which is plenty for plotting and curve
+    metrics. Peaks are detected on the full-precision result before storing.
+    """
+    name: str
+    key: str                   # Result key (design + settings hash), used for deduplication
+    frequencies: np.ndarray    # float32, shared between traces on the same grid
+    magnitude_db: np.ndarray   # float32
+    phase: np.ndarray          # float32, radians
+    peaks: PeakTable
+
+    @property
+    def impedance(self) -> np.ndarray:
+        """Complex impedance rebuilt from the stored magnitude and phase."""
+        magnitude = 10 ** (self.magnitude_db.astype(np.float64) / 20)
+        return magnitude * np.exp(1j * self.phase.astype(np.float64))
+
+    @property
+    def nbytes(self) -> int:
+        return self.magnitude_db.nbytes + self.phase.nbytes
+
+
+@dataclass
+class PairwiseMetrics:
+    """
+    Differences between every pair of stored designs. Entry [i, j] compares
+    design j against design i (i is the reference).
+    """
+    names: List[str]
+    peak_shift_cents: np.ndarray   # (N, N, n_modes); NaN where either design lacks the mode
+    harmonicity_cents: np.ndarray  # (N, N): mean |change| in deviation from odd harmonics
+    rms_db: np.ndarray             # (N, N): RMS magnitude difference over the shared band
+
+    def against(self, reference: str) -> List[dict]:
+        """One row per design comparing it to reference, for display."""
+        i = self.names.index(reference)
+        rows = []
+        for j, name in enumerate(self.names):
+            row = {"Design": name}
+            for m, shift in enumerate(self.peak_shift_cents[i, j]):
+                row[f"Mode {m + 1} shift (cents)"] = shift
+            row["Harmonicity change (cents)"] = self.harmonicity_cents[i, j]
+            row["RMS difference (dB)"] = self.rms_db[i, j]
+            rows.append(row)
+        return rows
+
+
+class ComparisonStore:
+    """
+    Keeps a set of named simulation results for side-by-side comparison.
+
+    Results are deduplicated by their result key: adding the same design and
+    settings twice keeps the first entry. Identical frequency grids are stored
+    once. Nothing in here ever triggers a simulation.
+    """
+
+    def __init__(self):
+        self._traces: "OrderedDict[str, StoredTrace]" = OrderedDict()
+        self._grids: Dict[str, np.ndarray] = {}
+
+    def __len__(self):
+        return len(self._traces)
+
+    def __contains__(self, name):
+        return name in self._traces
+
+    def __getitem__(self, name) -> StoredTrace:
+        return self._traces[name]
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._traces)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the stored curves and grids."""
+        return sum(t.nbytes for t in self._traces.values()) + sum(g.nbytes for g in self._grids.values())
+
+    def find(self, key: str) -> Optional[StoredTrace]:
+        """Returns the trace stored for a result key, or None."""
+        return next((t for t in self._traces.values() if t.key == key), None)
+
+    def add(self, name: str, key: str, frequencies, impedance, peaks: PeakTable) -> StoredTrace:
+        """
+        Stores a result under name.
+
+        Args:
+            name (str): Display name (must be unique).
+            key (str): Result key, e.g. SimulationEngine.cache_key(clarinet).
+            frequencies (np.ndarray): Frequency grid (Hz).
+            impedance (np.ndarray): Complex input impedance.
+            peaks (PeakTable): Resonances detected on the full-precision result.
+
+        Returns:
+            StoredTrace: The new entry, or the existing one if key is already stored.
+        """
+        existing = self.find(key)
+        if existing is not None:
+            return existing
+        if name in self._traces:
+            raise ValueError(f"A design named '{name}' is already stored.")
+
+        grid = np.ascontiguousarray(frequencies, dtype=np.float32)
+        grid_key = hashlib.sha256(grid.tobytes()).hexdigest()
+        grid = self._grids.setdefault(grid_key, grid)
+
+        impedance = np.asarray(impedance)
+        with np.errstate(divide="ignore"):
+            mag = magnitude_db(impedance).astype(np.float32)
+        trace = StoredTrace(name, key, grid, mag, np.angle(impedance).astype(np.float32), peaks)
+        self._traces[name] = trace
+        return trace
+
+    def remove(self, name: str):
+        trace = self._traces.pop(name)
+        if not any(t.frequencies is trace.frequencies for t in self._traces.values()):
+            self._grids = {k: g for k, g in self._grids.items() if g is not trace.frequencies}
+
+    def clear(self):
+        self._traces.clear()
+        self._grids.clear()
+
+    def magnitudes_on_grid(self, names: List[str] = None):
+        """
+        Magnitudes of the given designs resampled onto one grid: the first
+        design's grid, restricted to the band every design covers.
+
+        Returns:
+            tuple: (grid (G,), magnitudes (N, G) float64)
+        """
+        traces = [self._traces[n] for n in (names if names is not None else self._traces)]
+        low = max(float(t.frequencies[0]) for t in traces)
+        high = min(float(t.frequencies[-1]) for t in traces)
+        base = traces[0].frequencies
+        grid = base[(base >= low) & (base <= high)]
+        mags = np.empty((len(traces), len(grid)))
+        for i, t in enumerate(traces):
+            if t.frequencies is base:
+                mags[i] = t.magnitude_db[(base >= low) & (base <= high)]
+            else:
+                mags[i] = np.interp(grid, t.frequencies, t.magnitude_db)
+        return grid, mags
+
+    def pairwise_metrics(self, names: List[str] = None, n_modes: int = 4) -> PairwiseMetrics:
+        """
+        Computes difference metrics for all pairs of designs at once.
+
+        Args:
+            names (list): Designs to compare (default: all, in insertion order).
+            n_modes (int): Number of lowest resonances compared.
+
+        Returns:
+            PairwiseMetrics
+        """
+        names = list(names if names is not None else self._traces)
+        if not names:
+            raise ValueError("No designs to compare.")
+
+        # (N, n_modes) lowest resonances, NaN-padded
+        modes = np.full((len(names), n_modes), np.nan)
+        for i, name in enumerate(names):
+            f = self._traces[name].peaks.frequency[:n_modes]
+            modes[i, :len(f)] = f
+
+        with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN rows: mean of empty slice
+            log_modes = np.log2(modes)
+            shift = 1200 * (log_modes[None, :, :] - log_modes[:, None, :])
+
+            # Deviation of mode k from the ideal (2k-1) * f1 of a closed cylinder
+            ideal = np.log2(modes[:, :1] * (2 * np.arange(n_modes) + 1))
+            deviation = 1200 * (log_modes - ideal)[:, 1:]
+            harmonicity = np.nanmean(np.abs(deviation[None, :, :] - deviation[:, None, :]), axis=2) \
+                if n_modes > 1 else np.zeros((len(names), len(names)))
+
+        # RMS dB via the Gram matrix, without an (N, N, G) intermediate
+        _, mags = self.magnitudes_on_grid(names)
+        mags -= mags.mean(axis=0)  # Centre first so the expansion does not cancel catastrophically
+        gram = mags @ mags.T
+        sq = np.diag(gram)
+        msd = (sq[:, None] + sq[None, :] - 2 * gram) / mags.shape[1]
+        rms = np.sqrt(np.maximum(msd, 0.0))
+
+        return PairwiseMetrics(names, shift, harmonicity, rms)
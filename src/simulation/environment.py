@@ -0,0 +1,245 @@
+"""
+Temperature sweeps of one design.
+
+Exact sweeps solve the design at every temperature; with the FEM they share
+one SimulationSession, so the geometry and the mesh are built once and each
+temperature only reassembles and solves.
+
+Rescaled sweeps use the similarity of the lossless problem: every length
+scale enters through k = 2 pi f / c and every impedance through rho c, so
+
+    Z_T(f) = (rho_T c_T) / (rho_0 c_0) * Z_0(f c_0 / c_T)
+
+maps a solution at the reference temperature to any other. Only the
+viscothermal losses break the similarity, so the error grows smoothly with
+the distance to the reference. It is measured against exact solves at both
+ends of the range, which makes a sweep of any length cost three solves.
+"""
+import time
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+import numpy as np
+from scipy.interpolate import CubicSpline
+from src.instrumentation import span, timed
+from src.models.clarinet import Clarinet
+from src.simulation.physics import SimulationEngine
+from src.simulation.tmm import air_properties
+
+METHODS = ("exact", "rescaled")
+
+
+@dataclass
+class TemperatureSweep:
+    """
+    Input impedance of one design (all holes open) at several temperatures.
+
+    Rows follow the requested temperatures. Rows solved exactly have
+    exact[i] True and zero error; rescaled rows carry an estimated bound on
+    their error, interpolated linearly in |T - reference| from the exact
+    checks at the ends of the range. error_cents bounds the shift of the
+    resonances themselves: peaks read off the grid also carry the peak
+    finder's grid noise, exact rows included.
+    """
+    temperatures: np.ndarray   # (T,) Celsius
+    frequencies: np.ndarray    # (F,) Hz
+    impedance: np.ndarray      # (T, F) complex
+    exact: np.ndarray          # (T,) bool
+    error_cents: np.ndarray    # (T,) bound on the shift of the first resonances (cents)
+    error_db: np.ndarray       # (T,) bound on the |Z| error over the grid (dB)
+    reference: Optional[float] = None  # Temperature the rescaled rows come from
+    solves: int = 0            # Exact solves of the design (each over the whole grid)
+    elapsed: float = 0.0       # Wall time (s)
+
+    def __len__(self):
+        return len(self.temperatures)
+
+    @property
+    def method(self) -> str:
+        return "exact" if self.exact.all() else "rescaled"
+
+    def at(self, temperature: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Frequencies and impedance of the row for temperature."""
+        matches = np.flatnonzero(np.isclose(self.temperatures, temperature))
+        if not len(matches):
+            raise ValueError(f"Temperature {temperature} is not part of the sweep.")
+        return self.frequencies, self.impedance[matches[0]]
+
+    def resonances(self, engine: SimulationEngine, n_modes: int = 3) -> np.ndarray:
+        """(T, n_modes) resonance frequencies (Hz), NaN where a row has fewer peaks."""
+        out = np.full((len(self), n_modes), np.nan)
+        for i, impedance in enumerate(self.impedance):
+            peaks = engine.analyze_peaks(self.frequencies, impedance).frequency[:n_modes]
+            out[i, :len(peaks)] = peaks
+        return out
+
+
+def _log_spline(frequencies, impedance) -> CubicSpline:
+    """
+    Cubic spline through log Z (dB and unwrapped phase), which stays smooth
+    through a resonance where Z itself is too peaked for the grid.
+    """
+    impedance = np.asarray(impedance)
+    return CubicSpline(frequencies, np.log(np.abs(impedance)) + 1j * np.unwrap(np.angle(impedance)))
+
+
+def rescale_impedance(frequencies, impedance, reference: float, temperature: float, at=None) -> np.ndarray:
+    """
+    Impedance at temperature predicted from a solution at the reference
+    temperature by the speed-of-sound similarity (exact without losses).
+
+    Args:
+        frequencies, impedance: Reference solution (frequencies ascending).
+        reference (float): Temperature of the reference solution (Celsius).
+        temperature (float): Target temperature (Celsius).
+        at: Frequencies to predict (default: the reference grid). They must
+            map into the reference grid, i.e. at * c_ref / c_T must lie within it.
+
+    Returns:
+        np.ndarray: Complex impedance at the requested frequencies.
+    """
+    frequencies = np.asarray(frequencies, dtype=float)
+    at = frequencies if at is None else np.asarray(at, dtype=float)
+    air_ref, air = air_properties(reference), air_properties(temperature)
+    source = at * air_ref.c / air.c
+    if source.min() < frequencies[0] * (1 - 1e-9) or source.max() > frequencies[-1] * (1 + 1e-9):
+        raise ValueError("The reference grid does not cover the rescaled frequencies.")
+    scaled = np.exp(_log_spline(frequencies, impedance)(np.clip(source, frequencies[0], frequencies[-1])))
+    return air.rho * air.c / (air_ref.rho * air_ref.c) * scaled
+
+
+def _refined_grid(frequencies: np.ndarray, refine: int) -> np.ndarray:
+    """frequencies with refine - 1 points inserted in every interval (the originals kept exactly)."""
+    steps = np.arange(refine) / refine
+    return np.append((frequencies[:-1, None] + np.diff(frequencies)[:, None] * steps).ravel(), frequencies[-1])
+
+
+def _extended_grid(frequencies: np.ndarray, low: float, high: float) -> np.ndarray:
+    """frequencies extended at its end spacings to cover [low, high]."""
+    d_low, d_high = frequencies[1] - frequencies[0], frequencies[-1] - frequencies[-2]
+    below = frequencies[0] - d_low * np.arange(np.ceil((frequencies[0] - low) / d_low - 1e-9), 0, -1)
+    above = frequencies[-1] + d_high * np.arange(1, np.ceil((high - frequencies[-1]) / d_high - 1e-9) + 1)
+    return np.concatenate([below[below > 0], frequencies, above])
+
+
+def _resonances(engine, frequencies, impedance, n_modes, refine: int = 8) -> np.ndarray:
+    """First resonances, located on a refine-times denser spline of the curve."""
+    dense = np.linspace(frequencies[0], frequencies[-1], refine * (len(frequencies) - 1) + 1)
+    curve = np.exp(_log_spline(frequencies, impedance)(dense))
+    return engine.analyze_peaks(dense, curve).frequency[:n_modes]
+
+
+def _errors(engine, frequencies, estimate, exact, n_modes) -> Tuple[float, float]:
+    """
+    Largest resonance shift (cents) over the first n_modes and largest |Z|
+    error (dB). Peaks are compared off a dense spline, so that the peak
+    finder's dependence on where a peak falls between grid points (which
+    differs between the two curves) does not swamp the shift.
+    """
+    f_est = _resonances(engine, frequencies, estimate, n_modes)
+    f_exact = _resonances(engine, frequencies, exact, n_modes)
+    n = min(len(f_est), len(f_exact))
+    cents = float(np.max(np.abs(1200 * np.log2(f_est[:n] / f_exact[:n])))) if n else np.nan
+    db = float(np.max(np.abs(20 * np.log10(np.abs(estimate) / np.abs(exact)))))
+    return cents, db
+
+
+@timed("temperature_sweep")
+def temperature_sweep(engine: SimulationEngine, clarinet: Clarinet, temperatures: Sequence[float],
+                      method: str = "exact", reference: float = None, n_modes: int = 3, refine: int = 2,
+                      session=None, progress=None) -> TemperatureSweep:
+    """
+    Solves clarinet (all holes open) at several temperatures.
+
+    Args:
+        engine (SimulationEngine): Backend, losses, grid and result cache
+            (its own temperature is not used).
+        clarinet (Clarinet): The design.
+        temperatures (list): Temperatures (Celsius).
+        method (str): 'exact' solves every temperature; 'rescaled' solves
+            the reference and both ends of the range, and rescales the rest.
+        reference (float): Temperature to rescale from (default: the
+            requested temperature closest to the middle of the range).
+        n_modes (int): Resonances compared for the error bound.
+        refine (int): The reference and the checks are solved on a grid this
+            many times denser than the engine's, so that interpolating the
+            reference adds little error and the checks resolve sub-cent shifts.
+        session (SimulationSession): FEM session to reuse (default: a new one).
+        progress (callable): Called as progress(solves_done, solves_total).
+
+    Returns:
+        TemperatureSweep
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method}")
+    temperatures = np.asarray(temperatures, dtype=float)
+    if not len(temperatures):
+        raise ValueError("No temperatures to solve.")
+    frequencies = np.asarray(engine.frequencies, dtype=float)
+    if method == "rescaled" and (len(frequencies) < 2 or refine < 1):
+        raise ValueError("Rescaling needs a frequency grid of at least two points and refine >= 1.")
+    if session is None and engine.backend == "fem":
+        session = engine.open_session(clarinet)
+    start = time.perf_counter()
+    config = engine.config()
+    solves = 0
+
+    def solve(temperature, grid=frequencies):
+        nonlocal solves
+        sim = SimulationEngine.from_config({**config, "temperature": float(temperature), "frequencies": grid,
+                                            "sweep_mode": "dense"}, cache=engine.cache)
+        with span("temperature.solve", value=float(temperature)):
+            _, impedance = sim.run_impedance_simulation(clarinet, session=session)
+        engine.solve_count += sim.solve_count
+        solves += 1
+        if progress is not None:
+            progress(solves, total)
+        return impedance
+
+    n = len(temperatures)
+    if method == "exact":
+        unique = np.unique(temperatures)
+        total = len(unique)
+        solved = {t: solve(t) for t in unique}
+        impedance = np.array([solved[t] for t in temperatures])
+        zeros = np.zeros(n)
+        return TemperatureSweep(temperatures, frequencies, impedance, np.ones(n, dtype=bool), zeros, zeros.copy(),
+                                solves=solves, elapsed=time.perf_counter() - start)
+
+    low, high = temperatures.min(), temperatures.max()
+    if reference is None:
+        reference = float(temperatures[np.argmin(np.abs(temperatures - (low + high) / 2))])
+    anchors = sorted({float(reference), float(low), float(high)})
+    total = len(anchors)
+
+    # Anchors are solved on a denser grid, wide enough for every rescaled row
+    c_ref = air_properties(reference).c
+    ratios = [c_ref / air_properties(t).c for t in temperatures]
+    fine = _refined_grid(frequencies, int(refine))
+    grid = _extended_grid(fine, fine[0] * min(ratios), fine[-1] * max(ratios))
+    on_fine, on_output = np.searchsorted(grid, fine), np.searchsorted(grid, frequencies)
+    anchored = {t: solve(t, grid) for t in anchors}
+    z_ref = anchored[float(reference)]
+    solved = {t: z[on_output] for t, z in anchored.items()}
+
+    # Error measured at each end on the dense grid, assumed to grow linearly towards it
+    slopes = {}
+    for t in (float(low), float(high)):
+        if t != reference:
+            cents, db = _errors(engine, fine, rescale_impedance(grid, z_ref, reference, t, fine),
+                                anchored[t][on_fine], n_modes)
+            slopes[np.sign(t - reference)] = (cents / abs(t - reference), db / abs(t - reference))
+
+    with span("rescale", rows=n):
+        impedance = np.empty((n, len(frequencies)), dtype=complex)
+        exact = np.zeros(n, dtype=bool)
+        error_cents, error_db = np.zeros(n), np.zeros(n)
+        for i, t in enumerate(temperatures):
+            if float(t) in solved:
+                impedance[i], exact[i] = solved[float(t)], True
+            else:
+                impedance[i] = rescale_impedance(grid, z_ref, reference, t, frequencies)
+                cents_per_degree, db_per_degree = slopes[np.sign(t - reference)]
+                error_cents[i] = cents_per_degree * abs(t - reference)
+                error_db[i] = db_per_degree * abs(t - reference)
+    return TemperatureSweep(temperatures, frequencies, impedance, exact, error_cents, error_db,
+                            reference=float(reference), solves=solves, elapsed=time.perf_counter() - start)
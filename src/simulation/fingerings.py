@@ -0,0 +1,138 @@
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+import numpy as np
+from src.instrumentation import count, span, timed
+from src.models.clarinet import Clarinet
+from src.simulation.cache import ImpedanceCache
+from src.simulation.peaks import PeakTable
+from src.simulation.tmm import tmm_impedance
+
+
+@dataclass
+class NoteResult:
+    """
+    Impedance and resonances of one fingering.
+    """
+    note: str
+    pattern: str             # 'o'/'x' per hole, as stored on the Clarinet
+    frequencies: np.ndarray
+    impedance: np.ndarray
+    peaks: PeakTable
+    cached: bool = False
+
+
+def _solve_notes(task):
+    """
+    Builds one session and solves a list of fingerings by switching the open
+    and closed states only (the TMM backend solves them all in one batched pass).
+    Used in-process and as a worker entry point.
+    """
+    design, config, notes = task
+    clarinet = Clarinet.from_dict(design)
+    if config.get("backend") == "tmm":
+        # Every fingering in one batched pass
+        states = [clarinet.get_fingering_states(note) for note in notes]
+        with span("solve", backend="tmm", notes=len(notes)):
+            impedance = tmm_impedance(clarinet.bore_array(), clarinet.holes_array(), config["temperature"],
+                                      config["frequencies"], config["losses"], np.reshape(states, (len(notes), -1)))
+        return list(zip(notes, impedance))
+
+    # Imported here so the TMM path never loads OpenWind
+    from src.simulation.session import SimulationSession
+    session = SimulationSession(clarinet, config["frequencies"], config["temperature"], config["losses"])
+    out = []
+    for note in notes:
+        session.set_fingering(clarinet.get_fingering_states(note))
+        _, impedance = session.solve()
+        out.append((note, np.array(impedance)))
+    return out
+
+
+@timed("fingerings")
+def simulate_fingerings(engine, clarinet: Clarinet, notes: Sequence[str] = None,
+                        workers: int = 1) -> Dict[str, NoteResult]:
+    """
+    Simulates every note of the clarinet's fingering chart.
+
+    The geometry, physics and FEM assembly are built once; each note only
+    switches hole states before solving. With workers > 1 the notes are split
+    across worker processes, each of which assembles the design once.
+    Results go through the engine's cache, keyed by geometry and fingering.
+
+    Args:
+        engine (SimulationEngine): Frequency grid, temperature, losses, cache and peak thresholds.
+        clarinet (Clarinet): Design with a fingering chart.
+        notes (list): Subset of notes to simulate (default: the whole chart, in chart order).
+        workers (int): Worker processes for solving the notes.
+
+    Returns:
+        dict: note -> NoteResult, in the order of notes.
+    """
+    from src.simulation.physics import _get_pool
+
+    notes = list(notes) if notes is not None else list(clarinet.fingerings)
+    if not notes:
+        raise ValueError("The design has no fingering chart.")
+    for note in notes:
+        if note not in clarinet.fingerings:
+            raise ValueError(f"Unknown note: {note}")
+
+    bore, holes = clarinet.bore_array(), clarinet.holes_array()
+    keys = {
+        note: ImpedanceCache.make_key(bore, holes, engine.temperature, engine.losses,
+                                      engine.frequencies, fingering=clarinet.fingerings[note],
+                                      **engine.backend_key())
+        for note in notes
+    }
+
+    spectra = {}
+    for note in notes:
+        hit = engine.cache.get(keys[note])
+        if hit is not None:
+            spectra[note] = (hit[1], True)
+
+    todo = [note for note in notes if note not in spectra]
+    if todo:
+        config = engine.config()
+        design = clarinet.to_dict()
+        try:
+            if workers > 1 and len(todo) > 1:
+                chunks = [list(c) for c in np.array_split(todo, min(workers, len(todo)))]
+                solved = [item for part in _get_pool(workers).map(_solve_notes, [(design, config, c) for c in chunks])
+                          for item in part]
+            else:
+                solved = _solve_notes((design, config, todo))
+        except Exception as e:
+            raise RuntimeError(f"Simulation failed: {e}")
+
+        for note, impedance in solved:
+            _, impedance = engine.cache.put(keys[note], engine.frequencies, impedance)
+            spectra[note] = (impedance, False)
+        engine.solve_count += len(todo) * len(engine.frequencies)
+        count("solves", len(todo) * len(engine.frequencies))
+
+    frequencies = np.asarray(engine.frequencies)
+    results = {}
+    for note in notes:
+        impedance, cached = spectra[note]
+        results[note] = NoteResult(
+            note, clarinet.fingerings[note], frequencies, impedance,
+            engine.analyze_peaks(frequencies, impedance), cached,
+        )
+    return results
+
+
+def peak_table(results: Dict[str, NoteResult], n_modes: int = 3) -> List[dict]:
+    """
+    Flattens fingering results into one row per note:
+    {"Note", "Fingering", "Mode 1 (Hz)", "Mode 1 Q", ...}.
+    """
+    rows = []
+    for note, res in results.items():
+        row = {"Note": note, "Fingering": res.pattern}
+        for m in range(n_modes):
+            has_mode = m < len(res.peaks)
+            row[f"Mode {m + 1} (Hz)"] = float(res.peaks.frequency[m]) if has_mode else np.nan
+            row[f"Mode {m + 1} Q"] = float(res.peaks.q_factor[m]) if has_mode else np.nan
+        rows.append(row)
+    return rows
@@ -0,0 +1,233 @@
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from src.instrumentation import count, span, timed
+from src.models.clarinet import Clarinet
+from src.simulation.peaks import magnitude_db
+from src.simulation.physics import SimulationEngine
+from src.simulation.sweep import apply_parameters
+from src.simulation.tmm import tmm_impedance
+
+# Finite-difference steps (m) per geometry field
+FIELD_STEPS = {"position": 1e-4, "radius": 1e-5, "chimney": 1e-4}
+
+# Resonances are located by a least-squares parabola in dB through this
+# window (cents around the unperturbed peak). Keeping the window fixed makes
+# the estimate a smooth function of the geometry, so finite differences of it
+# are clean even for sub-cent shifts; keeping it narrow keeps the parabola
+# close to the real peak shape, so the derivatives are not attenuated.
+_FIT_CENTS = np.linspace(-2.0, 2.0, 5)
+_FIT_BASIS = np.linalg.pinv(np.vander(_FIT_CENTS, 3))
+
+
+@dataclass
+class ResonanceJacobian:
+    """
+    Derivatives of resonance frequencies with respect to geometry parameters.
+
+    Row r is mode rows[r][1] (0-based) of fingering rows[r][0] (None = all
+    holes open); column p is parameter parameters[p] in the naming of
+    src.simulation.sweep.apply_parameters (e.g. 'hole.2.position').
+    """
+    rows: List[Tuple[Optional[str], int]]
+    parameters: List[str]
+    frequencies: np.ndarray  # (R,) resonances of the unperturbed design (Hz), NaN where missing
+    hz: np.ndarray           # (R, P) Hz per metre
+    solves: int = 0          # Fingering solves used (each on the small fit grid)
+
+    @property
+    def cents(self) -> np.ndarray:
+        """(R, P) cents per metre."""
+        return 1200 / np.log(2) * self.hz / self.frequencies[:, None]
+
+    @property
+    def row_labels(self) -> List[str]:
+        return [f"{'All open' if note is None else note} · mode {mode + 1}" for note, mode in self.rows]
+
+    def column(self, parameter: str) -> np.ndarray:
+        """Cents per metre of every row for one parameter."""
+        return self.cents[:, self.parameters.index(parameter)]
+
+
+def geometry_parameters(clarinet: Clarinet, holes: bool = True, bore_radii: bool = True,
+                        bore_positions: bool = False) -> List[str]:
+    """Parameter names for every hole dimension and bore station of clarinet."""
+    names = []
+    if holes:
+        names += [f"hole.{i}.{field}" for i in range(len(clarinet.holes)) for field in ("position", "radius", "chimney")]
+    if bore_radii:
+        names += [f"bore.{i}.radius" for i in range(len(clarinet.bore))]
+    if bore_positions:
+        names += [f"bore.{i}.position" for i in range(len(clarinet.bore))]
+    return names
+
+
+def _parameter_value(clarinet: Clarinet, name: str) -> float:
+    parts = name.split(".")
+    if len(parts) != 3 or parts[0] not in ("hole", "bore") or not parts[1].isdigit():
+        raise ValueError(f"Not a geometry parameter: '{name}'.")
+    table = clarinet.holes if parts[0] == "hole" else clarinet.bore
+    index = int(parts[1])
+    if index >= len(table):
+        raise ValueError(f"Parameter '{name}': index out of range ({len(table)} entries).")
+    return float(getattr(table[index], parts[2]))
+
+
+def _fit_peaks(centres, mag_db):
+    """Vertex of the windowed parabola for each row: (R,) centres, (R, K) dB."""
+    a, b, _ = _FIT_BASIS @ mag_db.T
+    offset = np.where(a < 0, -b / (2 * np.where(a < 0, a, -1.0)), np.nan)
+    return centres * 2 ** (offset / 1200)
+
+
+class _DesignSolver:
+    """
+    Solves the fit windows of every row for a sequence of designs: all
+    fingerings in one batched pass with TMM, one shared SimulationSession with
+    the FEM (so a hole edit only reassembles the pipes next to it, and the
+    fixed grid keeps the same mesh for every design).
+    """
+
+    def __init__(self, engine: SimulationEngine, clarinet: Clarinet, notes, session=None):
+        self.engine = engine
+        self.notes = notes
+        self.grid = None
+        self.states = [None if note is None else clarinet.get_fingering_states(note) for note in notes]
+        self.session = None
+        if engine.backend == "fem":
+            self.session = session if session is not None else engine.open_session(clarinet)
+            self.session.set_temperature(engine.temperature)
+            self.session.set_losses(engine.losses)
+        self.solves = 0
+
+    def __call__(self, design: Clarinet) -> np.ndarray:
+        """(n_notes, G) |Z| in dB on the shared grid."""
+        n_holes = len(design.holes)
+        try:
+            if self.session is None:
+                states = np.array([[True] * n_holes if s is None else s for s in self.states],
+                                  dtype=bool).reshape(len(self.notes), n_holes)
+                with span("solve", backend="tmm", notes=len(self.notes)):
+                    impedance = tmm_impedance(design.bore_array(), design.holes_array(), self.engine.temperature,
+                                              self.grid, self.engine.losses, states)
+            else:
+                self.session.set_clarinet(design)
+                self.session.set_frequencies(self.grid)
+                impedance = []
+                for states in self.states:
+                    self.session.set_fingering(states)
+                    impedance.append(np.array(self.session.solve()[1]))
+        except Exception as e:
+            raise RuntimeError(f"Simulation failed: {e}")
+        self.solves += len(self.notes)
+        self.engine.solve_count += len(self.notes) * len(self.grid)
+        count("solves", len(self.notes) * len(self.grid))
+        return magnitude_db(np.asarray(impedance))
+
+
+def _base_resonances(engine: SimulationEngine, clarinet: Clarinet, notes, n_modes):
+    """Rows and approximate frequencies of the lowest n_modes resonances per fingering (full-grid solves, cached)."""
+    chart = [note for note in notes if note is not None]
+    peaks = {note: res.peaks for note, res in engine.simulate_fingerings(clarinet, chart).items()} if chart else {}
+    if None in notes:
+        peaks[None] = engine.analyze_peaks(*engine.run_impedance_simulation(clarinet))
+    rows, guesses = [], []
+    for note in notes:
+        for mode in range(n_modes):
+            rows.append((note, mode))
+            guesses.append(peaks[note].frequency[mode] if mode < len(peaks[note]) else np.nan)
+    return rows, np.array(guesses, dtype=float)
+
+
+@timed("jacobian")
+def resonance_jacobian(engine: SimulationEngine, clarinet: Clarinet, notes: Sequence[Optional[str]] = None,
+                       n_modes: int = 3, parameters: Sequence[str] = None,
+                       resonances: Sequence[Tuple[Optional[str], float]] = None,
+                       central: bool = True, steps: dict = None, session=None,
+                       progress=None) -> ResonanceJacobian:
+    """
+    Jacobian of resonance frequencies with respect to geometry, by finite
+    differences.
+
+    Each resonance is solved only on a small window of frequencies around
+    it, and every perturbed design reuses the assembled physics: the FEM
+    backend updates one SimulationSession in place (only the pipes next to an
+    edited hole are reassembled), the TMM backend solves all fingerings of a
+    design in one batched pass.
+
+    Args:
+        engine (SimulationEngine): Backend, temperature, losses and grid (the
+            grid is only used to find the resonances of the design).
+        clarinet (Clarinet): The design to differentiate.
+        notes (list): Fingerings of the chart, None for all holes open
+            (default: the whole chart, or all open without a chart).
+        n_modes (int): Lowest resonances per fingering.
+        parameters (list): Geometry parameter names (default: geometry_parameters(clarinet)).
+        resonances (list): (fingering, approximate frequency) rows to track
+            instead of notes x n_modes; skips the full-grid solves.
+        central (bool): Central differences (two solves per parameter) instead of forward (one).
+        steps (dict): Step (m) per field, overriding FIELD_STEPS.
+        session (SimulationSession): FEM session to reuse (see SimulationEngine.open_session).
+        progress (callable): Called as progress(designs_done, designs_total).
+
+    Returns:
+        ResonanceJacobian
+    """
+    parameters = list(parameters) if parameters is not None else geometry_parameters(clarinet)
+    steps = {**FIELD_STEPS, **(steps or {})}
+    base = {name: _parameter_value(clarinet, name) for name in parameters}
+
+    if resonances is None:
+        notes = list(notes) if notes is not None else (list(clarinet.fingerings) or [None])
+        rows, guesses = _base_resonances(engine, clarinet, notes, n_modes)
+    else:
+        # Modes are numbered within each fingering, in the order given
+        seen = Counter()
+        rows = []
+        for note, _ in resonances:
+            rows.append((note, seen[note]))
+            seen[note] += 1
+        guesses = np.array([f for _, f in resonances], dtype=float)
+        notes = list(dict.fromkeys(note for note, _ in resonances))
+    found = np.isfinite(guesses)
+    note_index = np.array([notes.index(note) for note, _ in rows])
+
+    solver = _DesignSolver(engine, clarinet, notes, session)
+    centres = guesses[found]
+    # One shared grid holding every row's window, so each solve covers all rows of its note
+    windows = centres[:, None] * 2 ** (_FIT_CENTS / 1200)
+
+    def solve_rows(design):
+        mag = solver(design)  # (n_notes, G)
+        return _fit_peaks(centres, mag[note_index[found][:, None], np.searchsorted(solver.grid, windows)])
+
+    # Centre the windows on the resonances (fixed-point passes on the design),
+    # then keep them fixed for every perturbation
+    for _ in range(4):
+        solver.grid = np.unique(windows)
+        base_fit = solve_rows(clarinet)
+        moved = np.abs(1200 * np.log2(base_fit / centres))
+        if not np.any(moved > 0.05):
+            break
+        centres = np.where(np.isfinite(base_fit), base_fit, centres)
+        windows = centres[:, None] * 2 ** (_FIT_CENTS / 1200)
+
+    frequencies = np.full(len(rows), np.nan)
+    frequencies[found] = base_fit
+    hz = np.full((len(rows), len(parameters)), np.nan)
+    total = len(parameters) * (2 if central else 1)
+    for p, name in enumerate(parameters):
+        h = steps[name.rsplit(".", 1)[1]]
+        plus = solve_rows(apply_parameters(clarinet, {name: base[name] + h})[0])
+        if central:
+            minus = solve_rows(apply_parameters(clarinet, {name: base[name] - h})[0])
+            hz[found, p] = (plus - minus) / (2 * h)
+        else:
+            hz[found, p] = (plus - base_fit) / h
+        if progress is not None:
+            progress((p + 1) * (2 if central else 1), total)
+    # Leave a shared session describing the caller's design
+    if solver.session is not None:
+        solver.session.set_clarinet(clarinet)
+    return ResonanceJacobian(rows, parameters, frequencies, hz, solver.solves)
@@ -0,0 +1,189 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from src.instrumentation import Recorder, recording
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's work function at the next progress report after cancel()."""
+
+
+@dataclass
+class Job:
+    """
+    A simulation or optimization running in the background.
+
+    The work function receives the Job and calls job.report(...) as it goes;
+    the UI thread only reads the fields below, so no locking is needed for them.
+    """
+    id: int
+    kind: str                        # e.g. "simulation", "optimization"
+    fingerprint: Optional[str]       # Design the job was started for (None = never stale)
+    status: str = "pending"          # pending | running | done | failed | cancelled
+    done: int = 0                    # Units of work finished (frequencies, solves, ...)
+    total: Optional[int] = None      # Units expected, None if unknown
+    message: str = ""
+    result: Any = None
+    partial: Any = None              # Latest intermediate result, for live previews
+    error: Optional[str] = None
+    started: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+    trace: Optional[Recorder] = None # Spans and counters of the run, if it was recorded
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished_ok(self) -> bool:
+        return self.status == "done"
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("pending", "running")
+
+    @property
+    def fraction(self) -> Optional[float]:
+        """Progress in [0, 1], or None when the total is unknown."""
+        if not self.total:
+            return None
+        return min(1.0, self.done / self.total)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.time()) - self.started
+
+    def cancel(self):
+        """Requests cancellation; the job stops at its next progress report."""
+        self._cancel.set()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def report(self, done: int, total: Optional[int] = None, message: str = ""):
+        """
+        Progress callback for work functions. Raises JobCancelled if the job
+        has been cancelled, which unwinds the work at a safe point.
+        """
+        if self.cancel_requested:
+            raise JobCancelled()
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message:
+            self.message = message
+
+
+def run_job(job: Job, fn: Callable, args=(), kwargs=None):
+    """
+    Runs fn(job, *args, **kwargs) on the calling thread, recording it into
+    job.trace if set, and leaves the outcome in job.status / result / error.
+    """
+    if job.cancel_requested:
+        job.status, job.finished = "cancelled", time.time()
+        return
+    job.status = "running"
+    try:
+        with recording(job.trace) if job.trace is not None else nullcontext():
+            job.result = fn(job, *args, **(kwargs or {}))
+        job.status = "done"
+    except Exception as e:
+        # Work functions may wrap JobCancelled in their own error types
+        if job.cancel_requested:
+            job.status = "cancelled"
+        else:
+            job.status = "failed"
+            job.error = str(e)
+    finally:
+        job.finished = time.time()
+
+
+class JobManager:
+    """
+    Runs work functions on background threads and tracks them as Jobs.
+
+    At most one job per kind is kept: submitting a new simulation cancels the
+    previous one. Jobs carry the fingerprint of the design they were started
+    for, and drop_stale() cancels and forgets jobs for any other design.
+
+    With a SimulationService (src.simulation.service), the work runs on the
+    service's shared workers, queued fairly with other sessions' jobs,
+    instead of on threads of this manager.
+    """
+
+    def __init__(self, max_workers: int = 2, service=None, session: str = None):
+        self.service = service
+        self.session = session
+        self._executor = None if service is not None else \
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="clarinet-job")
+        self._jobs: Dict[str, Job] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable, *args, fingerprint: str = None, trace: Recorder = None,
+               dedup_key: str = None, **kwargs) -> Job:
+        """
+        Starts fn(job, *args, **kwargs) in the background and returns its Job.
+        The return value of fn becomes job.result. If trace is given, the
+        run is recorded into it (see src.instrumentation) as job.trace.
+
+        On a service, jobs with the same dedup_key share one run while it
+        is queued or running, and a full queue raises ServiceBusy, leaving
+        the previous job of kind running. Otherwise the previous job of kind
+        is cancelled.
+        """
+        job = Job(next(self._ids), kind, fingerprint, trace=trace)
+        with self._lock:
+            previous = self._jobs.get(kind)
+            if self.service is not None:
+                # The service cancels previous only once job is accepted
+                self.service.submit(self.session, job, fn, args, kwargs, key=dedup_key, replaces=previous)
+            elif previous is not None:
+                previous.cancel()
+            self._jobs[kind] = job
+        if self.service is None:
+            self._executor.submit(run_job, job, fn, args, kwargs)
+        return job
+
+    def get(self, kind: str) -> Optional[Job]:
+        """Latest job of kind, or None."""
+        with self._lock:
+            return self._jobs.get(kind)
+
+    def pop(self, kind: str) -> Optional[Job]:
+        """Removes and returns the job of kind (e.g. once its result is consumed)."""
+        with self._lock:
+            return self._jobs.pop(kind, None)
+
+    def active(self) -> List[Job]:
+        """Jobs still pending or running."""
+        with self._lock:
+            return [job for job in self._jobs.values() if job.active]
+
+    def cancel(self, kind: str):
+        job = self.get(kind)
+        if job is not None:
+            job.cancel()
+
+    def drop_stale(self, fingerprint: str, kinds=None) -> List[Job]:
+        """
+        Cancels and forgets every job started for a different design. Returns them.
+        kinds limits the check to jobs of those kinds, for jobs whose
+        fingerprint covers other settings than the page's.
+        """
+        with self._lock:
+            stale = [job for job in self._jobs.values()
+                     if job.fingerprint is not None and job.fingerprint != fingerprint
+                     and (kinds is None or job.kind in kinds)]
+            for job in stale:
+                job.cancel()
+                del self._jobs[job.kind]
+        return stale
+
+    def shutdown(self):
+        for job in self.active():
+            job.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,130 @@
+from dataclasses import dataclass
+import numpy as np
+from src.instrumentation import timed
+
+
+@dataclass
+class PeakTable:
+    """
+    Columnar table of resonance peaks.
+
+    Every attribute is an array with one entry per peak. `row` indexes the
+    impedance curve the peak belongs to (always 0 for a single curve).
+    """
+    row: np.ndarray
+    frequency: np.ndarray      # Interpolated peak frequency (Hz)
+    magnitude_db: np.ndarray   # Interpolated peak magnitude (dB)
+    prominence_db: np.ndarray  # Height above the higher of the two surrounding minima (dB)
+    bandwidth: np.ndarray      # -3 dB bandwidth (Hz)
+    q_factor: np.ndarray       # frequency / bandwidth
+
+    def __len__(self):
+        return len(self.frequency)
+
+    def select(self, mask):
+        """Returns a new table holding only the peaks where mask is True."""
+        return PeakTable(*(getattr(self, name)[mask] for name in self.__dataclass_fields__))
+
+    def for_row(self, row: int):
+        """Returns the peaks of a single impedance curve."""
+        return self.select(self.row == row)
+
+    def as_tuples(self):
+        """Returns [(frequency, magnitude_db), ...], the legacy detect_peaks format."""
+        return list(zip(self.frequency.tolist(), self.magnitude_db.tolist()))
+
+
+def magnitude_db(impedance):
+    """Returns 20*log10|Z|."""
+    return 20 * np.log10(np.abs(impedance))
+
+
+@timed("peaks")
+def find_peaks(frequencies, impedance=None, mag_db=None, min_magnitude_db: float = -20.0,
+               min_prominence_db: float = 0.0, interpolate: bool = True) -> PeakTable:
+    """
+    Vectorized resonance peak detection.
+
+    A peak is a sample strictly above its left neighbour and not below its right
+    neighbour. With interpolate=True the frequency and magnitude come from a
+    parabola through the peak and its two neighbours (in dB), which is exact for
+    non-uniform grids too. Prominence and -3 dB bandwidth are measured on the
+    sampled curve with linear interpolation between bins.
+
+    Args:
+        frequencies (array): Frequency grid, shape (N,) or (B, N).
+        impedance (array): Complex impedance, shape (N,) or (B, N) for a batch.
+        mag_db (array): Precomputed 20*log10|Z| (skips the conversion).
+        min_magnitude_db (float): Peaks below this magnitude are discarded.
+        min_prominence_db (float): Peaks less prominent than this are discarded.
+        interpolate (bool): Enable sub-bin parabolic interpolation.
+
+    Returns:
+        PeakTable
+    """
+    if mag_db is None:
+        mag_db = magnitude_db(impedance)
+    mag = np.atleast_2d(np.asarray(mag_db, dtype=float))
+    n_rows, n = mag.shape
+    freqs = np.broadcast_to(np.asarray(frequencies, dtype=float), mag.shape)
+
+    if n < 3:
+        empty = np.empty(0)
+        return PeakTable(np.empty(0, dtype=int), empty, empty, empty, empty, empty)
+
+    # scipy.signal is slow to import; only load it once peaks are needed
+    from scipy.signal import peak_prominences, peak_widths
+
+    centre = mag[:, 1:-1]
+    is_peak = (centre > mag[:, :-2]) & (centre >= mag[:, 2:]) & (centre > min_magnitude_db)
+    rows, cols = np.nonzero(is_peak)
+    cols = cols + 1
+
+    # Flatten with a +inf guard column after each row so that prominence and
+    # width searches can never cross from one curve into the next.
+    stride = n + 1
+    flat = np.concatenate([mag, np.full((n_rows, 1), np.inf)], axis=1).ravel()
+    flat_freqs = np.concatenate([freqs, freqs[:, -1:]], axis=1).ravel()
+    flat_idx = rows * stride + cols
+
+    prominence, left_base, right_base = peak_prominences(flat, flat_idx)
+    # Width at (peak - 3 dB): pass a unit "prominence" of 3 dB with rel_height=1
+    _, _, left_ips, right_ips = peak_widths(
+        flat, flat_idx, rel_height=1.0,
+        prominence_data=(np.full(len(flat_idx), 3.0), left_base, right_base),
+    )
+    positions = np.arange(len(flat))
+    bandwidth = np.interp(right_ips, positions, flat_freqs) - np.interp(left_ips, positions, flat_freqs)
+
+    peak_freq = flat_freqs[flat_idx]
+    peak_mag = flat[flat_idx]
+    if interpolate and len(flat_idx):
+        peak_freq, peak_mag = _parabolic_vertex(
+            flat_freqs[flat_idx - 1], peak_freq, flat_freqs[flat_idx + 1],
+            flat[flat_idx - 1], peak_mag, flat[flat_idx + 1],
+        )
+
+    with np.errstate(divide="ignore"):
+        q_factor = peak_freq / bandwidth
+
+    table = PeakTable(rows, peak_freq, peak_mag, prominence, bandwidth, q_factor)
+    if min_prominence_db > 0:
+        table = table.select(prominence >= min_prominence_db)
+    return table
+
+
+def _parabolic_vertex(x0, x1, x2, y0, y1, y2):
+    """
+    Vertex (x, y) of the parabola through three points per peak.
+    Falls back to the middle sample where the fit is degenerate.
+    """
+    num = (x1 - x0) ** 2 * (y1 - y2) - (x1 - x2) ** 2 * (y1 - y0)
+    den = (x1 - x0) * (y1 - y2) - (x1 - x2) * (y1 - y0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xv = x1 - 0.5 * num / den
+        # Evaluate the Lagrange form at the vertex
+        yv = (y0 * (xv - x1) * (xv - x2) / ((x0 - x1) * (x0 - x2))
+              + y1 * (xv - x0) * (xv - x2) / ((x1 - x0) * (x1 - x2))
+              + y2 * (xv - x0) * (xv - x1) / ((x2 - x0) * (x2 - x1)))
+    ok = np.isfinite(xv) & np.isfinite(yv) & (xv >= x0) & (xv <= x2)
+    return np.where(ok, xv, x1), np.where(ok, yv, y1)
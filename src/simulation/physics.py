@@ -1,76 +1,498 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass
 import numpy as np
-from openwind import ImpedanceComputation, InstrumentGeometry, Player
+from src.instrumentation import count, span, timed
 from src.models.clarinet import Clarinet
-import matplotlib.pyplot as plt
-import streamlit as st
+from src.simulation.cache import ImpedanceCache, get_default_cache
+from src.simulation.peaks import PeakTable, find_peaks
+
+@dataclass
+class SweepResult:
+    """
+    Outcome of an adaptive frequency sweep.
+    """
+    frequencies: np.ndarray      # Non-uniform, sorted grid actually solved (Hz)
+    impedance: np.ndarray        # Complex impedance at each frequency
+    n_solves: int                # Number of frequency points solved by the FEM
+    peak_frequencies: np.ndarray # Refined resonance frequencies (Hz)
+    cached: bool = False         # True if served from the ImpedanceCache
+
+@dataclass
+class SweepUpdate:
+    """
+    Partial result of a streaming sweep (see SimulationEngine.iter_impedance_simulation).
+    """
+    frequencies: np.ndarray  # Every frequency solved so far, ascending (Hz)
+    impedance: np.ndarray    # Complex impedance at those frequencies
+    n_new: int               # Points added by the latest block
+    total: int               # Points in the complete sweep
+    peaks: PeakTable         # Peaks whose bracket is complete (both neighbours solved)
+    cached: bool = False     # True if the whole sweep came from the ImpedanceCache
+
+    @property
+    def done(self) -> bool:
+        return len(self.frequencies) == self.total
+
+BACKENDS = ("fem", "tmm")
 
 class SimulationEngine:
     """
     Wrapper around the OpenWind physics engine for clarinet acoustic simulation.
     Handles geometry construction, mesh generation, and FEM solving.
+
+    With backend == 'tmm' the same acoustic model is solved analytically by
+    the transfer-matrix method (src.simulation.tmm) instead: much faster,
+    meant for exploration, with the FEM kept for final verification.
     """
 
-    def __init__(self):
+    def __init__(self, cache: ImpedanceCache = None):
         # Configuration could be moved to parameters
         self.frequencies = np.arange(20, 2500, 2) # Extended range and finer resolution
         self.temperature = 25 # degrees Celsius
+        self.losses = True # OpenWind loss model (True = viscothermal boundary layer losses)
+        self.backend = "fem" # 'fem' (OpenWind FrequentialSolver) or 'tmm' (analytic transfer matrices)
+        # 'dense' solves every point of self.frequencies; 'adaptive' solves a
+        # coarse grid over the same range and refines around each resonance.
+        self.sweep_mode = "dense"
+        self.adaptive_step = 10.0 # Hz, spacing of the initial coarse grid
+        self.adaptive_tolerance = 0.5 # Hz, grid spacing required around each peak
+        self.solve_count = 0 # Total frequency points solved by this engine
+        # >1 splits the frequency grid into chunks solved in parallel worker processes
+        self.workers = 1
+        self.peak_threshold_db = -20.0 # Peaks below this magnitude are treated as noise
+        self.peak_min_prominence_db = 0.0 # Minimum prominence for a peak to count
+        # Results are cached by geometry + temperature + losses + frequency grid.
+        self.cache = cache if cache is not None else get_default_cache()
 
-    @st.cache_data(show_spinner=False)
-    def run_impedance_simulation(_self, clarinet: Clarinet):
+    def config(self) -> dict:
+        """
+        Returns the picklable solver settings (everything except the cache),
+        e.g. for shipping to worker processes.
+        """
+        return {
+            "frequencies": np.asarray(self.frequencies),
+            "temperature": self.temperature,
+            "losses": self.losses,
+            "backend": self.backend,
+            "sweep_mode": self.sweep_mode,
+            "adaptive_step": self.adaptive_step,
+            "adaptive_tolerance": self.adaptive_tolerance,
+        }
+
+    @classmethod
+    def from_config(cls, config: dict, cache: ImpedanceCache = None):
+        """Creates an engine with the settings produced by config()."""
+        sim = cls(cache=cache)
+        for name, value in config.items():
+            setattr(sim, name, value)
+        return sim
+
+    def backend_key(self) -> dict:
+        """
+        Extra cache-key fields identifying the backend. Empty for the FEM, so
+        keys (and cached or archived results) from before backends existed
+        stay valid.
+        """
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown simulation backend: {self.backend}")
+        return {} if self.backend == "fem" else {"backend": self.backend}
+
+    def cache_key(self, clarinet: Clarinet) -> str:
+        """
+        Returns the content hash identifying a simulation of clarinet with the
+        current settings. With sweep_mode == 'adaptive' this is the key of
+        the adaptive sweep run_impedance_simulation would return.
+        """
+        if self.sweep_mode == "adaptive":
+            return self._adaptive_key(clarinet, self._coarse_grid(self.adaptive_step), self.adaptive_tolerance)
+        return ImpedanceCache.make_key(
+            clarinet.bore_array(),
+            clarinet.holes_array(),
+            self.temperature,
+            self.losses,
+            self.frequencies,
+            **self.backend_key(),
+        )
+
+    def _coarse_grid(self, coarse_step: float) -> np.ndarray:
+        """Initial grid of an adaptive sweep: coarse_step spacing over the range of self.frequencies."""
+        fmin, fmax = float(np.min(self.frequencies)), float(np.max(self.frequencies))
+        coarse = np.arange(fmin, fmax, coarse_step)
+        return np.append(coarse, fmax) if not len(coarse) or coarse[-1] < fmax else coarse
+
+    def _adaptive_key(self, clarinet: Clarinet, coarse, tolerance: float, max_iterations: int = 30) -> str:
+        return ImpedanceCache.make_key(
+            clarinet.bore_array(), clarinet.holes_array(),
+            self.temperature, self.losses, coarse,
+            sweep="adaptive", tolerance=tolerance, max_iterations=max_iterations,
+            **self.backend_key(),
+        )
+
+    def open_session(self, clarinet: Clarinet):
+        """
+        Returns a SimulationSession for clarinet using this engine's settings.
+        Pass it to run_impedance_simulation to reuse the assembled physics
+        across a series of small geometry changes. Sessions are FEM only; the
+        TMM backend has nothing to reuse and ignores them.
+        """
+        from src.simulation.session import SimulationSession
+        return SimulationSession(clarinet, self.frequencies, self.temperature, self.losses)
+
+    def simulate_fingerings(self, clarinet: Clarinet, notes=None, workers: int = 1):
+        """
+        Simulates the notes of clarinet's fingering chart with one assembled
+        geometry. Returns {note: NoteResult}; see src.simulation.fingerings.
+        """
+        from src.simulation.fingerings import simulate_fingerings
+        return simulate_fingerings(self, clarinet, notes, workers)
+
+    @timed("simulate")
+    def run_impedance_simulation(self, clarinet: Clarinet, session=None, progress=None):
         """
         Runs impedance simulation for the given clarinet.
         Returns frequencies and complex impedance.
 
-        Using st.cache_data to improve performance on re-runs with identical geometry.
-        Note: We use _self to exclude 'self' from hashing if it doesn't change state relevant to the calc.
-        But 'clarinet' is a mutable object. Streamlit hashes it by value.
+        Results are looked up in self.cache first; the key covers the geometry,
+        temperature, loss model and frequency grid, so changing any of them
+        forces a fresh solve. Cached arrays are read-only.
+
+        With sweep_mode == 'adaptive' the returned grid is non-uniform
+        (see run_adaptive_simulation).
+
+        If a session (see open_session) is given, cache misses are solved by
+        updating that session instead of rebuilding the physics from scratch.
+
+        If progress is given, the grid is solved in blocks and
+        progress(frequencies_done, frequencies_total) is called after each
+        one; an exception raised by the callback aborts the solve unchanged
+        (this is how background jobs are cancelled). The TMM backend solves
+        the whole grid at once and reports a single step.
         """
-        # We need to recreate the frequency array inside or pass it, as 'self' is excluded from hashing
-        # if we follow the pattern strictly. However, let's keep it simple.
-        # Ideally, we move the logic out of the class or pass all params explicitly for caching.
-        # For now, let's assume 'clarinet' state is the key driver.
+        if self.sweep_mode == "adaptive":
+            result = self.run_adaptive_simulation(clarinet)
+            return result.frequencies, result.impedance
+
+        key = self.cache_key(clarinet)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        if self.backend == "tmm":
+            frequencies, impedance = self._solve(clarinet)
+            if progress is not None:
+                progress(len(frequencies), len(frequencies))
+        elif progress is not None:
+            frequencies, impedance = self._solve_blocks(clarinet, progress)
+        elif session is not None and self.workers <= 1:
+            frequencies, impedance = self._solve_in_session(session, clarinet)
+        else:
+            frequencies, impedance = self._solve(clarinet)
+        return self.cache.put(key, frequencies, impedance)
 
-        bore_data = clarinet.get_bore_list()
-        holes_data = clarinet.get_holes_list()
+    def _build_solver(self, clarinet: Clarinet, frequencies):
+        """
+        Builds geometry, physics and an (unsolved) FrequentialSolver.
+        The mesh is sized for max(frequencies).
+        """
+        return build_solver(clarinet.get_bore_list(), clarinet.get_openwind_holes(),
+                            self.temperature, self.losses, frequencies)
 
+    def _solve(self, clarinet: Clarinet):
+        """Runs the backend's solve without consulting the cache."""
         try:
-            # Create the geometry object explicitly.
-            inst = InstrumentGeometry(bore_data, holes_data)
+            if self.backend == "tmm":
+                with span("solve", backend="tmm"):
+                    impedance = self._solve_tmm(clarinet, self.frequencies)
+            elif self.workers > 1 and len(self.frequencies) >= 2 * self.workers:
+                with span("solve", workers=self.workers):
+                    impedance = self._solve_parallel(clarinet)
+            else:
+                solver = self._build_solver(clarinet, self.frequencies)
+                with span("solve"):
+                    solver.solve()
+                impedance = solver.impedance
+            self.solve_count += len(self.frequencies)
+            count("solves", len(self.frequencies))
 
-            # Use lower-level classes for maximum control and correctness
-            from openwind import InstrumentPhysics, FrequentialSolver
+            # Return frequencies and COMPLEX impedance (for Phase calculation)
+            return np.array(self.frequencies), impedance
+
+        except Exception as e:
+            raise RuntimeError(f"Simulation failed: {e}")
 
-            # For impedance computation, we typically want Unitary Flow input
-            player = Player("UNITARY_FLOW")
+    def _solve_tmm(self, clarinet: Clarinet, frequencies, open_holes=None):
+        """Analytic transfer-matrix solve (open_holes: state per hole, default all open)."""
+        from src.simulation.tmm import tmm_impedance
+        return tmm_impedance(clarinet.bore_array(), clarinet.holes_array(), self.temperature,
+                             frequencies, self.losses, open_holes)
 
-            # Create Physics Object
-            # We can expose losses and other params here for advanced users later
-            phys = InstrumentPhysics(inst, _self.temperature, player, losses=True)
+    def _solve_blocks(self, clarinet: Clarinet, progress):
+        """Streams the sweep, reporting progress(done, total) after each block."""
+        progress(0, len(self.frequencies))
+        for update in self.iter_impedance_simulation(clarinet, use_cache=False):
+            progress(len(update.frequencies), update.total)
+        return update.frequencies, update.impedance
 
-            # Create Solver
-            solver = FrequentialSolver(phys, _self.frequencies)
-            solver.solve()
+    def iter_impedance_simulation(self, clarinet: Clarinet, session=None, n_blocks: int = 8,
+                                  use_cache: bool = True):
+        """
+        Streaming variant of run_impedance_simulation: yields a SweepUpdate
+        after each ascending block of frequencies.
 
-            # Return frequencies and COMPLEX impedance (for Phase calculation)
-            return _self.frequencies, solver.impedance
+        Each update carries the curve solved so far and the peaks whose bracket
+        is complete, so resonances appear as soon as the sweep passes them. The
+        caller may stop iterating early (e.g. once the resonance it needs has
+        been found); only complete sweeps are cached. A cache hit, an
+        adaptive sweep or the TMM backend yields a single complete update.
+
+        Args:
+            clarinet (Clarinet): The design to simulate.
+            session (SimulationSession): Optional session to solve in (see open_session).
+            n_blocks (int): Number of blocks the grid is split into.
+            use_cache (bool): Look up and store the complete result in self.cache.
+
+        Yields:
+            SweepUpdate
+        """
+        if self.sweep_mode == "adaptive":
+            result = self.run_adaptive_simulation(clarinet)
+            yield SweepUpdate(result.frequencies, result.impedance, len(result.frequencies),
+                              len(result.frequencies), self.analyze_peaks(result.frequencies, result.impedance),
+                              result.cached)
+            return
+
+        total = len(self.frequencies)
+        key = self.cache_key(clarinet) if use_cache else None
+        cached = self.cache.get(key) if use_cache else None
+        if cached is not None:
+            yield SweepUpdate(*cached, total, total, self.analyze_peaks(*cached), cached=True)
+            return
+
+        if self.backend == "tmm":
+            frequencies, impedance = self._solve(clarinet)
+            if use_cache:
+                frequencies, impedance = self.cache.put(key, frequencies, impedance)
+            yield SweepUpdate(frequencies, impedance, total, total, self.analyze_peaks(frequencies, impedance))
+            return
 
+        try:
+            if session is None:
+                session = self.open_session(clarinet)
+            else:
+                session.set_clarinet(clarinet)
+                session.set_frequencies(self.frequencies)
+                session.set_temperature(self.temperature)
+                session.set_losses(self.losses)
+            blocks = session.iter_solve(n_blocks)
+        except Exception as e:
+            raise RuntimeError(f"Simulation failed: {e}")
+
+        freqs, imp = [], []
+        with closing(blocks):
+            while True:
+                try:
+                    block, impedance = next(blocks)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    raise RuntimeError(f"Simulation failed: {e}")
+                self.solve_count += len(block)
+                count("solves", len(block))
+                freqs.append(np.array(block))
+                imp.append(np.array(impedance))
+                frequencies, impedance = np.concatenate(freqs), np.concatenate(imp)
+                if len(frequencies) == total and use_cache:
+                    frequencies, impedance = self.cache.put(key, frequencies, impedance)
+                yield SweepUpdate(frequencies, impedance, len(block), total,
+                                  self.analyze_peaks(frequencies, impedance))
+
+    def _solve_in_session(self, session, clarinet: Clarinet):
+        """Brings session in line with clarinet and the engine settings, then solves."""
+        try:
+            session.set_clarinet(clarinet)
+            session.set_frequencies(self.frequencies)
+            session.set_temperature(self.temperature)
+            session.set_losses(self.losses)
+            frequencies, impedance = session.solve()
+            self.solve_count += len(frequencies)
+            count("solves", len(frequencies))
+            return np.array(frequencies), impedance
         except Exception as e:
             raise RuntimeError(f"Simulation failed: {e}")
 
+    def _solve_parallel(self, clarinet: Clarinet):
+        """
+        Splits the frequency grid into one contiguous chunk per worker and
+        solves the chunks concurrently. Every chunk uses the mesh of the full
+        range, so the stitched result is identical to a serial solve.
+        """
+        frequencies = np.asarray(self.frequencies, dtype=float)
+        chunks = np.array_split(frequencies, self.workers)
+        mesh_fmax = float(frequencies.max())
+        bore, holes = clarinet.get_bore_list(), clarinet.get_openwind_holes()
+        tasks = [(bore, holes, self.temperature, self.losses, chunk, mesh_fmax) for chunk in chunks]
+
+        pool = _get_pool(self.workers)
+        return np.concatenate(list(pool.map(_solve_chunk, tasks)))
+
+    @timed("simulate")
+    def run_adaptive_simulation(self, clarinet: Clarinet, coarse_step: float = None,
+                                tolerance: float = None, max_iterations: int = 30) -> SweepResult:
+        """
+        Adaptive sweep over the range of self.frequencies.
+
+        Solves a coarse grid, brackets every local maximum of |Z| and then
+        bisects both sides of each bracket (two extra solves per peak per
+        iteration) until the grid spacing around every peak is <= tolerance.
+        Peak frequencies are finally located by a parabolic fit in dB, which
+        gives sub-cent accuracy at a fraction of the dense-grid solve count.
+        The mesh is built once for the top of the range and reused for every
+        refinement pass.
+
+        Args:
+            clarinet (Clarinet): The design to simulate.
+            coarse_step (float): Initial grid spacing in Hz (default self.adaptive_step).
+            tolerance (float): Target grid spacing around peaks in Hz (default self.adaptive_tolerance).
+            max_iterations (int): Upper bound on refinement passes.
+
+        Returns:
+            SweepResult
+        """
+        coarse_step = coarse_step or self.adaptive_step
+        tolerance = tolerance or self.adaptive_tolerance
+
+        coarse = self._coarse_grid(coarse_step)
+        key = self._adaptive_key(clarinet, coarse, tolerance, max_iterations)
+        cached = self.cache.get(key)
+        if cached is not None:
+            freqs, imp = cached
+            return SweepResult(freqs, imp, len(freqs), find_peaks(freqs, imp, min_magnitude_db=-np.inf).frequency, cached=True)
+
+        try:
+            if self.backend == "tmm":
+                def solve_at(frequencies):
+                    with span("solve", backend="tmm"):
+                        return self._solve_tmm(clarinet, frequencies)
+            else:
+                solver = self._build_solver(clarinet, coarse)
+
+                def solve_at(frequencies):
+                    # Same or lower fmax: OpenWind keeps the existing mesh
+                    if frequencies is not coarse:
+                        with span("assembly"):
+                            solver.update_frequencies_and_mesh(frequencies)
+                    with span("solve"):
+                        solver.solve()
+                    return np.array(solver.impedance)
+
+            freqs = coarse
+            imp = solve_at(coarse)
+
+            for _ in range(max_iterations):
+                new_freqs = _refinement_points(freqs, np.abs(imp), tolerance)
+                if len(new_freqs) == 0:
+                    break
+                freqs = np.concatenate([freqs, new_freqs])
+                imp = np.concatenate([imp, solve_at(new_freqs)])
+                order = np.argsort(freqs)
+                freqs, imp = freqs[order], imp[order]
+        except Exception as e:
+            raise RuntimeError(f"Simulation failed: {e}")
+
+        self.solve_count += len(freqs)
+        count("solves", len(freqs))
+        freqs, imp = self.cache.put(key, freqs, imp)
+        return SweepResult(freqs, imp, len(freqs), find_peaks(freqs, imp, min_magnitude_db=-np.inf).frequency)
+
     def detect_peaks(self, frequencies, impedance):
         """
         Detects impedance peaks which correspond to resonance frequencies.
         Returns a list of tuples: (Frequency, Magnitude_dB).
+
+        Peak frequencies are interpolated between bins. For a 2-D stack of
+        impedance curves (one design per row) a list of such lists is returned.
+        """
+        table = self.analyze_peaks(frequencies, impedance)
+        if np.ndim(impedance) == 1:
+            return table.as_tuples()
+        return [table.for_row(i).as_tuples() for i in range(np.shape(impedance)[0])]
+
+    def analyze_peaks(self, frequencies, impedance, mag_db=None) -> PeakTable:
+        """
+        Full peak analysis (interpolated frequency, magnitude, prominence,
+        -3 dB bandwidth and Q) using the engine's thresholds.
+        Accepts a single curve or a 2-D stack of curves.
         """
-        # Simple peak detection
-        peaks = []
-        mag = 20 * np.log10(np.abs(impedance))
-
-        # Basic algorithm: point is higher than neighbors
-        # Can be improved with scipy.signal.find_peaks for robustness
-        for i in range(1, len(mag)-1):
-            if mag[i] > mag[i-1] and mag[i] > mag[i+1]:
-                # Filter out very small peaks (noise)
-                if mag[i] > -20: # arbitrary threshold, maybe expose this?
-                    peaks.append((frequencies[i], mag[i]))
-        return peaks
+        return find_peaks(
+            frequencies, impedance, mag_db=mag_db,
+            min_magnitude_db=self.peak_threshold_db,
+            min_prominence_db=self.peak_min_prominence_db,
+        )
+
+
+def build_solver(bore, holes, temperature, losses, frequencies, mesh_fmax: float = None):
+    """
+    Builds InstrumentGeometry, InstrumentPhysics and an unsolved FrequentialSolver.
+    holes is an OpenWind hole table with headers (see Clarinet.get_openwind_holes).
+
+    If mesh_fmax is given the mesh is sized for that frequency instead of
+    max(frequencies), so chunks of a larger grid share the same discretization.
+    """
+    # Imported here so that loading the engine (e.g. for cache hits, archives
+    # or the CLI) does not pay for OpenWind and the plotting stack it pulls in.
+    with span("import"):
+        from openwind import InstrumentGeometry, InstrumentPhysics, FrequentialSolver, Player
+
+    # Create the geometry object explicitly.
+    with span("geometry"):
+        inst = InstrumentGeometry(bore, holes)
+
+    # For impedance computation, we typically want Unitary Flow input
+    player = Player("UNITARY_FLOW")
+
+    # Create Physics Object
+    with span("physics"):
+        phys = InstrumentPhysics(inst, temperature, player, losses=losses)
+
+    # Create Solver
+    with span("assembly"):
+        if mesh_fmax is None or mesh_fmax <= np.max(frequencies):
+            return FrequentialSolver(phys, frequencies)
+        # Build the mesh for mesh_fmax with a single-frequency solver (cheap),
+        # then move to the real grid; OpenWind keeps a mesh fine enough already.
+        solver = FrequentialSolver(phys, [mesh_fmax])
+        solver.update_frequencies_and_mesh(frequencies)
+        return solver
+
+def _solve_chunk(task):
+    """Worker entry point: builds the physics once and solves one frequency chunk."""
+    bore, holes, temperature, losses, frequencies, mesh_fmax = task
+    solver = build_solver(bore, holes, temperature, losses, frequencies, mesh_fmax)
+    solver.solve()
+    return solver.impedance
+
+_pools = {}
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Returns a process pool of the given size, shared by all engines in this process."""
+    pool = _pools.get(workers)
+    if pool is None or getattr(pool, "_broken", False):
+        pool = ProcessPoolExecutor(max_workers=workers)
+        _pools[workers] = pool
+    return pool
+
+def _refinement_points(frequencies, magnitude, tolerance):
+    """
+    New frequencies to solve: the midpoints on each side of every local
+    maximum of magnitude whose neighbours are still further than tolerance.
+    """
+    inner = np.arange(1, len(magnitude) - 1)
+    is_peak = (magnitude[inner] > magnitude[inner - 1]) & (magnitude[inner] >= magnitude[inner + 1])
+    idx = inner[is_peak]
+
+    left_gap = frequencies[idx] - frequencies[idx - 1]
+    right_gap = frequencies[idx + 1] - frequencies[idx]
+    left = (frequencies[idx] - left_gap / 2)[left_gap > tolerance]
+    right = (frequencies[idx] + right_gap / 2)[right_gap > tolerance]
+    return np.unique(np.concatenate([left, right]))
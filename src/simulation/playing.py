@@ -0,0 +1,274 @@
+"""
+Time-domain playing simulation: the design blown with a clarinet reed.
+
+OpenWind's TemporalSolver integrates the bore, tone holes and a one-degree-
+of-freedom reed model step by step. The stable time step (a few
+microseconds, set by the shortest mesh elements) is far below the audio
+sample period, so the scheme runs at an integer number of steps per sample
+and the audio is produced in fixed-size chunks: a note of any duration only
+ever holds one chunk in memory, and can be streamed to the UI or appended to
+a WAV file as it is computed.
+"""
+import time
+import wave
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+import numpy as np
+from src.instrumentation import count, span
+from src.models.clarinet import Clarinet
+
+DEFAULT_SAMPLE_RATE = 44100
+DEFAULT_CHUNK_SIZE = 4096  # Samples per chunk (about 0.1 s at 44.1 kHz)
+AIR_DENSITY = 1.2          # kg/m^3, for the radiated pressure estimate
+
+
+@dataclass
+class AudioChunk:
+    """A block of consecutive samples of a playing simulation."""
+    start: int               # Index of the first sample
+    total: int               # Samples in the whole run
+    sample_rate: int
+    radiated: np.ndarray     # Far-field sound pressure at `distance` (Pa)
+    mouthpiece: np.ndarray   # Pressure in the mouthpiece (Pa)
+    elapsed: float           # Wall time since the run started (s)
+
+    @property
+    def stop(self) -> int:
+        """Index after the last sample."""
+        return self.start + len(self.radiated)
+
+    @property
+    def real_time_factor(self) -> float:
+        """Wall time per simulated second so far (> 1 is slower than real time)."""
+        return self.elapsed * self.sample_rate / self.stop
+
+
+@dataclass
+class PlayingResult:
+    """Summary of a finished (or stopped) playing simulation."""
+    note: Optional[str]              # Fingering played, None for all holes open
+    sample_rate: int
+    samples: int                     # Samples produced
+    elapsed: float                   # Wall time (s)
+    sounding_frequency: float        # Pitch of the last 0.25 s (Hz), NaN if silent
+    rms_pressure: float              # Radiated RMS of the last 0.25 s (Pa)
+    peak_pressure: float             # Largest radiated |p| (Pa)
+    clipped: int = 0                 # Samples beyond the WAV full scale
+    path: Optional[str] = None       # WAV file, if written
+
+    @property
+    def duration(self) -> float:
+        return self.samples / self.sample_rate
+
+    @property
+    def real_time_factor(self) -> float:
+        return self.elapsed / self.duration if self.samples else np.nan
+
+
+def sounding_frequency(signal, sample_rate: int, fmin: float = 50.0, fmax: float = 2000.0) -> float:
+    """
+    Fundamental of a steady tone: the strongest spectral peak in [fmin, fmax]
+    of the Hann-windowed signal, refined by a parabola through the log
+    magnitudes around it. Returns NaN for silence.
+    """
+    signal = np.asarray(signal, dtype=float)
+    signal = signal - signal.mean()
+    if len(signal) < 3 or not np.any(signal):
+        return np.nan
+    n_fft = 8 * len(signal)  # Zero-padded for a finer grid before the fit
+    spectrum = np.abs(np.fft.rfft(signal * np.hanning(len(signal)), n_fft))
+    freqs = np.fft.rfftfreq(n_fft, 1 / sample_rate)
+    band = np.flatnonzero((freqs >= fmin) & (freqs <= fmax))
+    i = band[np.argmax(spectrum[band])]
+    if i == 0 or i == len(spectrum) - 1:
+        return float(freqs[i])
+    a, b, c = np.log(spectrum[i - 1:i + 2] + 1e-300)
+    offset = 0.5 * (a - c) / (a - 2 * b + c) if a - 2 * b + c < 0 else 0.0
+    return float(freqs[i] + offset * (freqs[1] - freqs[0]))
+
+
+class WavWriter:
+    """
+    Appends float samples (Pa) to a 16-bit mono WAV file as they arrive.
+    full_scale is the pressure mapped to the largest sample value, fixed up
+    front so levels stay comparable between designs; louder samples clip.
+    """
+
+    def __init__(self, path: str, sample_rate: int, full_scale: float = 2.0):
+        if full_scale <= 0:
+            raise ValueError("full_scale must be positive.")
+        self.path = path
+        self.full_scale = full_scale
+        self.clipped = 0
+        self._file = wave.open(path, "wb")
+        self._file.setnchannels(1)
+        self._file.setsampwidth(2)
+        self._file.setframerate(int(sample_rate))
+
+    def write(self, samples):
+        scaled = np.asarray(samples, dtype=float) / self.full_scale
+        self.clipped += int(np.count_nonzero(np.abs(scaled) > 1))
+        self._file.writeframes((np.clip(scaled, -1, 1) * 32767).astype("<i2").tobytes())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PlayingSimulation:
+    """
+    A design (optionally fingered for a note) played with OpenWind's
+    clarinet reed model, from silence, at a steady mouth pressure.
+
+    Args:
+        clarinet (Clarinet): The design.
+        note (str): Fingering to play (None = all holes open).
+        temperature (float): Air temperature (Celsius).
+        losses (bool): Viscothermal losses (diffusive representation; about
+            2-3x slower than the lossless scheme).
+        sample_rate (int): Audio sample rate (Hz).
+        mouth_pressure (float): Blowing pressure (Pa) once the attack is over.
+        attack (float): Duration of the linear pressure ramp (s).
+        distance (float): Listening distance for the radiated pressure (m).
+        reed (dict): Overrides of OpenWind's 'CLARINET' reed parameters
+            (e.g. {"opening": 3e-4}).
+    """
+
+    def __init__(self, clarinet: Clarinet, note: str = None, temperature: float = 25, losses: bool = False,
+                 sample_rate: int = DEFAULT_SAMPLE_RATE, mouth_pressure: float = 2000.0,
+                 attack: float = 0.02, distance: float = 1.0, reed: dict = None):
+        if sample_rate <= 0:
+            raise ValueError("Sample rate must be positive.")
+        if mouth_pressure <= 0 or attack < 0 or distance <= 0:
+            raise ValueError("Mouth pressure and distance must be positive, attack non-negative.")
+        if note is not None and note not in clarinet.fingerings:
+            raise ValueError(f"Unknown note: {note}")
+        self.note = note
+        self.sample_rate = int(sample_rate)
+        self.distance = distance
+        try:
+            self._build(clarinet, temperature, losses, mouth_pressure, attack, reed or {})
+        except Exception as e:
+            raise RuntimeError(f"Simulation failed: {e}")
+
+    def _build(self, clarinet, temperature, losses, mouth_pressure, attack, reed):
+        # Imported here, as in build_solver, so the frequency-domain paths never load the temporal stack
+        from openwind import InstrumentGeometry, InstrumentPhysics, Player
+        from openwind.technical.temporal_curves import constant_with_initial_ramp
+        from openwind.temporal import TemporalSolver
+        from openwind.temporal.tradiation import TemporalRadiation
+
+        chart = []
+        if self.note is not None:
+            states = clarinet.get_fingering_states(self.note)
+            chart = [["label", self.note]] + [[Clarinet.openwind_label(i), "o" if is_open else "x"]
+                                              for i, is_open in enumerate(states)]
+        player = Player("CLARINET", note_events=[(self.note, 0.0)] if self.note is not None else [])
+        for name, value in reed.items():
+            player.update_curve(name, value)
+        player.update_curve("mouth_pressure", constant_with_initial_ramp(mouth_pressure, attack))
+
+        with span("geometry"):
+            geometry = InstrumentGeometry(clarinet.get_bore_list(), clarinet.get_openwind_holes(), chart)
+        with span("physics"):
+            self._physics = InstrumentPhysics(geometry, temperature, player, losses="diffrepr" if losses else False)
+        with span("assembly"):
+            self._solver = TemporalSolver(self._physics)
+
+        # Whole number of scheme steps per sample, each no longer than the stable step
+        time_scale = self._solver.scaling.get_time()
+        self.steps_per_sample = int(np.ceil(1 / (self.sample_rate * self._solver.get_dt() * time_scale)))
+        self._solver._set_dt(1 / (self.sample_rate * self.steps_per_sample) / time_scale)
+        self._radiation = [c for c in self._solver.t_components if isinstance(c, TemporalRadiation)]
+        self._source = next(c for c in self._solver.t_components if c.label.endswith("_source"))
+
+    @property
+    def dt(self) -> float:
+        """Scheme time step (s)."""
+        return 1 / (self.sample_rate * self.steps_per_sample)
+
+    def iter_chunks(self, duration: float, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[AudioChunk]:
+        """
+        Plays for duration seconds from silence, yielding AudioChunks of
+        chunk_size samples (the last one may be shorter). The caller may stop
+        iterating at any point.
+
+        The radiated pressure is the monopole far field of every open end,
+        rho / (4 pi distance) * dQ/dt summed over the bell and the open
+        holes; the derivative is taken over each sample period, which also
+        averages the scheme's steps within it.
+        """
+        if duration <= 0 or chunk_size <= 0:
+            raise ValueError("Duration and chunk size must be positive.")
+        total = int(round(duration * self.sample_rate))
+        solver, steps = self._solver, self.steps_per_sample
+        try:
+            solver.reset()
+            solver._execute_score.set_score(self._physics.player.get_score())
+            self._physics._update_player()
+        except Exception as e:
+            raise RuntimeError(f"Simulation failed: {e}")
+
+        gain = AIR_DENSITY / (4 * np.pi * self.distance) * self.sample_rate
+        previous_flow = 0.0
+        start_time = time.perf_counter()
+        for start in range(0, total, chunk_size):
+            n = min(chunk_size, total - start)
+            flow, mouthpiece = np.empty(n), np.empty(n, dtype=np.float32)
+            with span("temporal.chunk", samples=n):
+                try:
+                    for i in range(n):
+                        for _ in range(steps):
+                            solver.one_step()
+                        flow[i] = sum(c.get_values_to_record()["flow"] for c in self._radiation)
+                        mouthpiece[i] = self._source.get_values_to_record()["pressure"]
+                except Exception as e:
+                    raise RuntimeError(f"Simulation failed: {e}")
+            count("temporal.steps", n * steps)
+            radiated = (gain * np.diff(flow, prepend=previous_flow)).astype(np.float32)
+            previous_flow = flow[-1]
+            yield AudioChunk(start, total, self.sample_rate, radiated, mouthpiece,
+                             time.perf_counter() - start_time)
+
+    def write_wav(self, path: str, duration: float, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  full_scale: float = 2.0, on_chunk: Callable[[AudioChunk], None] = None) -> PlayingResult:
+        """
+        Plays for duration seconds, appending the radiated pressure to a WAV
+        file chunk by chunk.
+
+        Args:
+            path (str): Output WAV file (16-bit mono).
+            duration (float): Simulated time (s).
+            chunk_size (int): Samples computed and written at a time.
+            full_scale (float): Pressure (Pa) at the largest sample value.
+            on_chunk (callable): Called with every AudioChunk once it is
+                written; an exception it raises stops the run (the file keeps
+                the audio so far) and propagates.
+
+        Returns:
+            PlayingResult
+        """
+        tail = int(0.25 * self.sample_rate)
+        recent_mouthpiece, recent_radiated = np.zeros(0), np.zeros(0)
+        peak, samples, elapsed = 0.0, 0, 0.0
+        with WavWriter(path, self.sample_rate, full_scale) as wav:
+            for chunk in self.iter_chunks(duration, chunk_size):
+                wav.write(chunk.radiated)
+                # Only the end of the note is kept, for its pitch and level
+                recent_mouthpiece = np.concatenate([recent_mouthpiece, chunk.mouthpiece])[-tail:]
+                recent_radiated = np.concatenate([recent_radiated, chunk.radiated])[-tail:]
+                peak = max(peak, float(np.max(np.abs(chunk.radiated))))
+                samples, elapsed = chunk.stop, chunk.elapsed
+                if on_chunk is not None:
+                    on_chunk(chunk)
+        return PlayingResult(
+            self.note, self.sample_rate, samples, elapsed,
+            sounding_frequency(recent_mouthpiece, self.sample_rate),
+            float(np.sqrt(np.mean(recent_radiated ** 2))) if samples else 0.0,
+            peak, wav.clipped, path,
+        )
@@ -0,0 +1,259 @@
+"""
+Process-wide simulation service for multi-user deployments.
+
+Every browser session submits its background jobs (see src.simulation.jobs)
+to one SimulationService instead of starting threads of its own, so the
+number of solves running at once is fixed however many people use the app:
+
+- a fixed number of worker threads;
+- a bounded queue, with a per-session share, beyond which submit() raises
+  ServiceBusy instead of piling up work;
+- round-robin between sessions, so one user queueing several runs does not
+  hold everybody else back;
+- deduplication: a request with the same key as one already queued or
+  running joins that run instead of starting another.
+
+Results are shared through the engine's ImpedanceCache as before.
+"""
+import itertools
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional
+from src.simulation.jobs import Job, run_job
+
+# Job fields a shared run copies to the Jobs of its subscribers
+_MIRRORED = ("status", "done", "total", "message", "partial", "result", "error", "finished")
+
+
+class ServiceBusy(RuntimeError):
+    """The service's queue, or the session's share of it, is full."""
+
+
+@dataclass(eq=False)
+class _SharedRun(Job):
+    """
+    The Job a queued task's work function receives. Progress, previews and
+    the outcome are copied to the Job of every subscriber; the run stops
+    once all of them have cancelled.
+    """
+    subscribers: List[Job] = field(default_factory=list)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in _MIRRORED:
+            for job in self.__dict__.get("subscribers", ()):
+                if not job.cancel_requested:
+                    object.__setattr__(job, name, value)
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set() or all(job.cancel_requested for job in self.subscribers)
+
+    def attach(self, job: Job):
+        """Adds a subscriber and brings its Job up to date with the run."""
+        job.trace = self.trace
+        self.subscribers.append(job)
+        for name in _MIRRORED:
+            setattr(job, name, getattr(self, name))
+
+    def report(self, done, total=None, message=""):
+        self.settle()
+        super().report(done, total, message)
+
+    def settle(self):
+        """Marks subscribers that cancelled as cancelled (the run may go on for the others)."""
+        for job in self.subscribers:
+            if job.cancel_requested and job.active:
+                job.status, job.finished = "cancelled", time.time()
+
+
+@dataclass(eq=False)
+class _Task:
+    run: _SharedRun
+    fn: Callable
+    args: tuple
+    kwargs: dict
+    key: Optional[str]
+    session: Optional[str]
+
+
+class SimulationService:
+    """
+    Worker threads shared by every session, with a fair, bounded queue.
+
+    Args:
+        workers (int): Jobs running at once.
+        max_queued (int): Jobs waiting for a worker, over all sessions.
+        max_queued_per_session (int): Jobs one session may have waiting.
+    """
+
+    def __init__(self, workers: int = 2, max_queued: int = 32, max_queued_per_session: int = 4):
+        if workers < 1 or max_queued < 1 or max_queued_per_session < 1:
+            raise ValueError("Workers and queue sizes must be at least 1.")
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_queued_per_session = max_queued_per_session
+        self.submitted = 0      # Runs queued
+        self.deduplicated = 0   # Requests that joined a run already queued or running
+        self.rejected = 0       # Requests refused with ServiceBusy
+        self.completed = 0      # Runs finished (in any state)
+        self._queues: Dict[Optional[str], Deque[_Task]] = {}
+        self._turns: Deque[Optional[str]] = deque()  # Sessions with waiting jobs, next one first
+        self._inflight: Dict[str, _Task] = {}        # Dedup key -> queued or running task
+        self._running: List[_Task] = []
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._work, name=f"clarinet-service-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, session: Optional[str], job: Job, fn: Callable, args=(), kwargs=None,
+               key: str = None, replaces: Job = None) -> Job:
+        """
+        Queues fn(run, *args, **kwargs) for session; job follows its
+        progress and receives its outcome.
+
+        Args:
+            session (str): Identifies the submitting session, for fairness and its queue share.
+            job (Job): The caller's Job (see JobManager.submit).
+            fn (callable): Work function, as for JobManager.submit.
+            key (str): Deduplication key: a request with the key of a run that
+                is queued or running (and not cancelled) joins that run.
+            replaces (Job): A job of the session that job supersedes. Its queue
+                slot counts as free, and it is cancelled once job is accepted;
+                if job is refused it is left untouched.
+
+        Returns:
+            Job: job
+
+        Raises:
+            ServiceBusy: The queue or the session's share of it is full.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("The simulation service has been shut down.")
+            task = self._inflight.get(key) if key is not None else None
+            if task is not None and task.run.active and not task.run.cancel_requested:
+                task.run.attach(job)
+                self.deduplicated += 1
+            else:
+                self._purge()
+                freed = self._freed_by(replaces)
+                if len(self._queues.get(session, ())) - (freed is not None and freed.session == session) \
+                        >= self.max_queued_per_session:
+                    self.rejected += 1
+                    raise ServiceBusy(f"You already have {self.max_queued_per_session} jobs waiting.")
+                if self._queued() - (freed is not None) >= self.max_queued:
+                    self.rejected += 1
+                    raise ServiceBusy(f"The server is busy ({self._queued()} jobs waiting).")
+                self._enqueue(session, job, fn, args, kwargs, key)
+            if replaces is not None:
+                replaces.cancel()
+                self._purge()
+        return job
+
+    def queued_ahead(self, job: Job) -> Optional[int]:
+        """Jobs that will start before job, or None if it is not waiting."""
+        with self._cond:
+            queues = [self._queues[session] for session in self._turns]
+            ahead = 0
+            # Sessions take turns: one job from each, in turn order, then the next round
+            for depth in range(max(map(len, queues), default=0)):
+                for queue in queues:
+                    if depth < len(queue):
+                        if any(subscriber is job for subscriber in queue[depth].run.subscribers):
+                            return ahead
+                        ahead += 1
+        return None
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"workers": self.workers, "running": len(self._running), "queued": self._queued(),
+                    "sessions_waiting": len(self._turns), "submitted": self.submitted,
+                    "deduplicated": self.deduplicated, "rejected": self.rejected, "completed": self.completed}
+
+    def shutdown(self, timeout: float = None):
+        """Cancels everything queued or running and stops the workers."""
+        with self._cond:
+            self._closed = True
+            for task in self._running + [task for queue in self._queues.values() for task in queue]:
+                task.run.cancel()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _enqueue(self, session, job, fn, args, kwargs, key):
+        run = _SharedRun(next(self._ids), job.kind, job.fingerprint, trace=job.trace)
+        run.attach(job)
+        task = _Task(run, fn, tuple(args), dict(kwargs or {}), key, session)
+        if session not in self._queues:
+            self._queues[session] = deque()
+            self._turns.append(session)
+        self._queues[session].append(task)
+        if key is not None:
+            self._inflight[key] = task
+        self.submitted += 1
+        self._cond.notify()
+
+    def _freed_by(self, job: Optional[Job]) -> Optional[_Task]:
+        """The waiting task that cancelling job would drop (job is its only live subscriber), if any."""
+        if job is None or job.cancel_requested:
+            return None
+        for queue in self._queues.values():
+            for task in queue:
+                live = [subscriber for subscriber in task.run.subscribers if not subscriber.cancel_requested]
+                if len(live) == 1 and live[0] is job:
+                    return task
+        return None
+
+    def _queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _purge(self):
+        """Drops waiting tasks whose subscribers all cancelled, so they free their queue slots."""
+        for session in list(self._turns):
+            queue = self._queues[session]
+            for task in [task for task in queue if task.run.cancel_requested]:
+                self._finish(task, "cancelled")
+            queue = self._queues[session] = deque(task for task in queue if not task.run.cancel_requested)
+            if not queue:
+                del self._queues[session]
+                self._turns.remove(session)
+
+    def _next(self) -> _Task:
+        session = self._turns.popleft()
+        queue = self._queues[session]
+        task = queue.popleft()
+        if queue:
+            self._turns.append(session)
+        else:
+            del self._queues[session]
+        return task
+
+    def _finish(self, task: _Task, status: str = None):
+        if status is not None:
+            task.run.status, task.run.finished = status, time.time()
+        task.run.settle()
+        if task.key is not None and self._inflight.get(task.key) is task:
+            del self._inflight[task.key]
+        self.completed += 1
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self._turns:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                task = self._next()
+                self._running.append(task)
+            try:
+                run_job(task.run, task.fn, task.args, task.kwargs)
+            finally:
+                with self._cond:
+                    self._running.remove(task)
+                    self._finish(task)
@@ -0,0 +1,366 @@
+import copy
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence
+import numpy as np
+from openwind import InstrumentGeometry, InstrumentPhysics, FrequentialSolver, Player
+from openwind.technical.fingering_chart import FingeringChart
+from src.instrumentation import span
+from src.models.clarinet import Clarinet
+from src.models.diff import diff_designs
+
+# Timed stages, in pipeline order
+STAGES = ("geometry", "physics", "assembly", "solve")
+
+
+class _IncrementalSolver(FrequentialSolver):
+    """
+    FrequentialSolver that reuses the frequency-dependent FEM matrices of every
+    pipe whose geometry, mesh and frequency grid were seen in an earlier assembly.
+
+    Moving one tone hole only changes the chimney and the two bore slices
+    around it, so the other pipes' loss matrices (the bulk of the assembly
+    cost) are reused. Entries are kept per frequency grid, so alternating
+    between a few grids (e.g. one window per note) stays cheap; the memo is a
+    byte-bounded LRU. It assumes fixed physics; call invalidate_assembly()
+    when the temperature or loss model changes.
+
+    The memo wraps private methods of OpenWind's FEM pipes (as of OpenWind
+    0.12). Pipes that do not have them are assembled normally, so another
+    OpenWind version only loses the reuse.
+    """
+
+    def __init__(self, *args, memo_bytes: int = 256 * 2**20, **kwargs):
+        self._pipe_memo = OrderedDict()
+        self._memo_size = 0
+        self.memo_bytes = memo_bytes
+        self.pipes_assembled = 0
+        self.pipes_reused = 0
+        super().__init__(*args, **kwargs)
+
+    def invalidate_assembly(self):
+        self._pipe_memo = OrderedDict()
+        self._memo_size = 0
+
+    @staticmethod
+    def _can_memoize(f_pipe) -> bool:
+        """True if f_pipe has the OpenWind internals the memo wraps and signs."""
+        cls, mesh = type(f_pipe), getattr(f_pipe, "mesh", None)
+        return (callable(getattr(cls, "_compute_diags", None))
+                and callable(getattr(cls, "_compute_indep_freq", None))
+                and all(hasattr(mesh, name) for name in ("get_xL2", "get_orders", "get_lengths"))
+                and all(hasattr(getattr(f_pipe, "pipe", None), name)
+                        for name in ("get_endpoints_position_value", "get_radius_at")))
+
+    @staticmethod
+    def _pipe_signature(f_pipe):
+        mesh = f_pipe.mesh
+        x = mesh.get_xL2()
+        return (
+            tuple(f_pipe.pipe.get_endpoints_position_value()),
+            np.asarray(f_pipe.pipe.get_radius_at(x)).tobytes(),
+            tuple(mesh.get_orders()),
+            np.asarray(mesh.get_lengths()).tobytes(),
+        )
+
+    def _construct_matrices_pipes(self):
+        grid = np.asarray(self.frequencies, dtype=float).tobytes()
+        memoized = [f_pipe for f_pipe in self.f_pipes if self._can_memoize(f_pipe)]
+        for f_pipe in memoized:
+            signature = self._pipe_signature(f_pipe)
+            # Always wrap the class implementations, never a previous wrapper
+            cls = type(f_pipe)
+            f_pipe._compute_diags = self._memoized(
+                (grid, signature), cls._compute_diags.__get__(f_pipe))
+            # The frequency-independent block only depends on the mesh
+            f_pipe._compute_indep_freq = self._memoized(
+                ("indep", signature), cls._compute_indep_freq.__get__(f_pipe), count=False)
+        super()._construct_matrices_pipes()
+
+        # Evict least recently used entries, never the ones just assembled
+        n_current = 2 * len(memoized)
+        while self._memo_size > self.memo_bytes and len(self._pipe_memo) > n_current:
+            _, value = self._pipe_memo.popitem(last=False)
+            self._memo_size -= self._nbytes(value)
+
+    def _memoized(self, key, compute, count=True):
+        memo = self._pipe_memo
+
+        def wrapper(*args):
+            if key in memo:
+                self.pipes_reused += count
+                memo.move_to_end(key)
+                return memo[key]
+            self.pipes_assembled += count
+            value = compute(*args)
+            memo[key] = value
+            self._memo_size += self._nbytes(value)
+            return value
+
+        return wrapper
+
+    @staticmethod
+    def _nbytes(value):
+        # Dense diagonals or a sparse block
+        data = getattr(value, "data", value)
+        return getattr(data, "nbytes", 0)
+
+
+class SimulationSession:
+    """
+    Stateful simulation of a single design.
+
+    Keeps the OpenWind InstrumentGeometry, InstrumentPhysics and FrequentialSolver
+    alive between solves and only redoes the stages an update invalidates:
+
+    - set_frequencies: reassembles the frequency-dependent matrices; the mesh is
+      kept unless the new range goes higher than the one it was built for.
+    - set_temperature / move_hole / resize_hole: rebuilds the netlist and the
+      FEM assembly from the existing geometry (no re-parsing).
+    - set_fingering: updates only the radiation connectors.
+    - set_clarinet: updates holes in place when the bore and hole count are
+      unchanged, otherwise starts over from the geometry.
+
+    Pipes whose geometry did not change keep their assembled FEM matrices, so
+    a hole edit reassembles only the pipes next to that hole.
+
+    Time spent per stage is accumulated in `timings` (seconds) and `counts`;
+    `last_timings` holds the breakdown of the most recent solve().
+    """
+
+    def __init__(self, clarinet: Clarinet, frequencies=None, temperature: float = 25,
+                 losses=True):
+        self.clarinet = copy.deepcopy(clarinet)
+        self.frequencies = np.asarray(
+            frequencies if frequencies is not None else np.arange(20, 2500, 2), dtype=float
+        )
+        self.temperature = temperature
+        self.losses = losses
+        self.fingering = None  # None = all holes open, else opening factor per hole
+
+        self.timings = dict.fromkeys(STAGES, 0.0)
+        self.counts = dict.fromkeys(STAGES, 0)
+        self.last_timings = {}
+        self.impedance = None
+
+        self._geometry = None
+        self._physics = None
+        self._solver = None
+        self._mesh_fmax = 0.0  # Highest frequency the current mesh resolves
+        self._stale = {"geometry"}
+
+    # --- Updates -----------------------------------------------------------
+
+    def set_frequencies(self, frequencies):
+        """Changes the frequency grid."""
+        frequencies = np.asarray(frequencies, dtype=float)
+        if not np.array_equal(frequencies, self.frequencies):
+            self.frequencies = frequencies
+            self._stale.add("frequencies")
+
+    def set_temperature(self, temperature: float):
+        """Changes the air temperature (degrees Celsius)."""
+        if temperature != self.temperature:
+            self.temperature = temperature
+            self._stale.add("physics")
+
+    def set_losses(self, losses):
+        """Changes the OpenWind loss model; the physics is recreated."""
+        if losses != self.losses:
+            self.losses = losses
+            self._stale.add("losses")
+
+    def move_hole(self, index: int, position: float):
+        """Moves the hole at index (in the session's hole order) to position (m)."""
+        self.clarinet.holes[index].position = position
+        if self._geometry is not None:
+            self._geometry.holes[index].position.set_value(position)
+        self._stale.add("holes")
+
+    def resize_hole(self, index: int, radius: float = None, chimney: float = None):
+        """Changes the radius and/or chimney height (m) of the hole at index."""
+        hole = self.clarinet.holes[index]
+        if radius is not None:
+            if radius <= 0:
+                raise ValueError("Hole radius must be positive.")
+            hole.radius = radius
+        if chimney is not None:
+            hole.chimney = chimney
+
+        if self._geometry is not None:
+            # Chimney shape parameters are (start, chimney, radius_in, radius_out);
+            # radius_out is the same parameter object as radius_in for cylinders.
+            params = self._geometry.holes[index].shape.params
+            params[1].set_value(hole.chimney)
+            params[2].set_value(hole.radius)
+        self._stale.add("holes")
+
+    def set_fingering(self, open_holes: Optional[Sequence] = None):
+        """
+        Sets which holes are open.
+
+        Args:
+            open_holes: One entry per hole (True/1 = open, False/0 = closed,
+                fractions allowed), or None for all holes open.
+        """
+        if open_holes is not None:
+            if len(open_holes) != len(self.clarinet.holes):
+                raise ValueError("Fingering must give one state per hole.")
+            open_holes = [float(state) for state in open_holes]
+        if open_holes != self.fingering:
+            self.fingering = open_holes
+            self._stale.add("fingering")
+
+    def set_clarinet(self, clarinet: Clarinet):
+        """
+        Replaces the design. If the bore and the number of holes are unchanged,
+        only the holes that moved or were resized are updated in place; label,
+        name and fingering chart edits never touch the physics.
+        """
+        diff = diff_designs(self.clarinet, clarinet)
+        if self._geometry is None or diff.bore_changed or diff.holes_count_changed:
+            self.clarinet = copy.deepcopy(clarinet)
+            if self.fingering is not None and len(self.fingering) != len(clarinet.holes):
+                self.fingering = None
+            self._stale.add("geometry")
+            return
+
+        for i in diff.holes_moved:
+            self.move_hole(i, clarinet.holes[i].position)
+        for i in diff.holes_resized:
+            self.resize_hole(i, clarinet.holes[i].radius, clarinet.holes[i].chimney)
+        for i in diff.holes_relabelled:
+            self.clarinet.holes[i].label = clarinet.holes[i].label
+        self.clarinet.fingerings = dict(clarinet.fingerings)
+        self.clarinet.name = clarinet.name
+
+    # --- Solve -------------------------------------------------------------
+
+    def solve(self):
+        """
+        Brings the physics up to date and solves.
+        Returns frequencies and complex impedance.
+        """
+        self.last_timings = dict.fromkeys(STAGES, 0.0)
+        stale = self._stale
+
+        if "geometry" in stale or self._solver is None:
+            self._build()
+        elif stale - {"frequencies", "fingering"}:
+            self._rebuild_physics("losses" in stale, reuse_pipes="physics" not in stale)
+        elif "frequencies" in stale:
+            with self._timed("assembly"):
+                self._solver.update_frequencies_and_mesh(self.frequencies)
+                if "fingering" in stale:
+                    self._solver.set_note(self._make_fingering())
+        elif "fingering" in stale:
+            with self._timed("assembly"):
+                self._solver.set_note(self._make_fingering())
+        self._stale = set()
+
+        self._mesh_fmax = max(self._mesh_fmax, float(np.max(self.frequencies)))
+
+        with self._timed("solve"):
+            self._solver.solve()
+        self.impedance = self._solver.impedance
+        return self.frequencies, self.impedance
+
+    def iter_solve(self, n_blocks: int = 8):
+        """
+        Solves the frequency grid in ascending blocks, yielding
+        (block_frequencies, block_impedance) as each one is done.
+
+        The mesh is sized for the top of the range before the first block, so
+        the stitched blocks equal a single solve(). Block grids repeat between
+        calls, so their assembled matrices are reused after geometry edits.
+        The caller may stop iterating at any point.
+        """
+        full = self.frequencies
+        blocks = np.array_split(full, min(n_blocks, len(full)))
+        try:
+            if self._solver is None or "geometry" in self._stale or self._mesh_fmax < full.max():
+                # One-frequency solve at the top of the range builds the right mesh cheaply
+                self.set_frequencies(full[-1:])
+                self.solve()
+            for block in blocks:
+                self.set_frequencies(block)
+                _, impedance = self.solve()
+                yield block, impedance
+        finally:
+            # Leave the session describing the whole grid again
+            self.set_frequencies(full)
+
+    def _build(self):
+        self._mesh_fmax = 0.0
+        with self._timed("geometry"):
+            self._geometry = InstrumentGeometry(
+                self.clarinet.get_bore_list(), self.clarinet.get_openwind_holes()
+            )
+        with self._timed("physics"):
+            self._physics = InstrumentPhysics(
+                self._geometry, self.temperature, Player("UNITARY_FLOW"), losses=self.losses
+            )
+        with self._timed("assembly"):
+            self._solver = _IncrementalSolver(self._physics, self.frequencies, note=self._make_fingering())
+
+    def _rebuild_physics(self, new_physics: bool, reuse_pipes: bool):
+        """Refreshes the netlist from the existing geometry and reassembles the FEM."""
+        with self._timed("physics"):
+            if new_physics:
+                self._physics = InstrumentPhysics(
+                    self._geometry, self.temperature, Player("UNITARY_FLOW"), losses=self.losses
+                )
+            else:
+                self._physics.temperature = self.temperature
+                self._physics.update_netlist()
+
+        with self._timed("assembly"):
+            solver = self._solver
+            if new_physics:
+                self._solver = _IncrementalSolver(self._physics, self.frequencies, note=self._make_fingering(),
+                                                  **solver.discr_params)
+                return
+            # Same sequence OpenWind's inversion uses after a geometry change;
+            # the discretization parameters (and so the mesh density) are kept.
+            if not reuse_pipes:
+                solver.invalidate_assembly()
+            solver.frequencies = solver._check_frequencies(self.frequencies, solver.compute_method)
+            solver._update_shortestLbd(self.frequencies)
+            solver._convert_frequential_components()
+            solver._organize_components()
+            solver._construct_matrices_pipes()
+            solver.note = self._make_fingering()
+            solver._apply_note()
+            solver._construct_matrices_connectors()
+
+    def _make_fingering(self):
+        """OpenWind Fingering for the current open/closed states (None without holes)."""
+        n_holes = len(self.clarinet.holes)
+        if n_holes == 0:
+            return None
+        states = self.fingering if self.fingering is not None else [1.0] * n_holes
+        labels = [Clarinet.openwind_label(i) for i in range(n_holes)]
+        chart = FingeringChart(["session"], labels, np.array(states, dtype=float)[:, None])
+        return chart.fingering_of("session")
+
+    @contextmanager
+    def _timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            with span(stage):
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[stage] += elapsed
+            self.counts[stage] += 1
+            self.last_timings[stage] = self.last_timings.get(stage, 0.0) + elapsed
+
+    def timing_report(self) -> Dict[str, float]:
+        """Total seconds per stage, the setup/solve split and pipe reuse counters."""
+        setup = self.timings["geometry"] + self.timings["physics"] + self.timings["assembly"]
+        report = {**self.timings, "setup_total": setup, "solve_total": self.timings["solve"]}
+        if self._solver is not None:
+            report["pipes_assembled"] = self._solver.pipes_assembled
+            report["pipes_reused"] = self._solver.pipes_reused
+        return report
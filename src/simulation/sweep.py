@@ -0,0 +1,315 @@
+import itertools
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from src.models.clarinet import Clarinet
+from src.simulation.archive import ArchivedResult, ResultArchive
+from src.simulation.batch import simulate_many
+from src.simulation.physics import SimulationEngine
+
+# Parameters that are SimulationEngine settings rather than geometry
+ENGINE_PARAMETERS = ("temperature", "losses")
+
+_HOLE_FIELDS = {"position": 0, "radius": 1, "chimney": 2}
+_BORE_FIELDS = {"position": 0, "radius": 1}
+
+
+@dataclass
+class SweepPoint:
+    """
+    One design of a parameter sweep: the modified clarinet, the engine
+    settings to simulate it with, and the parameter values that produced it.
+    """
+    clarinet: Clarinet
+    overrides: Dict = field(default_factory=dict)   # SimulationEngine settings, e.g. {"temperature": 20}
+    values: Dict = field(default_factory=dict)      # Parameter name -> value
+
+
+def apply_parameters(clarinet: Clarinet, values: Dict) -> Tuple[Clarinet, Dict]:
+    """
+    Applies parameter values to a copy of clarinet.
+
+    Parameter names:
+        'temperature', 'losses'             engine settings (returned as overrides)
+        'hole.<i>.position|radius|chimney'  tone hole i (0-based, position order)
+        'bore.<i>.position|radius'          bore point i (0-based)
+        'bore.radius@<x>'                   bore radius at station x (m), within the bore;
+                                            a point is inserted there if the profile has none
+
+    Returns:
+        tuple: (Clarinet, engine overrides dict)
+
+    Raises:
+        ValueError: For unknown parameter names or indices, or stations outside the bore.
+    """
+    bore, holes = clarinet.bore_array().copy(), clarinet.holes_array().copy()
+    overrides = {}
+    for name, value in values.items():
+        if name in ENGINE_PARAMETERS:
+            overrides[name] = value
+            continue
+        if name.startswith("bore.radius@"):
+            try:
+                station = float(name.split("@", 1)[1])
+            except ValueError:
+                raise ValueError(f"Unknown sweep parameter '{name}'.")
+            # A station past either end would silently lengthen or shift the bore
+            if not len(bore) or not bore[0, 0] - 1e-9 <= station <= bore[-1, 0] + 1e-9:
+                raise ValueError(f"Sweep parameter '{name}': station outside the bore.")
+            existing = np.flatnonzero(np.isclose(bore[:, 0], station, rtol=0, atol=1e-9))
+            if len(existing):
+                bore[existing, 1] = value
+            else:
+                index = np.searchsorted(bore[:, 0], station)
+                bore = np.insert(bore, index, [station, value], axis=0)
+            continue
+        parts = name.split(".")
+        table, fields = {"hole": (holes, _HOLE_FIELDS), "bore": (bore, _BORE_FIELDS)}.get(parts[0], (None, None))
+        if table is None or len(parts) != 3 or parts[2] not in fields or not parts[1].isdigit():
+            raise ValueError(f"Unknown sweep parameter '{name}'.")
+        index = int(parts[1])
+        if index >= len(table):
+            raise ValueError(f"Sweep parameter '{name}': index out of range ({len(table)} entries).")
+        table[index, fields[parts[2]]] = value
+
+    design = Clarinet.from_arrays(
+        bore[:, 0], bore[:, 1], holes[:, 0], holes[:, 1], holes[:, 2],
+        [h.label for h in clarinet.holes], name=clarinet.name, fingerings=clarinet.fingerings,
+    )
+    return design, overrides
+
+
+def parameter_values(spec) -> List:
+    """
+    Expands one parameter's spec: a list of values, or
+    {"start": a, "stop": b, "num": n} for n evenly spaced values.
+    """
+    if isinstance(spec, dict):
+        return np.linspace(spec["start"], spec["stop"], int(spec["num"])).tolist()
+    if isinstance(spec, (list, tuple)):
+        return list(spec)
+    return [spec]
+
+
+def grid_sweep(clarinet: Clarinet, parameters: Dict) -> List[SweepPoint]:
+    """
+    Full-factorial sweep: every combination of the parameters' values,
+    applied to clarinet. Names are suffixed with the values, e.g.
+    'Prototype [hole.2.position=0.41, temperature=20]'.
+    """
+    names = list(parameters)
+    points = []
+    for combo in itertools.product(*(parameter_values(parameters[n]) for n in names)):
+        values = dict(zip(names, combo))
+        design, overrides = apply_parameters(clarinet, values)
+        label = ", ".join(f"{n}={v:g}" if isinstance(v, float) else f"{n}={v}" for n, v in values.items())
+        design.name = f"{clarinet.name} [{label}]"
+        points.append(SweepPoint(design, overrides, values))
+    return points
+
+
+def _bounds(spec) -> Tuple[float, float]:
+    """(low, high) from [low, high], {"low", "high"} or {"start", "stop"}."""
+    if isinstance(spec, dict):
+        low, high = spec.get("low", spec.get("start")), spec.get("high", spec.get("stop"))
+    else:
+        low, high = spec
+    if low is None or high is None or not high > low:
+        raise ValueError(f"Invalid parameter range: {spec}")
+    return float(low), float(high)
+
+
+def sampled_sweep(clarinet: Clarinet, parameters: Dict, n_samples: int, method: str = "lhs",
+                  seed: int = 0) -> List[SweepPoint]:
+    """
+    Space-filling sweep: n_samples points over the parameters' ranges, from
+    a Latin hypercube ('lhs') or a scrambled Sobol sequence ('sobol').
+    The seed makes the sample reproducible, so a rerun of the same sweep
+    asks for the same designs (and finds them in the cache or archive).
+
+    Args:
+        clarinet (Clarinet): Base design.
+        parameters (dict): name -> range ([low, high], {"low", "high"} or {"start", "stop"}).
+        n_samples (int): Number of designs.
+        method (str): 'lhs' or 'sobol'.
+        seed (int): Sampling seed.
+    """
+    from src.optimization.surrogate import latin_hypercube, sobol_sequence
+
+    samplers = {"lhs": latin_hypercube, "sobol": sobol_sequence}
+    if method not in samplers:
+        raise ValueError(f"Unknown sampling method '{method}' (expected one of {', '.join(samplers)}).")
+    names = list(parameters)
+    samples = samplers[method](n_samples, [_bounds(parameters[n]) for n in names], seed=seed)
+
+    points = []
+    for i, row in enumerate(samples):
+        values = dict(zip(names, row.tolist()))
+        design, overrides = apply_parameters(clarinet, values)
+        design.name = f"{clarinet.name} [{method} {i + 1}/{n_samples}]"
+        points.append(SweepPoint(design, overrides, values))
+    return points
+
+
+def sweep_points(clarinet: Clarinet, spec: Dict) -> List[SweepPoint]:
+    """
+    Expands a sweep spec (see load_sweep) for clarinet.
+    method 'grid' (default) takes values per parameter; 'lhs' and 'sobol'
+    take a range per parameter plus 'samples' and an optional 'seed'.
+    """
+    if not spec.get("parameters"):
+        raise ValueError("The sweep spec has no parameters.")
+    method = spec.get("method", "grid")
+    if method == "grid":
+        return grid_sweep(clarinet, spec["parameters"])
+    if "samples" not in spec:
+        raise ValueError(f"A '{method}' sweep needs a number of samples.")
+    return sampled_sweep(clarinet, spec["parameters"], int(spec["samples"]), method, int(spec.get("seed", 0)))
+
+
+def load_sweep(path: str) -> List[SweepPoint]:
+    """
+    Reads a sweep spec (JSON):
+
+        {"design": "prototype.json",        # optional, relative to the spec; default: standard clarinet
+         "parameters": {"hole.2.position": {"start": 0.40, "stop": 0.44, "num": 5},
+                        "temperature": [15, 25]}}
+
+    or, for a space-filling sample of ranges:
+
+        {"method": "lhs", "samples": 64, "seed": 0,      # or "sobol"
+         "parameters": {"hole.2.position": [0.40, 0.44], "bore.radius@0.3": [0.0070, 0.0080]}}
+
+    Returns:
+        list: SweepPoint per design.
+    """
+    with open(path) as f:
+        spec = json.load(f)
+    if spec.get("design"):
+        clarinet = Clarinet.load_from_file(os.path.join(os.path.dirname(path), spec["design"]))
+    else:
+        clarinet = Clarinet.default_clarinet()
+    return sweep_points(clarinet, spec)
+
+
+@dataclass
+class SweepResults:
+    """
+    Outcome of run_sweep, one entry per sweep point (in order).
+    status is 'ok', 'cached' (engine cache hit), 'archived' (already in the
+    archive, not simulated) or 'failed'.
+    """
+    points: List[SweepPoint]
+    results: List[Optional[ArchivedResult]]
+    status: List[str]
+    errors: List[str]
+    elapsed: List[float]
+
+    def __len__(self):
+        return len(self.points)
+
+    @property
+    def parameters(self) -> List[str]:
+        return list(dict.fromkeys(name for p in self.points for name in p.values))
+
+    def table(self, n_modes: int = 4):
+        """
+        Tidy results: one row per design and resonance mode, with the
+        parameter values as columns (failed designs have no rows).
+
+        Returns:
+            pandas.DataFrame: sample, name, <parameters...>, mode, frequency_hz,
+            magnitude_db, q_factor, status, key
+        """
+        import pandas as pd
+
+        rows = []
+        for i, (point, result, status) in enumerate(zip(self.points, self.results, self.status)):
+            if result is None:
+                continue
+            peaks = result.peaks
+            for m in range(min(n_modes, len(peaks))):
+                rows.append({"sample": i, "name": point.clarinet.name, **point.values, "mode": m + 1,
+                             "frequency_hz": float(peaks.frequency[m]),
+                             "magnitude_db": float(peaks.magnitude_db[m]),
+                             "q_factor": float(peaks.q_factor[m]), "status": status, "key": result.key})
+        columns = ["sample", "name", *self.parameters, "mode", "frequency_hz", "magnitude_db", "q_factor",
+                   "status", "key"]
+        return pd.DataFrame(rows, columns=columns)
+
+    def sensitivity(self, mode: int = 1) -> Dict[str, float]:
+        """
+        Linear sensitivity of a resonance to each (numeric) parameter, in
+        cents per unit of the parameter, from a least-squares fit of
+        1200*log2(f) over all successful designs.
+        """
+        names = [n for n in self.parameters
+                 if all(isinstance(p.values.get(n), (int, float)) and not isinstance(p.values.get(n), bool)
+                        for p in self.points)]
+        x, y = [], []
+        for point, result in zip(self.points, self.results):
+            if result is not None and len(result.peaks) >= mode:
+                x.append([point.values[n] for n in names])
+                y.append(1200 * np.log2(result.peaks.frequency[mode - 1]))
+        if len(y) <= len(names):
+            raise ValueError("Not enough successful designs to estimate sensitivities.")
+        x = np.asarray(x, dtype=float)
+        A = np.column_stack([np.ones(len(x)), x - x.mean(axis=0)])
+        coefficients, *_ = np.linalg.lstsq(A, np.asarray(y), rcond=None)
+        return dict(zip(names, coefficients[1:].tolist()))
+
+
+def run_sweep(points: Sequence[SweepPoint], engine: SimulationEngine, archive: ResultArchive = None, workers: int = 1,
+              force: bool = False, progress: Callable = None) -> SweepResults:
+    """
+    Simulates the designs of a sweep.
+
+    Identical designs are solved once and earlier results come from the
+    engine's cache. With an archive, every result is appended to it and
+    designs it already holds are not simulated again, so rerunning an
+    interrupted sweep only solves what is missing.
+
+    Args:
+        points (list): SweepPoint per design.
+        engine (SimulationEngine): Default settings and result cache.
+        archive (ResultArchive): Optional archive to resume from and write to.
+        workers (int): Worker processes.
+        force (bool): Re-simulate designs that are already archived.
+        progress (callable): Called as progress(done, total, message) after each design.
+
+    Returns:
+        SweepResults
+    """
+    points = list(points)
+    base_config = engine.config()
+    engines = [SimulationEngine.from_config({**base_config, **p.overrides}, cache=engine.cache) for p in points]
+    out = SweepResults(points, [None] * len(points), [""] * len(points), [""] * len(points), [0.0] * len(points))
+
+    todo = []
+    for i, (point, sim) in enumerate(zip(points, engines)):
+        archived = archive.get(sim.cache_key(point.clarinet)) if archive is not None and not force else None
+        if archived is not None:
+            out.results[i], out.status[i] = archived, "archived"
+        else:
+            todo.append(i)
+
+    done = len(points) - len(todo)
+    if progress is not None:
+        progress(done, len(points), f"{done} already archived" if done else "")
+    for res in simulate_many([(points[i].clarinet, points[i].overrides) for i in todo], workers=workers, engine=engine):
+        i = todo[res.index]
+        out.elapsed[i] = res.elapsed
+        if res.ok:
+            out.results[i] = ArchivedResult.from_simulation(engines[i], points[i].clarinet, res.frequencies,
+                                                            res.impedance)
+            out.status[i] = "cached" if res.cached else "ok"
+            if archive is not None:
+                archive.append(out.results[i])
+        else:
+            out.status[i], out.errors[i] = "failed", res.error
+        done += 1
+        if progress is not None:
+            progress(done, len(points), f"{out.status[i]:>6} {res.elapsed:6.2f}s  {points[i].clarinet.name}")
+    return out
@@ -0,0 +1,258 @@
+"""
+Analytic transfer-matrix (TMM) input impedance of a clarinet.
+
+The bore is cut into conical and cylindrical segments at every bore point
+and tone hole; each segment has a closed-form impedance transfer, and each
+tone hole is a T-joint (series + shunt impedance). Impedance is carried
+from the bell to the mouthpiece one element at a time, with every step
+vectorized over the whole frequency grid.
+
+The models mirror OpenWind's defaults so the two backends solve the same
+one-dimensional problem: 'RR' air properties, Zwikker-Kosten (Bessel)
+viscothermal losses, unflanged radiation and Dubos/Lefebvre tone-hole
+masses. TMM solves it in closed form instead of on a mesh; the remaining
+differences come from the FEM discretization and from evaluating the losses
+of a cone at its mean radius. See src.simulation.validation for a harness
+that measures them on any design.
+"""
+import hashlib
+import threading
+from dataclasses import astuple, dataclass
+from typing import Sequence
+import numpy as np
+from src.instrumentation import span
+
+# Unflanged radiation as a first-order Pade fraction in kr (OpenWind's 'unflanged')
+_RADIATION_ALPHA = 1 / 0.6133
+_RADIATION_BETA = 0.25 / 0.6133 ** 2
+
+
+@dataclass
+class AirProperties:
+    """Physical constants of air at one temperature (SI units)."""
+    rho: float     # Density
+    c: float       # Speed of sound
+    mu: float      # Dynamic viscosity
+    kappa: float   # Thermal conductivity
+    cp: float      # Specific heat at constant pressure
+    gamma: float   # Ratio of specific heats
+
+
+def air_properties(temperature: float, humidity: float = 0.5, carbon: float = 4e-4) -> AirProperties:
+    """
+    Air properties at temperature (Celsius), using the same fits as OpenWind
+    (Rasmussen / Tsilingiris corrections for humidity and CO2).
+
+    Args:
+        temperature (float): Air temperature (Celsius).
+        humidity (float): Relative humidity (0-1).
+        carbon (float): CO2 molar fraction.
+    """
+    t0 = 273.15
+    t20 = t0 + 20
+    t = temperature + t0
+    dt = t / t20 - 1
+    h = humidity * 10 ** (5.21899 - 5.8294 * t20 / t - 1.0252 * (t20 / t) ** 2)
+    dh = h - 1.1571e-2
+    dco2 = carbon - 4.2e-4
+
+    cp = 1012.25 * (1 + 0.5438 * dh + 0.638 * dh ** 2 - 0.1594 * dco2 + 0.075 * dco2 ** 2
+                    + 9.52e-3 * dt + 4.06e-2 * dt ** 2 + 0.3976 * dco2 * dt)
+    gamma = 1.40108 * (1 - 0.060 * dh - 0.104 * dco2 - 0.0087 * dt - 0.154 * dco2 * dt)
+    rho = 1.19930 * t20 / t * (1 - 0.3767 * dh + 0.4162 * dco2 - 0.00291 * dt)
+    c = 343.986 * np.sqrt(t / t20 * (1 + 0.314 * dh - 0.520 * dco2 + 0.25 * dco2 ** 2 - 0.16 * dco2 * dt))
+    mu = 1.8206e-5 * (1 + 0.77013 * dt)
+    kappa = 2.5562e-2 * (1 + 0.8490 * dt)
+    return AirProperties(rho, c, mu, kappa, cp, gamma)
+
+
+_loss_memo = {"key": None, "rows": {}}
+_loss_lock = threading.Lock()
+_LOSS_MEMO_ROWS = 4096
+
+
+def _viscothermal(radii, omega, air: AirProperties):
+    """
+    Zwikker-Kosten factors 1 / (1 - Fv) and 1 + (gamma - 1) Ft for each
+    radius, (R, F). The Bessel functions dominate a lossy solve, so rows are
+    memoized per radius for the most recent frequency grid and air: designs
+    that differ in a few dimensions (sweeps, Jacobians, optimizer steps)
+    only evaluate the radii that changed.
+    """
+    from scipy.special import jve
+
+    def bessel_ratio(z):
+        # 2 J1(z) / (z J0(z)); the exponential scaling of jve cancels
+        return 2 * jve(1, z) / (z * jve(0, z))
+
+    key = (hashlib.sha1(np.ascontiguousarray(omega).tobytes()).hexdigest(), astuple(air))
+    unique = list(dict.fromkeys(radii.tolist()))
+    with _loss_lock:
+        if _loss_memo["key"] != key or len(_loss_memo["rows"]) > _LOSS_MEMO_ROWS:
+            _loss_memo.update(key=key, rows={})
+        factors = {r: _loss_memo["rows"][r] for r in unique if r in _loss_memo["rows"]}
+
+    missing = np.array([r for r in unique if r not in factors])
+    if len(missing):
+        with span("tmm.losses", radii=len(missing)):
+            kv = missing[:, None] * np.sqrt(-1j * omega * air.rho / air.mu)
+            kt = missing[:, None] * np.sqrt(-1j * omega * air.rho * air.cp / air.kappa)
+            viscous = 1 / (1 - bessel_ratio(kv))
+            thermal = 1 + (air.gamma - 1) * bessel_ratio(kt)
+        new = {r: (viscous[i], thermal[i]) for i, r in enumerate(missing.tolist())}
+        factors.update(new)
+        with _loss_lock:
+            if _loss_memo["key"] == key:
+                _loss_memo["rows"].update(new)
+    return (np.array([factors[r][0] for r in radii.tolist()]),
+            np.array([factors[r][1] for r in radii.tolist()]))
+
+
+def _propagation(radius, omega, air: AirProperties, losses: bool):
+    """
+    Wavenumber k and characteristic impedance Zc of tubes of the given radii.
+
+    Args:
+        radius (np.ndarray): (E, 1) tube radii.
+        omega (np.ndarray): (1, F) angular frequencies.
+
+    Returns:
+        tuple: (k, zv, Zc), each (E, F); zv is the series impedance per unit
+        length times the area, so that dp/dx = -zv U / S.
+    """
+    zv = 1j * omega * air.rho + 0 * radius
+    yt = 1j * omega / (air.rho * air.c ** 2) + 0 * radius
+    if losses:
+        viscous, thermal = _viscothermal(radius[:, 0], omega, air)
+        zv = zv * viscous
+        yt = yt * thermal
+    k = -1j * np.sqrt(zv) * np.sqrt(yt)
+    zc = np.sqrt(zv) / np.sqrt(yt) / (np.pi * radius ** 2)
+    return k, zv, zc
+
+
+def _radiation(radius, k, zc):
+    """Unflanged open-end impedance of a pipe of the given radius."""
+    jkr = 1j * k * radius
+    return zc * jkr / (_RADIATION_ALPHA + _RADIATION_BETA * jkr)
+
+
+def _cylinder(z2, k, zc, length):
+    """Input impedance of a cylinder of length terminated by z2."""
+    tan = np.tan(k * length)
+    return zc * (z2 + 1j * zc * tan) / (zc + 1j * z2 * tan)
+
+
+def _cone(z2, k, zv, r1, r2, length):
+    """
+    Input impedance of a truncated cone (radius r1 at the input, r2 at the
+    output) terminated by z2. Spherical waves: p = g(x) / x with x measured
+    from the apex and g a combination of cos and sin of k (x - x1).
+    """
+    x1 = r1 * length / (r2 - r1)
+    x2 = x1 + length
+    s1, s2 = np.pi * r1 ** 2, np.pi * r2 ** 2
+    cos, sin = np.cos(k * length), np.sin(k * length)
+
+    # g and g' at the output for a unit volume flow
+    g2 = x2 * z2
+    dg2 = z2 - zv * x2 / s2
+    a = cos * g2 - sin * dg2 / k
+    b = sin * g2 + cos * dg2 / k
+
+    p1 = a / x1
+    dp1 = k * b / x1 - a / x1 ** 2
+    return p1 / (-(s1 / zv) * dp1)
+
+
+def _hole_masses(a, b, rho):
+    """
+    Series and shunt end-correction masses of a T-joint (Dubos et al. 1999,
+    Lefebvre & Scavone 2012) for a hole of radius b on a bore of radius a.
+    """
+    d = b / a
+    t_i = b * (0.82 - 0.193 * d - 1.09 * d ** 2 + 1.27 * d ** 3 - 0.71 * d ** 4)
+    t_a = b * (-0.37 + 0.087 * d) * d ** 2
+    m_shunt = rho * t_i / (np.pi * b ** 2)
+    m_series = rho * t_a / (np.pi * a ** 2)
+    return m_shunt, m_series
+
+
+def tmm_impedance(bore, holes, temperature: float, frequencies, losses: bool = True,
+                  open_holes: Sequence[bool] = None) -> np.ndarray:
+    """
+    Input impedance of a bore with tone holes by the transfer-matrix method.
+
+    Args:
+        bore (array-like): (N, 2) [position, radius] points, sorted by position.
+        holes (array-like): (M, 3) [position, radius, chimney] rows.
+        temperature (float): Air temperature (Celsius).
+        frequencies (array-like): Frequencies (Hz), all > 0.
+        losses (bool): Include viscothermal boundary-layer losses.
+        open_holes (array-like): Open (True) / closed (False) state per row of
+            holes (default: all open). A (N, M) array solves N fingerings in
+            one pass.
+
+    Returns:
+        np.ndarray: Complex input impedance at each frequency (same scaling
+        as OpenWind); (N, F) for N fingerings.
+    """
+    bore = np.asarray(bore, dtype=np.float64).reshape(-1, 2)
+    holes = np.asarray(holes, dtype=np.float64).reshape(-1, 3)
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    if len(bore) < 2:
+        raise ValueError("The bore needs at least two points.")
+    if np.any(frequencies <= 0):
+        raise ValueError("Frequencies must be positive.")
+    order = np.argsort(holes[:, 0], kind="stable")
+    holes = holes[order]
+    states = np.ones(len(holes), dtype=bool) if open_holes is None else np.asarray(open_holes, dtype=bool)
+    if states.ndim not in (1, 2) or states.shape[-1] != len(holes):
+        raise ValueError("open_holes needs one state per hole.")
+    states = states[..., order]
+    start, end = bore[0, 0], bore[-1, 0]
+    if np.any((holes[:, 0] <= start) | (holes[:, 0] >= end)):
+        raise ValueError("Tone holes must lie strictly inside the bore.")
+
+    air = air_properties(temperature)
+    omega = 2 * np.pi * frequencies[None, :]
+
+    # Segment ends: every bore point and hole position, cones in between
+    x = np.unique(np.concatenate([bore[:, 0], holes[:, 0]]))
+    r = np.interp(x, bore[:, 0], bore[:, 1])
+    length = np.diff(x)
+    r1, r2 = r[:-1], r[1:]
+    mean_radius = (r1 + r2) / 2
+    k, zv, zc = _propagation(mean_radius[:, None], omega, air, losses)
+
+    # Tone holes: chimney pipes, all at once
+    hole_segment = np.searchsorted(x, holes[:, 0]) - 1  # Segment ending at each hole
+    hb, ht = holes[:, 1:2], holes[:, 2:3]
+    ha = r2[hole_segment][:, None]
+    kh, _, zch = _propagation(hb, omega, air, losses)
+    k0h, _, zc0h = _propagation(hb, omega, air, False)
+    radiation = _radiation(hb, k0h, zc0h)
+    open_chimney = _cylinder(radiation, kh, zch, ht)
+    closed_chimney = -1j * zch / np.tan(kh * ht)
+    m_shunt, m_series = _hole_masses(ha, hb, air.rho)
+    mass = 1j * omega * (m_shunt - m_series / 4)
+    # (M, F), or (M, N, F) for N fingerings
+    batch = tuple(range(1, states.ndim))
+    z_shunt = np.where(np.moveaxis(states, -1, 0)[..., None],
+                       np.expand_dims(open_chimney + mass, batch), np.expand_dims(closed_chimney + mass, batch))
+    z_series = 1j * omega * m_series
+
+    # Bell radiation, then walk back to the input
+    k0, _, zc0 = _propagation(np.array([[r[-1]]]), omega, air, False)
+    z = _radiation(r[-1], k0[0], zc0[0])
+    for e in range(len(length) - 1, -1, -1):
+        for i in np.flatnonzero(hole_segment == e):
+            # T-joint (masses m11 = m_s + m_a/4, m12 = m_s - m_a/4): half the
+            # series mass on each side of the shunt
+            za, zs = z_series[i], z_shunt[i]
+            z = za / 2 + 1 / (1 / zs + 1 / (z + za / 2))
+        if abs(r2[e] - r1[e]) <= 1e-6 * mean_radius[e]:
+            z = _cylinder(z, k[e], zc[e], length[e])
+        else:
+            z = _cone(z, k[e], zv[e], r1[e], r2[e], length[e])
+    return np.broadcast_to(z, states.shape[:-1] + z.shape[-1:]).copy()
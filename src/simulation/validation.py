@@ -0,0 +1,94 @@
+import time
+from dataclasses import dataclass
+import numpy as np
+from src.models.clarinet import Clarinet
+from src.simulation.cache import ImpedanceCache
+from src.simulation.peaks import find_peaks, magnitude_db
+from src.simulation.physics import SimulationEngine
+
+
+@dataclass
+class BackendComparison:
+    """
+    Agreement between two solver backends on one design, e.g. the TMM
+    against the FEM reference.
+    """
+    name: str
+    reference: str                  # Backend treated as ground truth
+    candidate: str
+    reference_peaks: np.ndarray     # Lowest n_modes resonances (Hz), NaN-padded
+    candidate_peaks: np.ndarray
+    peak_error_cents: np.ndarray    # candidate vs reference, per mode
+    max_magnitude_error_db: float   # Largest |Z| difference over the grid
+    rms_magnitude_error_db: float
+    reference_time: float           # Uncached solve wall time (s)
+    candidate_time: float
+
+    @property
+    def max_peak_error_cents(self) -> float:
+        """Worst resonance error (NaN if either backend found no peaks)."""
+        errors = np.abs(self.peak_error_cents)
+        return float(np.nanmax(errors)) if np.any(np.isfinite(errors)) else np.nan
+
+    @property
+    def speedup(self) -> float:
+        return self.reference_time / self.candidate_time if self.candidate_time > 0 else np.inf
+
+    def as_row(self) -> dict:
+        """Flat summary for tables."""
+        row = {"Design": self.name}
+        for m, error in enumerate(self.peak_error_cents):
+            row[f"Mode {m + 1} error (cents)"] = error
+        row["Max |Z| error (dB)"] = self.max_magnitude_error_db
+        row[f"{self.reference.upper()} time (s)"] = self.reference_time
+        row[f"{self.candidate.upper()} time (s)"] = self.candidate_time
+        row["Speedup"] = self.speedup
+        return row
+
+
+def _lowest_peaks(frequencies, impedance, n_modes):
+    peaks = np.full(n_modes, np.nan)
+    found = find_peaks(frequencies, impedance, min_magnitude_db=-np.inf).frequency[:n_modes]
+    peaks[:len(found)] = found
+    return peaks
+
+
+def compare_backends(clarinet: Clarinet, engine: SimulationEngine = None, n_modes: int = 6,
+                     reference: str = "fem", candidate: str = "tmm") -> BackendComparison:
+    """
+    Solves clarinet with two backends on the engine's dense grid and compares
+    the resonances and impedance curves. Caches are bypassed so the timings
+    are real solves.
+
+    Args:
+        clarinet (Clarinet): The design to check.
+        engine (SimulationEngine): Frequency grid, temperature and losses (default settings if None).
+        n_modes (int): Number of lowest resonances compared.
+        reference (str): Ground-truth backend.
+        candidate (str): Backend under test.
+
+    Returns:
+        BackendComparison
+    """
+    config = (engine or SimulationEngine(cache=ImpedanceCache(max_entries=1))).config()
+    config["sweep_mode"] = "dense"
+
+    curves, times = {}, {}
+    for backend in (reference, candidate):
+        sim = SimulationEngine.from_config({**config, "backend": backend}, cache=ImpedanceCache(max_entries=1))
+        start = time.perf_counter()
+        curves[backend] = sim.run_impedance_simulation(clarinet)
+        times[backend] = time.perf_counter() - start
+
+    frequencies, z_ref = curves[reference]
+    _, z_cand = curves[candidate]
+    ref_peaks = _lowest_peaks(frequencies, z_ref, n_modes)
+    cand_peaks = _lowest_peaks(frequencies, z_cand, n_modes)
+    difference = magnitude_db(z_cand) - magnitude_db(z_ref)
+
+    return BackendComparison(
+        clarinet.name, reference, candidate, ref_peaks, cand_peaks,
+        1200 * np.log2(cand_peaks / ref_peaks),
+        float(np.max(np.abs(difference))), float(np.sqrt(np.mean(difference ** 2))),
+        times[reference], times[candidate],
+    )
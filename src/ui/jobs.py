@@ -0,0 +1,66 @@
+import os
+import uuid
+import streamlit as st
+from src.simulation.jobs import JobManager
+from src.simulation.service import ServiceBusy, SimulationService
+
+
+@st.cache_resource
+def get_simulation_service() -> SimulationService:
+    """
+    Worker pool shared by every browser session of this server process.
+    CLARINET_WORKERS sets how many jobs run at once (default 2).
+    """
+    return SimulationService(workers=int(os.environ.get("CLARINET_WORKERS", 2)))
+
+
+def get_job_manager() -> JobManager:
+    """Returns this browser session's JobManager, creating it on first use."""
+    if 'job_manager' not in st.session_state:
+        st.session_state['job_manager'] = JobManager(service=get_simulation_service(), session=uuid.uuid4().hex)
+    return st.session_state['job_manager']
+
+
+def submit_job(kind: str, fn, *args, **kwargs):
+    """
+    JobManager.submit for this session, with a warning instead of a new job
+    when the shared queue is full. Returns the Job, or None if refused.
+    """
+    try:
+        return get_job_manager().submit(kind, fn, *args, **kwargs)
+    except ServiceBusy as e:
+        st.warning(f"{e} Try again in a moment.")
+        return None
+
+
+@st.fragment(run_every=0.5)
+def render_job_progress(kind: str, label: str, unit: str, preview=None):
+    """
+    Shows a progress bar and a Cancel button while the job of kind runs.
+    Polls on its own (only this fragment reruns) and triggers a full rerun
+    once the job finishes so the page can pick up the result.
+    If given, preview(job.partial) draws the intermediate result.
+    """
+    jobs = get_job_manager()
+    job = jobs.get(kind)
+    if job is None:
+        return
+    if not job.active:
+        st.rerun()
+
+    ahead = jobs.service.queued_ahead(job) if job.status == "pending" and jobs.service is not None else None
+    if ahead is not None:
+        text = f"{label}: waiting for a free worker ({ahead} ahead)" if ahead else f"{label}: starting next"
+    elif job.total:
+        text = f"{label}: {job.done}/{job.total} {unit} ({job.elapsed:.1f}s)"
+    else:
+        text = f"{label}: {job.done} {unit} ({job.elapsed:.1f}s)"
+    st.progress(job.fraction or 0.0, text=text)
+
+    if job.cancel_requested:
+        st.caption("Cancelling...")
+    elif st.button("Cancel", key=f"cancel_{kind}_{job.id}"):
+        job.cancel()
+
+    if preview is not None and job.partial is not None:
+        preview(job.partial)
@@ -0,0 +1,79 @@
+import pandas as pd
+import streamlit as st
+from src.instrumentation import Recorder
+from src.ui.jobs import get_simulation_service
+
+
+def new_trace(kind: str) -> Recorder:
+    """Recorder for a background job, with the profilers chosen in the Performance panel."""
+    return Recorder(kind, profile=st.session_state.get('perf_profile', False),
+                    trace_memory=st.session_state.get('perf_memory', False))
+
+
+def keep_trace(job):
+    """Makes a finished job's recording the one the Performance panel shows."""
+    if job.trace is not None:
+        st.session_state['last_trace'] = job.trace
+
+
+def _breakdown_table(trace: Recorder) -> pd.DataFrame:
+    table = pd.DataFrame(trace.breakdown(), columns=["stage", "calls", "total_s", "self_s", "share"])
+    table["share"] *= 100
+    return table.rename(columns={"stage": "Stage", "calls": "Calls", "total_s": "Total (s)",
+                                 "self_s": "Self (s)", "share": "Share (%)"})
+
+
+def render_performance_panel(page: Recorder = None):
+    """
+    Time breakdown of the last background run (simulation, optimization,
+    sensitivities, sweep or playing): stages, solves, cache hits and the optional
+    cProfile / tracemalloc results, plus the chart rendering of this page
+    and the load on the workers shared by all sessions.
+    """
+    with st.expander("⏱️ Performance"):
+        c_profile, c_memory = st.columns(2)
+        c_profile.checkbox("Profile next run (cProfile)", key="perf_profile",
+                           help="Function-level profile of the next background run. Slows it down noticeably.")
+        c_memory.checkbox("Trace memory of next run", key="perf_memory",
+                          help="Peak Python allocations (tracemalloc) of the next background run.")
+
+        trace = st.session_state.get('last_trace')
+        if trace is None:
+            st.info("Run a simulation, optimization, sensitivity analysis, sweep or playing simulation "
+                    "to see its breakdown.")
+        else:
+            counters = trace.counters
+            lookups = counters.get("cache.hits", 0) + counters.get("cache.disk_hits", 0) + counters.get("cache.misses", 0)
+            st.markdown(f"#### Last run: {trace.name}")
+            cols = st.columns(4)
+            cols[0].metric("Wall time", f"{trace.duration:.2f} s")
+            cols[1].metric("Frequency solves", f"{int(counters.get('solves', 0)):,}")
+            cols[2].metric("Cache hits", f"{int(lookups - counters.get('cache.misses', 0))} / {int(lookups)}")
+            if trace.peak_memory is not None:
+                cols[3].metric("Peak memory", f"{trace.peak_memory / 2 ** 20:.1f} MB")
+            elif "optimizer.evaluations" in counters:
+                cols[3].metric("Objective evaluations", int(counters["optimizer.evaluations"]))
+            elif "temporal.steps" in counters:
+                cols[3].metric("Time steps", f"{int(counters['temporal.steps']):,}")
+
+            for note in trace.notes:
+                st.caption(note)
+            st.dataframe(_breakdown_table(trace).round(4), use_container_width=True, hide_index=True)
+            if trace.profile_stats:
+                st.markdown("##### cProfile (cumulative time)")
+                st.dataframe(pd.DataFrame(trace.profile_stats).round(4), use_container_width=True, hide_index=True)
+            st.download_button("Download timing records (JSON)", trace.to_json(indent=2),
+                               file_name=f"{trace.name}_timings.json", mime="application/json")
+
+        if page is not None and page.spans:
+            st.markdown("#### This page")
+            st.caption("Chart building and serialization during the latest rerun.")
+            # The page is still being drawn, so there is no total to take shares of
+            table = _breakdown_table(page).drop(columns="Share (%)")
+            st.dataframe(table.round(4), use_container_width=True, hide_index=True)
+
+        service = get_simulation_service().stats()
+        st.caption(f"Shared workers: {service['running']} of {service['workers']} busy, {service['queued']} jobs "
+                   f"waiting from {service['sessions_waiting']} sessions. Since start: {service['submitted']} runs, "
+                   f"{service['deduplicated']} requests joined an identical run, {service['rejected']} refused "
+                   f"while the queue was full.")
@@ -23,6 +23,10 @@ def init_session_state():
             {"pos": 0.55, "rad": 0.002, "chim": 0.005, "label": "Hole 2"}
         ]
 
+    # Fingering chart: list of {"note", "pattern"} rows for the data editor
+    if 'fingerings_config' not in st.session_state:
+        st.session_state['fingerings_config'] = []
+
     # Tracking for file upload to avoid loops
     if 'last_loaded_file' not in st.session_state:
         st.session_state['last_loaded_file'] = None
@@ -54,6 +58,12 @@ def load_design_callback():
                     })
                 st.session_state['holes_config'] = new_holes
 
+            # Update Fingering Chart
+            st.session_state['fingerings_config'] = [
+                {"note": note, "pattern": pattern}
+                for note, pattern in data.get('fingerings', {}).items()
+            ]
+
         except Exception as e:
             st.error(f"Failed to load design: {e}")
 
@@ -86,6 +96,14 @@ def render_sidebar():
         key="temp_input",
         help="Ambient temperature affects the speed of sound and pitch. Standard is 25°C."
     )
+    st.sidebar.selectbox(
+        "Solver",
+        options=["fem", "tmm"],
+        format_func={"fem": "FEM (OpenWind, reference)", "tmm": "Transfer matrix (fast)"}.get,
+        key="solver_backend",
+        help="The transfer-matrix method solves the same acoustic model analytically, "
+             "typically 10-100x faster. Use it for exploration and FEM to verify final designs."
+    )
 
     # Geometry Controls
     st.sidebar.markdown("### 📐 Bore Geometry")
@@ -145,26 +163,48 @@ def render_sidebar():
     edited_holes_sorted = sorted(edited_holes, key=lambda x: x['pos'])
     st.session_state['holes_config'] = edited_holes_sorted
 
-    # Construct Clarinet Object from State
-    clar = Clarinet(name="Custom Prototype")
+    # Fingering Chart
+    st.sidebar.markdown("### 🎼 Fingering Chart")
+    st.sidebar.caption("One character per hole in position order: 'o' open, 'x' closed.")
 
-    # Add Bore (already sorted)
-    for b in st.session_state['bore_config']:
-        clar.add_bore_point(b['position'], b['radius'])
+    edited_fingerings = st.data_editor(
+        st.session_state['fingerings_config'],
+        num_rows="dynamic",
+        column_config={
+            "note": st.column_config.TextColumn("Note", help="Note name (e.g., 'E3')."),
+            "pattern": st.column_config.TextColumn(
+                "Fingering",
+                help="e.g. 'xxo' closes the first two holes and opens the third."
+            )
+        },
+        key="fingerings_editor",
+        use_container_width=True
+    )
+    st.session_state['fingerings_config'] = edited_fingerings
+
+    # Construct Clarinet Object from State (one validation + sort pass per table)
+    bore = st.session_state['bore_config']
+    holes = st.session_state['holes_config']
+    clar = Clarinet.from_arrays(
+        [b['position'] for b in bore], [b['radius'] for b in bore],
+        [h["pos"] for h in holes], [h["rad"] for h in holes], [h["chim"] for h in holes],
+        [h.get("label", "") for h in holes],
+        name="Custom Prototype",
+    )
 
-    # Add Holes (already sorted)
-    for h in st.session_state['holes_config']:
-        clar.add_hole(h["pos"], h["rad"], h["chim"], h.get("label", ""))
+    # Add Fingerings (rows that don't match the current holes are reported, not applied)
+    for f in st.session_state['fingerings_config']:
+        if not f.get("note") or not f.get("pattern"):
+            continue
+        try:
+            clar.add_fingering(f["note"], f["pattern"])
+        except ValueError as e:
+            st.sidebar.warning(f"Fingering '{f['note']}' ignored: {e}")
 
     # Prepare download data
-    design_data = {
-        "name": clar.name,
-        "bore": clar.get_bore_list(),
-        "holes": [[h.position, h.radius, h.chimney, h.label] for h in clar.holes]
-    }
     st.sidebar.download_button(
         label="💾 Save Design (JSON)",
-        data=json.dumps(design_data, indent=4),
+        data=json.dumps(clar.to_dict(), indent=4),
         file_name="clarinet_design.json",
         mime="application/json",
         help="Export the current geometry configuration to a JSON file."
@@ -1,43 +1,94 @@
 
-import matplotlib.pyplot as plt
 import plotly.graph_objects as go
 import numpy as np
 import streamlit as st
+from src.instrumentation import span, timed
 
+# Samples sent to the browser per trace. A chart is a few hundred to ~2000
+# pixels wide, so more points than this cannot be told apart on screen.
+MAX_PLOT_POINTS = 2000
+
+def decimate_minmax(x, y, max_points=MAX_PLOT_POINTS):
+    """
+    Peak-preserving decimation for plotting.
+
+    Splits the trace into max_points // 2 buckets and keeps the minimum and
+    maximum of each (plus the end points), in their original order, so
+    resonance peaks and anti-resonance dips survive at any zoom-out.
+
+    Args:
+        x (np.ndarray): Abscissae (e.g. frequencies), ascending.
+        y (np.ndarray): Values at x.
+        max_points (int): Upper bound on the returned length.
+
+    Returns:
+        tuple: (x, y) decimated, or the inputs unchanged if already short enough.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    n = len(y)
+    if n <= max_points:
+        return x, y
+
+    size = int(np.ceil(n / (max_points // 2)))
+    n_buckets = int(np.ceil(n / size))
+    buckets = np.pad(y, (0, n_buckets * size - n), mode="edge").reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    keep = np.concatenate([offsets + buckets.argmin(axis=1), offsets + buckets.argmax(axis=1), [0, n - 1]])
+    keep = np.unique(np.minimum(keep, n - 1))
+    return x[keep], y[keep]
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _impedance_traces(frequencies, impedance, max_points=MAX_PLOT_POINTS):
+    """
+    Magnitude (dB) and phase (degrees) of one result, each decimated for
+    plotting. Cached per result so reruns do not recompute or resample them.
+    """
+    frequencies, impedance = np.asarray(frequencies), np.asarray(impedance)
+    with np.errstate(divide="ignore"):
+        mag_db = 20 * np.log10(np.abs(impedance))
+    phase_deg = np.rad2deg(np.angle(impedance))
+    return {
+        "magnitude": decimate_minmax(frequencies, mag_db, max_points),
+        "phase": decimate_minmax(frequencies, phase_deg, max_points),
+    }
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def _decimated(x, y, max_points=MAX_PLOT_POINTS):
+    return decimate_minmax(x, y, max_points)
+
+def _show(fig):
+    # Serializing the figure for the browser is timed apart from building it
+    with span("plot.render"):
+        st.plotly_chart(fig, use_container_width=True)
+
+@timed("plot.geometry")
 def plot_geometry(clarinet):
     """
     Visualizes the clarinet geometry.
     """
-    # Bore
-    bore_x = [b.position for b in clarinet.bore]
-    bore_r = [b.radius for b in clarinet.bore]
-
-    # Create symmetrical profile for plotting
-    x = []
-    y_top = []
-    y_bot = []
+    # Bore (read-only views of the model's arrays, no copy)
+    x = clarinet.bore.positions
+    y_top = clarinet.bore.radii
 
     # Ensure we have data
-    if not bore_x:
+    if not len(x):
         st.warning("No bore geometry defined.")
         return
 
-    for bx, br in zip(bore_x, bore_r):
-        x.append(bx)
-        y_top.append(br)
-        y_bot.append(-br)
+    # Create symmetrical profile for plotting
+    y_bot = -y_top
 
     fig = go.Figure()
 
     # Bore
-    fig.add_trace(go.Scatter(
+    fig.add_trace(go.Scattergl(
         x=x, y=y_top,
         mode='lines',
         name='Bore Profile',
         line=dict(color='#1E3A8A', width=2),
         fill=None
     ))
-    fig.add_trace(go.Scatter(
+    fig.add_trace(go.Scattergl(
         x=x, y=y_bot,
         mode='lines',
         name='Bore Bottom',
@@ -47,24 +98,29 @@ def plot_geometry(clarinet):
         showlegend=False
     ))
 
-    # Holes
-    for h in clarinet.holes:
-        # Draw holes as vertical lines/markers
-        # Chimney visualization: line from radius to radius + chimney
-        fig.add_trace(go.Scatter(
-            x=[h.position, h.position],
-            y=[h.radius, h.radius + h.chimney],
+    # Holes: one trace for all of them, each drawn as a segment from the bore
+    # wall to the top of its chimney, with None gaps between segments
+    holes = clarinet.holes_array()
+    if len(holes):
+        pos, rad, chim = holes[:, 0], holes[:, 1], holes[:, 2]
+        gap = np.full(len(holes), np.nan)
+        hole_x = np.column_stack([pos, pos, gap]).ravel()
+        hole_y = np.column_stack([rad, rad + chim, gap]).ravel()
+        labels = [
+            f"{h.label}<br>Pos: {h.position:.3f}m<br>Rad: {h.radius*1000:.1f}mm<br>Chim: {h.chimney*1000:.1f}mm"
+            for h in clarinet.holes
+        ]
+        fig.add_trace(go.Scattergl(
+            x=hole_x, y=hole_y,
             mode='lines+markers',
-            name=f"{h.label}",
-            text=f"Pos: {h.position:.3f}m<br>Rad: {h.radius*1000:.1f}mm<br>Chim: {h.chimney*1000:.1f}mm",
+            name='Tone Holes',
+            text=[t for label in labels for t in (label, label, None)],
             hoverinfo="text",
+            connectgaps=False,
             marker=dict(symbol='circle-open', size=8, color='#EF4444'),
             line=dict(color='#EF4444', width=3)
         ))
 
-        # Mirror hole on bottom for visual completeness?
-        # Usually tone holes are on one side, but let's keep it simple.
-
     fig.update_layout(
         title="Instrument Geometry Visualization",
         xaxis_title="Position along Axis (m)",
@@ -76,20 +132,21 @@ def plot_geometry(clarinet):
         hovermode="closest"
     )
 
-    st.plotly_chart(fig, use_container_width=True)
+    _show(fig)
 
+@timed("plot.impedance")
 def plot_impedance_interactive(frequencies, impedance, title="Input Impedance", show_phase=False, ref_freqs=None, ref_imp=None, ref_label="Reference"):
     """
-    Interactive impedance plot using Plotly.
-    Supports overlaying a reference trace.
+    Interactive impedance plot using Plotly (WebGL traces, decimated to
+    MAX_PLOT_POINTS per trace). Supports overlaying a reference trace.
     """
-    mag_db = 20 * np.log10(np.abs(impedance))
+    freq_plot, mag_db = _impedance_traces(frequencies, impedance)["magnitude"]
 
     fig = go.Figure()
 
     # Main Trace
-    fig.add_trace(go.Scatter(
-        x=frequencies, y=mag_db,
+    fig.add_trace(go.Scattergl(
+        x=freq_plot, y=mag_db,
         mode='lines',
         name='Current Design',
         line=dict(color='#2563EB', width=2)
@@ -97,9 +154,9 @@ def plot_impedance_interactive(frequencies, impedance, title="Input Impedance",
 
     # Reference Trace
     if ref_freqs is not None and ref_imp is not None:
-        ref_mag_db = 20 * np.log10(np.abs(ref_imp))
-        fig.add_trace(go.Scatter(
-            x=ref_freqs, y=ref_mag_db,
+        ref_freq_plot, ref_mag_db = _impedance_traces(ref_freqs, ref_imp)["magnitude"]
+        fig.add_trace(go.Scattergl(
+            x=ref_freq_plot, y=ref_mag_db,
             mode='lines',
             name=ref_label,
             line=dict(color='#9CA3AF', width=2, dash='dash')
@@ -114,18 +171,18 @@ def plot_impedance_interactive(frequencies, impedance, title="Input Impedance",
         height=500
     )
 
-    st.plotly_chart(fig, use_container_width=True)
+    _show(fig)
 
+@timed("plot.phase")
 def plot_phase_interactive(frequencies, impedance):
     """
     Interactive Phase plot.
     """
-    phase_rad = np.angle(impedance)
-    phase_deg = np.rad2deg(phase_rad)
+    freq_plot, phase_deg = _impedance_traces(frequencies, impedance)["phase"]
 
     fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=frequencies, y=phase_deg,
+    fig.add_trace(go.Scattergl(
+        x=freq_plot, y=phase_deg,
         mode='lines',
         name='Phase',
         line=dict(color='#10B981', width=1.5)
@@ -140,4 +197,89 @@ def plot_phase_interactive(frequencies, impedance):
         height=400
     )
 
-    st.plotly_chart(fig, use_container_width=True)
+    _show(fig)
+
+@timed("plot.comparison")
+def plot_comparison(store, names, reference=None, difference=False):
+    """
+    Plots stored designs from a ComparisonStore, overlaid or as their dB
+    difference to reference. Works on the stored curves only; nothing is
+    simulated again.
+    """
+    fig = go.Figure()
+    if difference and reference is not None:
+        names = [reference] + [n for n in names if n != reference]
+        grid, mags = store.magnitudes_on_grid(names)
+        for name, delta in zip(names[1:], mags[1:] - mags[0]):
+            x, y = _decimated(grid, delta)
+            fig.add_trace(go.Scattergl(x=x, y=y, mode='lines', name=name, line=dict(width=1.5)))
+        fig.add_hline(y=0, line=dict(color='#9CA3AF', width=1, dash='dash'))
+        yaxis_title = f"Difference to {reference} (dB)"
+    else:
+        for name in names:
+            trace = store[name]
+            x, y = _decimated(trace.frequencies, trace.magnitude_db)
+            dash = 'dash' if name == reference else None
+            fig.add_trace(go.Scattergl(x=x, y=y, mode='lines', name=name, line=dict(width=2, dash=dash)))
+        yaxis_title = "Magnitude (dB)"
+
+    fig.update_layout(
+        title="Impedance Comparison",
+        xaxis_title="Frequency (Hz)",
+        yaxis_title=yaxis_title,
+        hovermode="x unified",
+        template="plotly_white",
+        height=500
+    )
+
+    _show(fig)
+
+@timed("plot.sensitivity")
+def plot_sensitivity_heatmap(jacobian, parameter_labels=None):
+    """
+    Heatmap of a ResonanceJacobian in cents per millimetre: one row per
+    fingering and mode, one column per geometry parameter. Red raises the
+    pitch when the dimension grows, blue lowers it.
+    """
+    z = jacobian.cents * 1e-3
+    labels = parameter_labels or jacobian.parameters
+    fig = go.Figure(go.Heatmap(
+        z=z, x=labels, y=jacobian.row_labels,
+        colorscale="RdBu_r", zmid=0,
+        colorbar=dict(title="cents / mm"),
+        hovertemplate="%{y}<br>%{x}: %{z:.2f} cents/mm<extra></extra>",
+    ))
+    fig.update_layout(
+        title="Resonance Sensitivity",
+        xaxis_title="Parameter",
+        yaxis=dict(autorange="reversed"),
+        template="plotly_white",
+        height=max(300, 40 + 28 * len(jacobian.rows)),
+    )
+    _show(fig)
+
+@timed("plot.temperature")
+def plot_temperature_sweep(temperatures, resonances, reference_row, error_cents=None):
+    """
+    Resonance shift against temperature, one line per mode, in cents
+    relative to row reference_row. error_cents (one bound per row) is drawn
+    as error bars on the rescaled points.
+    """
+    temperatures = np.asarray(temperatures)
+    shifts = 1200 * np.log2(resonances / resonances[reference_row])
+    fig = go.Figure()
+    for m in range(resonances.shape[1]):
+        fig.add_trace(go.Scatter(
+            x=temperatures, y=shifts[:, m], mode="lines+markers", name=f"Mode {m + 1}",
+            error_y=dict(type="data", array=error_cents, visible=error_cents is not None and bool(np.any(error_cents))),
+            customdata=resonances[:, m],
+            hovertemplate="%{x:.1f} °C: %{customdata:.2f} Hz (%{y:+.1f} cents)<extra></extra>",
+        ))
+    fig.update_layout(
+        title="Resonances vs. Temperature",
+        xaxis_title="Temperature (°C)",
+        yaxis_title=f"Shift from {temperatures[reference_row]:.1f} °C (cents)",
+        template="plotly_white",
+        hovermode="x unified",
+    )
+    _show(fig)
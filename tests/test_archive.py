@@ -0,0 +1,49 @@
+import dataclasses
+import io
+import numpy as np
+from src.models.clarinet import Clarinet
+from src.simulation.physics import SimulationEngine
+from src.simulation.cache import ImpedanceCache
+from src.simulation.archive import ArchivedResult, ResultArchive, load_result, save_result
+
+def _result(temperature=25):
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.frequencies = np.arange(100, 1000, 10)
+    sim.temperature = temperature
+    clar = Clarinet.default_clarinet()
+    return ArchivedResult.from_simulation(sim, clar, *sim.run_impedance_simulation(clar))
+
+def test_result_file_round_trip():
+    result = _result()
+    buffer = io.BytesIO()
+    save_result(result, buffer)
+    buffer.seek(0)
+    loaded = load_result(buffer)
+
+    assert loaded.key == result.key and loaded.settings == result.settings
+    np.testing.assert_array_equal(loaded.impedance, result.impedance)
+    np.testing.assert_array_equal(loaded.peaks.frequency, result.peaks.frequency)
+    assert loaded.clarinet.fingerprint() == Clarinet.default_clarinet().fingerprint()
+
+def test_archive_append_and_memory_mapped_lookup(tmp_path):
+    warm, cold = _result(25), _result(15)
+    archive = ResultArchive(str(tmp_path))
+    assert archive.append(warm) and archive.append(cold)
+    assert not archive.append(warm)   # Duplicate key
+    assert (tmp_path / "grids.bin").stat().st_size == warm.frequencies.nbytes   # Shared grid
+
+    # Reopen: only the index is read; arrays are mapped on access
+    reopened = ResultArchive(str(tmp_path))
+    assert len(reopened) == 2
+    entry = reopened.get(cold.key)
+    assert isinstance(entry.impedance, np.memmap)
+    np.testing.assert_array_equal(entry.impedance, cold.impedance)
+    np.testing.assert_array_equal(entry.frequencies, cold.frequencies)
+    assert [r.key for r in reopened.find(warm.fingerprint)] == [warm.key, cold.key]
+
+    # A truncated final index line (interrupted append) is ignored
+    with open(tmp_path / "index.jsonl", "a") as f:
+        f.write('{"key": "partial')
+    assert len(ResultArchive(str(tmp_path))) == 2
+    assert reopened.append(dataclasses.replace(warm, key="other"))
+    assert "other" in ResultArchive(str(tmp_path))
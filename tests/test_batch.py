@@ -0,0 +1,75 @@
+import numpy as np
+from src.models.clarinet import Clarinet
+from src.simulation.physics import SimulationEngine
+from src.simulation.cache import ImpedanceCache
+from src.simulation.batch import simulate_many
+
+def _designs():
+    designs = []
+    for i, pos in enumerate([0.45, 0.48, 0.5]):
+        clar = Clarinet.default_clarinet()
+        clar.name = f"Variant {i}"
+        clar.holes[0].position = pos
+        designs.append(clar)
+    return designs
+
+def test_simulate_many_isolates_failures_and_dedupes(tmp_path):
+    sim = SimulationEngine(cache=ImpedanceCache(cache_dir=str(tmp_path)))
+    sim.frequencies = np.arange(100, 500, 10)
+
+    designs = _designs()
+    designs.append(designs[0])                 # duplicate: solved once
+    designs.append(Clarinet(name="Empty"))     # no bore: must fail on its own
+
+    run = simulate_many(designs, workers=2, engine=sim)
+    results = sorted(run, key=lambda r: r.index)
+
+    assert run.completed == 5
+    assert run.failed == 1
+    assert not results[4].ok and results[4].name == "Empty"
+    assert all(r.ok for r in results[:4])
+    assert np.array_equal(results[0].impedance, results[3].impedance)
+    assert run.throughput > 0
+
+    # Workers populated the shared disk tier, so a second run is all cache hits
+    rerun = list(simulate_many(_designs(), workers=1, engine=sim))
+    assert all(r.cached for r in rerun)
+
+def test_simulate_many_matches_single_run():
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.frequencies = np.arange(100, 500, 10)
+    clar = _designs()[1]
+
+    [result] = list(simulate_many([(clar, {"temperature": 30})], workers=1, engine=sim))
+
+    single = SimulationEngine(cache=ImpedanceCache())
+    single.frequencies = sim.frequencies
+    single.temperature = 30
+    _, imp = single.run_impedance_simulation(clar)
+    assert np.allclose(result.impedance, imp)
+
+def test_adaptive_overrides_do_not_replace_dense_results():
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.backend = "tmm"
+    sim.frequencies = np.arange(100, 600, 2)
+    clar = Clarinet.default_clarinet()
+
+    adaptive = list(simulate_many([(clar, {"sweep_mode": "adaptive"})], workers=1, engine=sim))[0]
+    assert adaptive.ok and len(adaptive.frequencies) < len(sim.frequencies)
+    freqs, _ = sim.run_impedance_simulation(clar)
+    assert np.array_equal(freqs, sim.frequencies)
+    # The adaptive result is found again under its own key
+    assert list(simulate_many([(clar, {"sweep_mode": "adaptive"})], workers=1, engine=sim))[0].cached
+
+def test_in_process_run_writes_disk_once(tmp_path, monkeypatch):
+    writes = []
+    savez = np.savez
+    monkeypatch.setattr(np, "savez", lambda *a, **kw: (writes.append(a[0]), savez(*a, **kw)))
+    sim = SimulationEngine(cache=ImpedanceCache(cache_dir=str(tmp_path)))
+    sim.frequencies = np.arange(100, 500, 10)
+
+    [result] = list(simulate_many(_designs()[:1], workers=1, engine=sim))
+
+    assert result.ok and len(writes) == 1
+    freqs, _ = sim.run_impedance_simulation(_designs()[0])
+    assert sim.cache.hits == 1 and np.array_equal(freqs, result.frequencies)
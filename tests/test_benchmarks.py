@@ -0,0 +1,40 @@
+from benchmarks.suite import compare, load_baseline, main, measure, save_baseline, select, workloads
+
+def test_workload_selection():
+    items = workloads()
+    names = [w.name for w in items]
+    assert len(names) == len(set(names))
+    # The FEM on the 2000-point bore takes minutes and is opt-in
+    assert "simulate/digitized-2000/dense/fem" not in [w.name for w in select(items)]
+    assert "simulate/digitized-2000/dense/fem" in [w.name for w in select(items, include_slow=True)]
+    assert [w.name for w in select(items, ["simulate/default/*/tmm"])] == [
+        "simulate/default/dense/tmm", "simulate/default/coarse/tmm"]
+
+def test_measure_save_and_compare(tmp_path):
+    chosen = select(workloads(), ["simulate/default/coarse/tmm", "model/20-holes/*"])
+    results = [measure(w, repeat=2) for w in chosen]
+    solve = results[0]
+    assert solve.work == 248 and solve.unit == "solves" and solve.rate > 0
+    assert solve.best <= solve.median and solve.peak_memory > 0
+
+    path = tmp_path / "baseline.json"
+    save_baseline(results, str(path))
+    baseline = load_baseline(str(path))
+    assert baseline[solve.name] == solve
+
+    rows = compare(results, baseline)
+    assert [row["ratio"] for row in rows] == [1.0, 1.0] and not any(row["regressed"] for row in rows)
+    # Twice as slow per unit of work counts as a regression
+    baseline[solve.name].best /= 2
+    assert compare(results, baseline)[0]["regressed"]
+
+    # The CLI exit code follows the comparison: 0 against a slower baseline, 1 against a faster one
+    saved = tmp_path / "saved.json"
+    assert main(["--only", "model/20-holes/*", "--repeat", "1", "--save", str(saved)]) == 0
+    for factor, expected in ((10.0, 0), (0.01, 1)):
+        scaled = load_baseline(str(saved))
+        for result in scaled.values():
+            result.best *= factor
+        save_baseline(list(scaled.values()), str(path))
+        assert main(["--only", "model/20-holes/*", "--repeat", "1", "--compare", str(path)]) == expected
+    assert main(["--list", "--all"]) == 0
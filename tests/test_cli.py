@@ -0,0 +1,50 @@
+import csv
+import json
+import pytest
+from src.cli import main
+from src.models.clarinet import Clarinet
+from src.simulation.archive import ResultArchive
+from src.simulation.sweep import apply_parameters
+
+GRID = ["--fmin", "100", "--fmax", "600", "--step", "10", "--quiet"]
+
+def _summary(path):
+    with open(path) as f:
+        return list(csv.DictReader(f))
+
+def test_cli_simulate_designs(tmp_path):
+    design = tmp_path / "design.json"
+    Clarinet.default_clarinet().save_to_file(str(design))
+    out = tmp_path / "results"
+
+    assert main(["simulate", str(design), "--out", str(out)] + GRID) == 0
+    rows = _summary(out / "summary.csv")
+    assert [r["status"] for r in rows] == ["ok"] and float(rows[0]["mode1_hz"]) > 100
+    assert rows[0]["key"] in ResultArchive(str(out))
+
+    # Already archived with the same settings: not simulated again
+    assert main(["simulate", str(design), "--out", str(out)] + GRID) == 0
+    assert [r["status"] for r in _summary(out / "summary.csv")] == ["archived"]
+
+def test_cli_sweep(tmp_path):
+    Clarinet.default_clarinet().save_to_file(str(tmp_path / "base.json"))
+    spec = {"design": "base.json",
+            "parameters": {"hole.0.position": {"start": 0.48, "stop": 0.52, "num": 2}, "temperature": [15, 25]}}
+    (tmp_path / "sweep.json").write_text(json.dumps(spec))
+    out = tmp_path / "results"
+
+    assert main(["sweep", str(tmp_path / "sweep.json"), "--out", str(out)] + GRID) == 0
+    rows = _summary(out / "summary.csv")
+    assert len(rows) == 4 and len(ResultArchive(str(out))) == 4
+    # Moving the first hole towards the mouthpiece raises the fundamental; warmer air raises it too
+    f1 = {(float(r["hole.0.position"]), float(r["temperature"])): float(r["mode1_hz"]) for r in rows}
+    assert f1[(0.48, 25)] > f1[(0.52, 25)] and f1[(0.48, 25)] > f1[(0.48, 15)]
+
+def test_apply_parameters_rejects_unknown_names():
+    clar = Clarinet.default_clarinet()
+    design, overrides = apply_parameters(clar, {"hole.1.radius": 0.004, "temperature": 30})
+    assert design.holes[1].radius == 0.004 and overrides == {"temperature": 30}
+    assert clar.holes[1].radius != 0.004
+    for name in ("hole.9.radius", "hole.0.width", "reed.0.position"):
+        with pytest.raises(ValueError):
+            apply_parameters(clar, {name: 0.01})
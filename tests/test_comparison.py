@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from src.models.clarinet import Clarinet
+from src.simulation.physics import SimulationEngine
+from src.simulation.cache import ImpedanceCache
+from src.simulation.comparison import ComparisonStore
+
+def _solve(sim, clar):
+    freqs, imp = sim.run_impedance_simulation(clar)
+    return sim.cache_key(clar), freqs, imp, sim.analyze_peaks(freqs, imp)
+
+def test_comparison_store_metrics():
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.frequencies = np.arange(100, 1600, 4)
+    base = Clarinet.default_clarinet()
+    longer = Clarinet.from_arrays(base.bore.positions * 1.05, base.bore.radii,
+                                  [h.position * 1.05 for h in base.holes],
+                                  [h.radius for h in base.holes], [h.chimney for h in base.holes])
+
+    store = ComparisonStore()
+    key, freqs, imp, peaks = _solve(sim, base)
+    store.add("base", key, freqs, imp, peaks)
+    assert store.add("again", key, freqs, imp, peaks).name == "base"   # Deduplicated by key
+    store.add("longer", *_solve(sim, longer))
+    with pytest.raises(ValueError):
+        store.add("base", "other-key", freqs, imp, peaks)
+
+    assert len(store) == 2 and store["base"].frequencies is store["longer"].frequencies
+    assert store.nbytes < freqs.nbytes + imp.nbytes   # Two designs in less than one full-precision result
+    np.testing.assert_allclose(store["base"].impedance, imp, rtol=1e-5)
+
+    metrics = store.pairwise_metrics(n_modes=3)
+    # A longer instrument resonates lower: about -1200*log2(1.05) = -84 cents
+    shift = metrics.peak_shift_cents[0, 1]
+    assert np.all((shift < -60) & (shift > -110))
+    np.testing.assert_allclose(metrics.peak_shift_cents[1, 0], -shift)
+    assert np.all(np.diag(metrics.rms_db) < 1e-6) and metrics.rms_db[0, 1] > 1
+    np.testing.assert_allclose(metrics.rms_db, metrics.rms_db.T)
+    assert metrics.against("base")[1]["Design"] == "longer"
+
+    store.remove("base")
+    store.remove("longer")
+    assert store.nbytes == 0
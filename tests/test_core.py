@@ -1,7 +1,14 @@
+import copy
 import pytest
 import numpy as np
+from dataclasses import FrozenInstanceError
+from openwind import InstrumentGeometry
 from src.models.clarinet import Clarinet
+from src.models.diff import diff_designs
 from src.simulation.physics import SimulationEngine
+from src.simulation import cache as cache_module
+from src.simulation.cache import ImpedanceCache
+from src.simulation.peaks import find_peaks
 
 def test_clarinet_creation():
     clar = Clarinet.default_clarinet()
@@ -9,6 +16,52 @@ def test_clarinet_creation():
     assert len(clar.holes) == 2
     assert clar.bore[0].radius == 0.0075
 
+def test_from_arrays_matches_incremental_build():
+    rng = np.random.default_rng(0)
+    x = rng.permutation(np.linspace(0, 0.6, 2000))
+    r = 0.007 + 0.001 * x
+    bulk = Clarinet.from_arrays(x, r, [0.55, 0.5], [0.002, 0.003], [0.005, 0.004], ["B", "A"],
+                                fingerings={"low": "xx"})
+
+    step = Clarinet()
+    for xi, ri in zip(x, r):
+        step.add_bore_point(xi, ri)
+    step.add_hole(0.55, 0.002, 0.005, "B")
+    step.add_hole(0.5, 0.003, 0.004, "A")
+
+    assert bulk.bore == step.bore
+    assert np.all(np.diff(bulk.bore.positions) >= 0)
+    assert [h.label for h in bulk.holes] == ["A", "B"]
+    assert bulk.get_holes_list() == step.get_holes_list()
+    # Views share the model's memory and cannot be written through
+    assert np.shares_memory(bulk.bore_array(), bulk.bore.radii)
+    with pytest.raises(ValueError):
+        bulk.bore_array()[0, 1] = 1.0
+    assert Clarinet.from_dict(bulk.to_dict()).bore == bulk.bore
+
+    # Points are snapshots: edits go through a new profile
+    with pytest.raises(FrozenInstanceError):
+        bulk.bore[0].radius = 0.001
+    bulk.bore = bulk.bore.replace(0, radius=0.001)
+    assert bulk.bore[0].radius == 0.001 and step.bore[0].radius != 0.001
+    moved = bulk.bore.replace(0, position=0.7)
+    assert moved[-1].position == 0.7 and np.all(np.diff(moved.positions) >= 0)
+
+    with pytest.raises(ValueError):
+        Clarinet.from_arrays([0, 0.6], [0.0075, -1])
+
+def test_openwind_reads_hole_radius_and_chimney(monkeypatch):
+    clar = Clarinet.default_clarinet()
+    clar.holes[0].radius, clar.holes[0].chimney = 0.003, 0.008
+    hole = InstrumentGeometry(clar.get_bore_list(), clar.get_openwind_holes()).holes[0]
+    assert hole.shape.get_radius_at(0) == pytest.approx(0.003)
+    assert hole.shape.get_length() == pytest.approx(0.008)
+
+    # Results computed with the two swapped are keyed under an older version
+    key = ImpedanceCache.make_key(clar.bore_array(), clar.holes_array(), 25, True, [100.0])
+    monkeypatch.setattr(cache_module, "KEY_VERSION", 1)
+    assert ImpedanceCache.make_key(clar.bore_array(), clar.holes_array(), 25, True, [100.0]) != key
+
 def test_simulation_run():
     clar = Clarinet.default_clarinet()
     sim = SimulationEngine()
@@ -33,3 +86,119 @@ def test_peak_detection():
     peaks = sim.detect_peaks(freqs, impedance)
     assert len(peaks) == 1
     assert peaks[0][0] == 300
+
+def test_cache_keys_on_temperature_and_frequencies():
+    clar = Clarinet.default_clarinet()
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.frequencies = np.arange(100, 500, 10)
+
+    _, imp_25 = sim.run_impedance_simulation(clar)
+    sim.temperature = 35
+    _, imp_35 = sim.run_impedance_simulation(clar)
+    assert not np.allclose(imp_25, imp_35)
+
+    sim.frequencies = np.arange(100, 500, 20)
+    freqs, _ = sim.run_impedance_simulation(clar)
+    assert len(freqs) == 20
+    assert sim.cache.stats()["misses"] == 3
+
+    # Same settings again is served from memory
+    sim.run_impedance_simulation(clar)
+    assert sim.cache.stats()["hits"] == 1
+
+def test_cache_disk_tier(tmp_path):
+    clar = Clarinet.default_clarinet()
+    sim = SimulationEngine(cache=ImpedanceCache(max_entries=1, cache_dir=str(tmp_path)))
+    sim.frequencies = np.arange(100, 500, 10)
+    _, imp = sim.run_impedance_simulation(clar)
+
+    # A fresh cache on the same directory (e.g. after a restart) hits on disk
+    fresh = ImpedanceCache(cache_dir=str(tmp_path))
+    freqs, cached_imp = fresh.get(sim.cache_key(clar))
+    assert np.array_equal(cached_imp, imp)
+    assert fresh.stats()["disk_hits"] == 1
+    assert not cached_imp.flags.writeable
+
+def test_adaptive_sweep_refines_peaks():
+    clar = Clarinet.default_clarinet()
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.frequencies = np.arange(100, 600, 2)
+
+    result = sim.run_adaptive_simulation(clar, coarse_step=20.0, tolerance=0.5)
+    assert result.n_solves < len(sim.frequencies)
+    assert np.all(np.diff(result.frequencies) > 0)
+
+    # Compare the first resonance against a very fine dense sweep around it
+    first = result.peak_frequencies[0]
+    sim.frequencies = np.linspace(first - 2, first + 2, 401)
+    freqs, imp = sim.run_impedance_simulation(clar)
+    reference = freqs[np.argmax(np.abs(imp))]
+    cents = 1200 * abs(np.log2(first / reference))
+    assert cents < 1.0
+
+def test_adaptive_mode_handles_single_frequency():
+    clar = Clarinet.default_clarinet()
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.backend = "tmm"
+    sim.sweep_mode = "adaptive"
+    sim.frequencies = np.array([200.0])
+
+    assert sim.cache_key(clar)
+    freqs, imp = sim.run_impedance_simulation(clar)
+    assert np.array_equal(freqs, [200.0]) and imp.shape == (1,)
+
+def test_peak_analysis_subbin_and_q():
+    freqs = np.arange(100.0, 600.0, 2.0)
+    # Two Lorentzian resonances (|Z| in linear units), stacked as a batch
+    def resonance(f0, q):
+        return 100.0 / np.sqrt(1 + (2 * q * (freqs - f0) / f0) ** 2)
+    batch = np.vstack([resonance(301.3, 20.0), resonance(450.7, 40.0)])
+
+    table = find_peaks(freqs, batch)
+    assert list(table.row) == [0, 1]
+    assert abs(table.frequency[0] - 301.3) < 0.1
+    assert abs(table.frequency[1] - 450.7) < 0.1
+    assert abs(table.q_factor[0] - 20.0) / 20.0 < 0.05
+    assert abs(table.q_factor[1] - 40.0) / 40.0 < 0.05
+
+    sim = SimulationEngine()
+    per_design = sim.detect_peaks(freqs, batch)
+    assert len(per_design) == 2 and len(per_design[0]) == 1
+
+def test_parallel_chunked_solve_matches_serial():
+    clar = Clarinet.default_clarinet()
+    serial = SimulationEngine(cache=ImpedanceCache())
+    serial.frequencies = np.arange(100, 500, 10)
+    _, imp_serial = serial.run_impedance_simulation(clar)
+
+    parallel = SimulationEngine(cache=ImpedanceCache())
+    parallel.frequencies = serial.frequencies
+    parallel.workers = 2
+    freqs, imp_parallel = parallel.run_impedance_simulation(clar)
+
+    assert np.array_equal(freqs, serial.frequencies)
+    assert np.allclose(imp_parallel, imp_serial)
+
+def test_design_fingerprint_and_diff():
+    clar = Clarinet.default_clarinet()
+    clar.add_fingering("low", "xx")
+
+    relabelled = copy.deepcopy(clar)
+    relabelled.holes[0].label = "Renamed"
+    relabelled.name = "Other"
+    diff = diff_designs(clar, relabelled, 25, 25)
+    assert diff.is_noop and diff.holes_relabelled == [0]
+    assert relabelled.fingerprint() == clar.fingerprint()
+
+    edited = copy.deepcopy(clar)
+    edited.holes[1].position = 0.56
+    edited.holes[0].chimney = 0.006
+    edited.add_fingering("mid", "xo")
+    diff = diff_designs(clar, edited, 25, 30)
+    assert diff.holes_moved == [1] and diff.holes_resized == [0]
+    assert diff.fingerings_added == ["mid"] and diff.temperature_changed
+    assert diff.physics_changed and not diff.bore_changed
+    assert edited.fingerprint() != clar.fingerprint()
+
+    edited.add_bore_point(0.3, 0.0075)
+    assert diff_designs(clar, edited).bore_changed
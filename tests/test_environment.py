@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from src.models.clarinet import Clarinet
+from src.simulation.cache import ImpedanceCache
+from src.simulation.environment import rescale_impedance, temperature_sweep
+from src.simulation.physics import SimulationEngine
+
+def _engine(backend, frequencies, losses=True):
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.backend = backend
+    sim.frequencies = frequencies
+    sim.losses = losses
+    return sim
+
+def _solve(sim, clarinet, temperature):
+    sim.temperature = temperature
+    return sim.run_impedance_simulation(clarinet)[1]
+
+def test_rescaling_is_exact_without_losses():
+    clar = Clarinet.default_clarinet()
+    sim = _engine("tmm", np.arange(100, 900, 0.5), losses=False)
+    wide = np.arange(95, 920, 0.25)
+    reference = _engine("tmm", wide, losses=False)
+    predicted = rescale_impedance(wide, _solve(reference, clar, 25), 25, 15, sim.frequencies)
+    exact = _solve(sim, clar, 15)
+    ratio = sim.analyze_peaks(sim.frequencies, predicted).frequency / sim.analyze_peaks(sim.frequencies, exact).frequency
+    assert np.all(np.abs(1200 * np.log2(ratio)) < 0.05)
+
+    with pytest.raises(ValueError):
+        rescale_impedance(sim.frequencies, exact, 25, 15)  # Colder air needs the reference above 900 Hz
+
+def test_rescaled_sweep_stays_within_its_error_bound():
+    clar = Clarinet.default_clarinet()
+    temperatures = np.arange(15, 35.1, 2.5)
+    sim = _engine("tmm", np.arange(50, 1000, 0.5))
+    exact = temperature_sweep(sim, clar, temperatures)
+    rescaled = temperature_sweep(sim, clar, temperatures, method="rescaled")
+    assert exact.method == "exact" and exact.solves == len(temperatures)
+    assert rescaled.method == "rescaled" and rescaled.solves == 3 and rescaled.reference == 25
+    assert rescaled.exact.tolist() == [t in (15, 25, 35) for t in temperatures]
+
+    cents = np.abs(1200 * np.log2(rescaled.resonances(sim) / exact.resonances(sim))).max(axis=1)
+    db = np.abs(20 * np.log10(np.abs(rescaled.impedance) / np.abs(exact.impedance))).max(axis=1)
+    assert np.all(cents <= rescaled.error_cents + 0.02) and np.all(db <= rescaled.error_db + 0.01)
+    # Losses make the error grow away from the reference, but it stays below a cent here
+    assert 0 < rescaled.error_cents.max() < 1 and rescaled.error_cents[0] == rescaled.error_cents[-1] == 0
+    assert np.allclose(rescaled.at(25)[1], exact.at(25)[1])
+
+    with pytest.raises(ValueError):
+        temperature_sweep(sim, clar, temperatures, method="similar")
+
+def test_exact_fem_sweep_reuses_one_session():
+    clar = Clarinet.default_clarinet()
+    frequencies = np.arange(100, 600, 10)
+    sim = _engine("fem", frequencies)
+    session = sim.open_session(clar)
+    done = []
+    sweep = temperature_sweep(sim, clar, [15, 25, 25, 35], session=session, progress=lambda i, n: done.append((i, n)))
+    assert sweep.solves == 3 and done[-1] == (3, 3) and sim.solve_count == 3 * len(frequencies)
+    assert session.counts["geometry"] == 1
+    for temperature in (15, 35):
+        independent = _solve(_engine("fem", frequencies), clar, temperature)
+        assert np.allclose(sweep.at(temperature)[1], independent, rtol=1e-8)
@@ -0,0 +1,105 @@
+import json
+import threading
+import time
+import numpy as np
+import pytest
+from src import instrumentation
+from src.instrumentation import Recorder, count, recording, span, timed
+from src.models.clarinet import Clarinet
+from src.optimization.optimizer import Optimizer
+from src.simulation.cache import ImpedanceCache
+from src.simulation.jobs import JobManager
+from src.simulation.physics import SimulationEngine
+
+def _engine(backend):
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.frequencies = np.arange(100, 600, 5)
+    sim.backend = backend
+    return sim
+
+def test_spans_counters_and_breakdown():
+    @timed("outer")
+    def work():
+        with span("inner", size=3):
+            time.sleep(0.01)
+        count("items", 2)
+
+    # Nothing is recorded (or kept) without an active recorder
+    work()
+    assert instrumentation.current() is None
+
+    with recording(name="test") as rec:
+        work()
+        work()
+    assert [s.name for s in rec.spans] == ["outer", "inner", "outer", "inner"]
+    assert rec.spans[1].parent == 0 and rec.spans[1].depth == 1 and rec.spans[1].attributes == {"size": 3}
+    assert rec.counters == {"items": 4}
+
+    rows = {row["stage"]: row for row in rec.breakdown()}
+    assert rows["inner"]["calls"] == 2 and rows["inner"]["total_s"] >= 0.02
+    assert rows["outer"]["self_s"] == pytest.approx(rows["outer"]["total_s"] - rows["inner"]["total_s"])
+    assert sum(row["share"] for row in rows.values()) <= 1.0
+    assert json.loads(rec.to_json())["counters"] == {"items": 4}
+
+def test_simulation_stages_and_cache_counters():
+    clar = Clarinet.default_clarinet()
+    sim = _engine("fem")
+    with recording(name="fem") as rec:
+        f, z = sim.run_impedance_simulation(clar)
+        sim.run_impedance_simulation(clar)
+        sim.detect_peaks(f, z)
+    stages = {row["stage"] for row in rec.breakdown()}
+    assert {"simulate", "geometry", "physics", "assembly", "solve", "peaks"} <= stages
+    assert rec.counters["solves"] == len(sim.frequencies) == sim.solve_count
+    assert rec.counters["cache.misses"] == 1 and rec.counters["cache.hits"] == 1
+
+    sim = _engine("tmm")
+    sim.frequencies = np.arange(100, 600, 2)
+    with recording(name="optimizer", profile=True, trace_memory=True) as rec:
+        Optimizer(clar, sim).tune_hole_position(170, 0, search_range=0.05)
+    assert rec.counters["optimizer.evaluations"] == rec.counters["cache.misses"]
+    assert rec.counters["solves"] == sim.solve_count
+    assert any(s.name == "solve" and s.parent is not None for s in rec.spans)
+    assert rec.peak_memory > 0 and rec.profile_stats and "tune_hole_position" in rec.profile_text
+
+def test_jobs_record_their_own_thread():
+    clar = Clarinet.default_clarinet()
+    sim = _engine("tmm")
+    manager = JobManager()
+    job = manager.submit("simulation", lambda job: sim.run_impedance_simulation(clar), trace=Recorder("simulation"))
+    while job.active:
+        time.sleep(0.01)
+    assert job.status == "done"
+    assert [s.name for s in job.trace.spans][:2] == ["simulate", "solve"]
+    assert job.trace.counters["solves"] == len(sim.frequencies)
+    # The submitting thread was not recording
+    assert instrumentation.current() is None
+
+def test_overlapping_profiled_recordings_share_the_profiler():
+    first_started, second_done = threading.Event(), threading.Event()
+    recorders = [Recorder("first", profile=True, trace_memory=True), Recorder("second", profile=True, trace_memory=True)]
+
+    def first():
+        with recording(recorders[0]):
+            first_started.set()
+            second_done.wait(5)
+
+    def second():
+        first_started.wait(5)
+        with recording(recorders[1]):
+            sum(range(1000))
+        second_done.set()
+
+    threads = [threading.Thread(target=first), threading.Thread(target=second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert recorders[0].profile_stats and recorders[0].peak_memory is not None and not recorders[0].notes
+    assert not recorders[1].profile_stats and recorders[1].peak_memory is None
+    assert "skipped" in recorders[1].to_dict()["notes"][0]
+    # Released: the next recording profiles again
+    with recording(Recorder(profile=True)) as rec:
+        sum(range(1000))
+    assert rec.profile_stats
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from src.models.clarinet import Clarinet
+from src.optimization.optimizer import Optimizer
+from src.simulation.cache import ImpedanceCache
+from src.simulation.jacobian import geometry_parameters, resonance_jacobian
+from src.simulation.physics import SimulationEngine
+from src.simulation.sweep import apply_parameters
+from src.simulation.tmm import tmm_impedance
+
+def _engine(backend):
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.frequencies = np.arange(50, 1000, 2)
+    sim.backend = backend
+    return sim
+
+def _design():
+    clar = Clarinet.default_clarinet()
+    clar.add_fingering("low", "xx")
+    clar.add_fingering("open", "oo")
+    return clar
+
+def test_jacobian_matches_dense_differences():
+    clar = _design()
+    jac = resonance_jacobian(_engine("tmm"), clar, notes=["open"], n_modes=2)
+    assert jac.parameters == geometry_parameters(clar)
+    assert jac.hz.shape == (2, len(jac.parameters)) and not np.any(np.isnan(jac.hz))
+
+    def first_peak(design):
+        # Very fine grid around the fundamental
+        f = np.arange(150, 160, 0.001)
+        mag = np.abs(tmm_impedance(design.bore_array(), design.holes_array(), 25, f))
+        i = np.argmax(mag)
+        a, b, c = np.log(mag[i - 1:i + 2])
+        return f[i] + 0.0005 * (a - c) / (a - 2 * b + c)
+
+    for name, value, h in [("hole.0.position", clar.holes[0].position, 1e-4), ("bore.1.radius", clar.bore[1].radius, 1e-5)]:
+        plus = first_peak(apply_parameters(clar, {name: value + h})[0])
+        minus = first_peak(apply_parameters(clar, {name: value - h})[0])
+        expected = (plus - minus) / (2 * h)
+        assert jac.hz[0, jac.parameters.index(name)] == pytest.approx(expected, rel=0.01)
+
+def test_fem_and_tmm_jacobians_agree():
+    clar = _design()
+    holes = geometry_parameters(clar, bore_radii=False)
+    fem = resonance_jacobian(_engine("fem"), clar, n_modes=2, parameters=holes)
+    tmm = resonance_jacobian(_engine("tmm"), clar, n_modes=2, parameters=holes)
+    assert fem.rows == tmm.rows == [("low", 0), ("low", 1), ("open", 0), ("open", 1)]
+    assert np.allclose(fem.frequencies, tmm.frequencies, rtol=1e-4)
+    assert np.allclose(fem.cents, tmm.cents, rtol=0.02, atol=1.0)
+    # Moving the first open hole down the bore lowers the pitch
+    assert tmm.column("hole.0.position")[2] < 0
+
+    with pytest.raises(ValueError):
+        resonance_jacobian(_engine("tmm"), clar, parameters=["temperature"])
+
+def test_tune_scale_with_jacobian():
+    targets = [(None, 158.0), ("low", 143.0)]
+    results = []
+    for jacobian in (False, True):
+        sim = _engine("tmm")
+        sim.frequencies = np.arange(50, 600, 2)
+        results.append(Optimizer(_design(), sim).tune_scale(targets, max_evaluations=15, jacobian=jacobian))
+    assert results[1]["rms_cents"] == pytest.approx(results[0]["rms_cents"], abs=0.5)
+
+def test_tracked_resonances_are_numbered_per_fingering():
+    clar = _design()
+    jac = resonance_jacobian(_engine("tmm"), clar, parameters=["hole.0.position"],
+                             resonances=[("low", 141.0), ("open", 155.0), ("low", 420.0), ("open", 460.0)])
+    assert jac.rows == [("low", 0), ("open", 0), ("low", 1), ("open", 1)]
+    assert jac.row_labels[2] == "low · mode 2"
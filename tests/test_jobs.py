@@ -0,0 +1,62 @@
+import time
+import numpy as np
+from src.models.clarinet import Clarinet
+from src.simulation.cache import ImpedanceCache
+from src.simulation.jobs import JobManager
+from src.simulation.physics import SimulationEngine
+
+
+def wait(job, timeout=60):
+    start = time.time()
+    while job.active and time.time() - start < timeout:
+        time.sleep(0.05)
+    return job
+
+
+def test_simulation_job_progress_matches_direct_solve():
+    clar = Clarinet.default_clarinet()
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.frequencies = np.arange(100, 600, 10)
+    reports = []
+
+    def work(job):
+        def progress(done, total):
+            reports.append(done)
+            job.report(done, total)
+        return sim.run_impedance_simulation(clar, progress=progress)
+
+    manager = JobManager()
+    job = wait(manager.submit("simulation", work, fingerprint="a"))
+    assert job.status == "done" and job.fraction == 1.0
+    assert reports == sorted(reports) and reports[-1] == len(sim.frequencies)
+
+    reference = SimulationEngine(cache=ImpedanceCache())
+    reference.frequencies = sim.frequencies
+    _, imp = reference.run_impedance_simulation(clar)
+    np.testing.assert_allclose(job.result[1], imp, rtol=1e-10)
+
+
+def test_cancel_and_drop_stale():
+    manager = JobManager()
+
+    def forever(job):
+        for i in range(10_000):
+            job.report(i)
+            time.sleep(0.01)
+
+    job = manager.submit("optimization", forever, fingerprint="old")
+    while job.status != "running":
+        time.sleep(0.01)
+    assert manager.drop_stale("new") == [job]
+    assert manager.get("optimization") is None
+    assert wait(job).status == "cancelled"
+    # Jobs fingerprinted on other settings are only checked against their own
+    kept = manager.submit("temperature", lambda job: 1, fingerprint="without-temperature")
+    assert manager.drop_stale("new", kinds=["optimization"]) == [] and manager.get("temperature") is kept
+
+    # A new job of the same kind supersedes the previous one
+    first = manager.submit("optimization", forever)
+    second = manager.submit("optimization", lambda job: 42)
+    assert wait(first).status == "cancelled"
+    assert wait(second).result == 42
+    manager.shutdown()
@@ -2,6 +2,8 @@
 import pytest
 from src.models.clarinet import Clarinet
 from src.simulation.physics import SimulationEngine
+from src.simulation.cache import ImpedanceCache
+from src.optimization import optimizer as optimizer_module
 from src.optimization.optimizer import Optimizer
 import numpy as np
 
@@ -31,3 +33,74 @@ def test_optimization():
     assert result['new_position'] != 0.5
     # Frequency should be closer (due to discrete freq steps in sim, might not be exact 0 error)
     # But new pos should be different.
+
+def test_tune_scale_joint():
+    clar = Clarinet.default_clarinet()
+    clar.add_fingering("low", "xo")
+    sim = SimulationEngine()
+    sim.frequencies = np.arange(100, 600, 5)
+
+    open_freq = sim.analyze_peaks(*sim.run_impedance_simulation(clar)).frequency[0]
+    low_freq = sim.simulate_fingerings(clar)["low"].peaks.frequency[0]
+    targets = [("low", low_freq * 2 ** (30 / 1200)), (None, open_freq * 2 ** (-20 / 1200))]
+
+    result = Optimizer(clar, sim).tune_scale(targets)
+
+    assert result["rms_cents"] < 1.0
+    assert result["simulations"] > 0 and result["wall_time"] > 0
+    # Holes stay ordered and separated by at least their radii
+    assert clar.holes[1].position - clar.holes[0].position > clar.holes[0].radius + clar.holes[1].radius
+    assert [h.position for h in clar.holes] == result["positions"]
+
+def test_tune_hole_position_surrogate():
+    clar = Clarinet.default_clarinet()
+    sim = SimulationEngine()
+    sim.frequencies = np.arange(100, 600, 2)
+
+    natural_freq = sim.detect_peaks(*sim.run_impedance_simulation(clar))[0][0]
+    result = Optimizer(clar, sim).tune_hole_position(natural_freq + 8, 0, search_range=0.04, surrogate=True)
+
+    assert result['success']
+    assert result['error'] < 0.2  # Hz, about 2 cents
+    assert result['solves'] < 10
+    assert np.isfinite(result['surrogate_rms_cents'])
+    assert result['solves_saved'] >= 0
+
+def test_surrogate_stays_within_the_bore():
+    clar = Clarinet.default_clarinet()
+    sim = SimulationEngine()
+    sim.backend = "tmm"
+    sim.frequencies = np.arange(100, 600, 2)
+    hole = clar.holes[1]
+    tried = []
+    # Far too low a target pulls the hole towards the bell, 5 cm beyond reach
+    result = Optimizer(clar, sim).tune_hole_position(100, 1, search_range=0.1, surrogate=True,
+                                                     progress=lambda *_: tried.append(hole.position))
+    bore_end = clar.bore[-1].position
+    assert max(tried) <= bore_end and result['new_position'] <= bore_end
+
+    with pytest.raises(ValueError):
+        Optimizer(clar, sim).tune_hole_position(150, 0, surrogate=True, max_refinements=0)
+
+def test_revisited_positions_reuse_early_stopped_sweeps():
+    clar = Clarinet.default_clarinet()
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.frequencies = np.arange(100, 600, 5)
+    optimizer = Optimizer(clar, sim)
+    first = optimizer.tune_hole_position(150, 0)
+    solved = sim.solve_count
+    assert solved < first['solves'] * len(sim.frequencies)  # Sweeps stopped early
+
+    clar.holes[0].position = 0.5
+    second = optimizer.tune_hole_position(150, 0)
+    assert sim.solve_count == solved and second['new_position'] == first['new_position']
+
+def test_early_stopped_sweep_memo_is_bounded(monkeypatch):
+    monkeypatch.setattr(optimizer_module, "PARTIAL_PEAKS_ENTRIES", 3)
+    clar = Clarinet.default_clarinet()
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.frequencies = np.arange(100, 600, 5)
+    optimizer = Optimizer(clar, sim)
+    result = optimizer.tune_hole_position(150, 0)
+    assert result['solves'] > 3
+    assert len(optimizer._partial_peaks) == 3
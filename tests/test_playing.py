@@ -0,0 +1,56 @@
+import wave
+import numpy as np
+import pytest
+from src.cli import main
+from src.models.clarinet import Clarinet
+from src.simulation.playing import PlayingSimulation, sounding_frequency
+
+def _design():
+    clar = Clarinet.default_clarinet()
+    clar.add_fingering("low", "xx")
+    return clar
+
+def test_sounding_frequency():
+    t = np.arange(4000) / 8000
+    tone = np.sign(np.sin(2 * np.pi * 147.3 * t))  # Square wave: odd harmonics, like the clarinet
+    assert sounding_frequency(tone, 8000) == pytest.approx(147.3, abs=0.2)
+    assert np.isnan(sounding_frequency(np.zeros(100), 8000))
+
+def test_chunks_cover_the_duration():
+    player = PlayingSimulation(_design(), sample_rate=8000)
+    assert player.dt * player.steps_per_sample * player.sample_rate == pytest.approx(1.0)
+    chunks = list(player.iter_chunks(0.02, chunk_size=64))
+    assert [(c.start, len(c.radiated)) for c in chunks] == [(0, 64), (64, 64), (128, 32)]
+    assert chunks[-1].stop == chunks[-1].total == 160
+    assert all(len(c.mouthpiece) == len(c.radiated) and c.real_time_factor > 0 for c in chunks)
+    # Every run starts again from silence
+    again = next(player.iter_chunks(0.01, chunk_size=64))
+    assert np.allclose(again.mouthpiece, chunks[0].mouthpiece)
+
+    with pytest.raises(ValueError):
+        PlayingSimulation(_design(), note="missing")
+    with pytest.raises(ValueError):
+        PlayingSimulation(_design(), sample_rate=0)
+    with pytest.raises(ValueError):
+        next(player.iter_chunks(0.0))
+
+def test_wav_output_plays_near_the_resonance(tmp_path):
+    path = str(tmp_path / "low.wav")
+    seen = []
+    result = PlayingSimulation(_design(), "low", sample_rate=22050).write_wav(
+        path, 0.1, chunk_size=1024, on_chunk=seen.append)
+    assert result.samples == 2205 and len(seen) == 3 and result.real_time_factor > 0
+    with wave.open(path) as f:
+        assert f.getnframes() == 2205 and f.getframerate() == 22050 and f.getsampwidth() == 2
+    # Both holes closed: the reed locks onto the first impedance peak (141 Hz), slightly flat
+    assert 136 < result.sounding_frequency < 141
+    assert result.rms_pressure > 0 and result.clipped == 0
+
+def test_cli_play(tmp_path):
+    design = tmp_path / "design.json"
+    _design().save_to_file(str(design))
+    out = tmp_path / "note.wav"
+    assert main(["play", str(design), "--note", "low", "--duration", "0.01", "--sample-rate", "8000",
+                 "--out", str(out), "--quiet"]) == 0
+    with wave.open(str(out)) as f:
+        assert f.getnframes() == 80
@@ -0,0 +1,132 @@
+import threading
+import time
+import pytest
+from src.simulation.jobs import Job, JobManager
+from src.simulation.service import ServiceBusy, SimulationService
+
+
+def wait(job, timeout=60):
+    start = time.time()
+    while job.active and time.time() - start < timeout:
+        time.sleep(0.01)
+    return job
+
+
+def started(log):
+    while not log:
+        time.sleep(0.01)
+
+
+def _gate():
+    """A work function that blocks until the returned event is set."""
+    release = threading.Event()
+
+    def work(job, name, log):
+        log.append(name)
+        release.wait(10)
+        return name
+    return work, release
+
+
+def test_sessions_take_turns_on_one_worker():
+    service = SimulationService(workers=1)
+    work, release = _gate()
+    log = []
+    jobs = [Job(0, "blocker", None)]
+    service.submit("x", jobs[0], work, ("blocker", log))
+    started(log)
+    # Session a queues three jobs before b queues one: b still goes second
+    for session, name in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1")]:
+        jobs.append(service.submit(session, Job(0, name, None), work, (name, log)))
+    assert service.queued_ahead(jobs[-1]) == 1 and service.queued_ahead(jobs[0]) is None
+    release.set()
+    for job in jobs:
+        wait(job)
+    assert log == ["blocker", "a1", "b1", "a2", "a3"]
+    assert all(job.status == "done" for job in jobs)
+    service.shutdown()
+
+
+def test_identical_requests_share_one_run():
+    service = SimulationService(workers=1)
+    work, release = _gate()
+    log = []
+    first = service.submit("a", Job(1, "simulation", None), work, ("run", log), key="simulation:abc")
+    second = service.submit("b", Job(1, "simulation", None), work, ("run", log), key="simulation:abc")
+    # Cancelling one subscriber leaves the run going for the other
+    second.cancel()
+    third = service.submit("c", Job(1, "simulation", None), work, ("run", log), key="simulation:abc")
+    release.set()
+    for job in (first, third):
+        assert wait(job).status == "done" and job.result == "run"
+    assert second.status == "cancelled" and second.result is None
+    assert log == ["run"]
+    stats = service.stats()
+    assert stats["submitted"] == 1 and stats["deduplicated"] == 2
+    # Finished runs are not shared: the same key runs again
+    again = wait(service.submit("a", Job(2, "simulation", None), work, ("again", log), key="simulation:abc"))
+    assert again.result == "again"
+    service.shutdown()
+
+
+def test_bounded_queue():
+    service = SimulationService(workers=1, max_queued=3, max_queued_per_session=2)
+    work, release = _gate()
+    log = []
+    service.submit("x", Job(0, "blocker", None), work, ("blocker", log))
+    started(log)
+    service.submit("a", Job(1, "a", None), work, ("a1", log))
+    waiting = service.submit("a", Job(2, "a", None), work, ("a2", log))
+    with pytest.raises(ServiceBusy):
+        service.submit("a", Job(3, "a", None), work, ("a3", log))
+    service.submit("b", Job(1, "b", None), work, ("b1", log))
+    with pytest.raises(ServiceBusy):
+        service.submit("c", Job(1, "c", None), work, ("c1", log))
+    # A cancelled waiting job gives its slot back
+    waiting.cancel()
+    later = service.submit("c", Job(1, "c", None), work, ("c1", log))
+    assert waiting.status == "cancelled" and service.stats()["rejected"] == 2
+    release.set()
+    assert wait(later).status == "done" and "a2" not in log
+    service.shutdown()
+
+
+def test_job_manager_on_a_service():
+    service = SimulationService(workers=1)
+    managers = [JobManager(service=service, session=name) for name in "ab"]
+    jobs = [manager.submit("simulation", lambda job, x: x * 2, 21, dedup_key="k") for manager in managers]
+    assert [wait(job).result for job in jobs] == [42, 42]
+
+    def failing(job):
+        raise RuntimeError("Simulation failed: singular matrix")
+    failed = wait(managers[0].submit("simulation", failing))
+    assert failed.status == "failed" and "singular" in failed.error
+    service.shutdown()
+
+
+def test_refused_job_leaves_the_previous_one_running():
+    service = SimulationService(workers=1, max_queued=1, max_queued_per_session=1)
+    work, release = _gate()
+    log = []
+    manager = JobManager(service=service, session="a")
+    running = manager.submit("simulation", work, "first", log)
+    started(log)
+    service.submit("b", Job(1, "other", None), work, ("b1", log))
+    with pytest.raises(ServiceBusy):
+        manager.submit("simulation", work, "second", log)
+    assert running.status == "running" and not running.cancel_requested
+    assert manager.get("simulation") is running
+
+    # A waiting job of the same kind gives its slot to the one replacing it
+    release.set()
+    wait(running)
+    release.clear()
+    blocker = service.submit("c", Job(1, "blocker", None), work, ("c1", log))
+    while blocker.status != "running":
+        time.sleep(0.01)
+    waiting = manager.submit("simulation", work, "third", log)
+    latest = manager.submit("simulation", work, "fourth", log)
+    assert waiting.status == "cancelled" and manager.get("simulation") is latest
+    release.set()
+    assert wait(latest).result == "fourth" and "third" not in log
+    service.shutdown()
@@ -0,0 +1,133 @@
+import copy
+import pytest
+import numpy as np
+from src.models.clarinet import Clarinet
+from src.simulation.physics import SimulationEngine
+from src.simulation.cache import ImpedanceCache
+from src.simulation.session import SimulationSession, _IncrementalSolver
+
+FREQS = np.arange(100, 500, 10)
+
+def _fresh_impedance(clar, temperature=25, frequencies=FREQS):
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.frequencies = frequencies
+    sim.temperature = temperature
+    return sim.run_impedance_simulation(clar)[1]
+
+def test_session_updates_match_fresh_solves():
+    clar = Clarinet.default_clarinet()
+    session = SimulationSession(clar, FREQS)
+    _, imp = session.solve()
+    assert np.allclose(imp, _fresh_impedance(clar))
+
+    moved = copy.deepcopy(clar)
+    moved.holes[0].position = 0.48
+    moved.holes[1].radius = 0.003
+    session.move_hole(0, 0.48)
+    session.resize_hole(1, radius=0.003)
+    _, imp = session.solve()
+    assert session.last_timings["geometry"] == 0.0
+    assert np.allclose(imp, _fresh_impedance(moved))
+
+    session.set_temperature(30)
+    _, imp = session.solve()
+    assert np.allclose(imp, _fresh_impedance(moved, temperature=30))
+
+    session.set_frequencies(FREQS[:20])
+    freqs, imp = session.solve()
+    assert len(freqs) == 20
+    assert np.allclose(imp, _fresh_impedance(moved, 30, FREQS[:20]))
+
+def test_session_reuses_unchanged_pipes():
+    clar = Clarinet.default_clarinet()
+    session = SimulationSession(clar, FREQS)
+    session.solve()
+    session.move_hole(1, 0.56)
+    session.solve()
+    session.move_hole(1, 0.57)
+    session.solve()
+
+    report = session.timing_report()
+    assert report["pipes_reused"] > 0
+    assert report["solve_total"] > 0 and report["setup_total"] > 0
+
+def test_session_without_openwind_internals_assembles_normally(monkeypatch):
+    # Stands in for an OpenWind version whose pipes lack the memoized methods
+    monkeypatch.setattr(_IncrementalSolver, "_can_memoize", staticmethod(lambda f_pipe: False))
+    clar = Clarinet.default_clarinet()
+    session = SimulationSession(clar, FREQS)
+    session.solve()
+    session.move_hole(1, 0.56)
+    _, imp = session.solve()
+    moved = copy.deepcopy(clar)
+    moved.holes[1].position = 0.56
+    assert np.allclose(imp, _fresh_impedance(moved))
+    assert session.timing_report()["pipes_reused"] == 0
+
+def test_session_ignores_label_edits():
+    clar = Clarinet.default_clarinet()
+    session = SimulationSession(clar, FREQS)
+    session.solve()
+
+    relabelled = copy.deepcopy(clar)
+    relabelled.holes[0].label = "Register"
+    session.set_clarinet(relabelled)
+    assert session._stale == set()
+    assert session.clarinet.holes[0].label == "Register"
+
+def test_session_fingering_closes_holes():
+    clar = Clarinet.default_clarinet()
+    session = SimulationSession(clar, FREQS)
+    _, open_imp = session.solve()
+    session.set_fingering([False, False])
+    _, closed_imp = session.solve()
+    assert not np.allclose(open_imp, closed_imp)
+    session.set_fingering(None)
+    _, reopened = session.solve()
+    assert np.allclose(open_imp, reopened)
+
+def test_simulate_fingerings_switches_notes(tmp_path):
+    clar = Clarinet.default_clarinet()
+    clar.add_fingering("low", "xx")
+    clar.add_fingering("mid", "xo")
+    clar.add_fingering("high", "oo")
+
+    # Chart survives the JSON round trip
+    path = tmp_path / "design.json"
+    clar.save_to_file(str(path))
+    clar = Clarinet.load_from_file(str(path))
+    assert clar.fingerings == {"low": "xx", "mid": "xo", "high": "oo"}
+
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.frequencies = FREQS
+    results = sim.simulate_fingerings(clar)
+    assert list(results) == ["low", "mid", "high"]
+    firsts = [results[n].peaks.frequency[0] for n in results]
+    # Opening holes shortens the effective tube and raises the first resonance
+    assert firsts[0] < firsts[1] < firsts[2]
+    assert np.allclose(results["high"].impedance, _fresh_impedance(clar))
+
+    again = sim.simulate_fingerings(clar, notes=["mid"])
+    assert again["mid"].cached
+    with pytest.raises(ValueError, match="Unknown note: nope"):
+        sim.simulate_fingerings(clar, notes=["mid", "nope"])
+
+def test_streamed_sweep_matches_full_solve():
+    clar = Clarinet.default_clarinet()
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.frequencies = FREQS
+    updates = list(sim.iter_impedance_simulation(clar, n_blocks=4))
+
+    assert len(updates) == 4 and updates[-1].done
+    assert [u.n_new for u in updates] == [10] * 4
+    n_peaks = [len(u.peaks) for u in updates]
+    assert n_peaks == sorted(n_peaks) and n_peaks[-1] > 0
+    np.testing.assert_allclose(updates[-1].impedance, _fresh_impedance(clar), rtol=1e-10)
+
+    # Stopping early leaves nothing in the cache; a complete sweep is cached
+    sim.cache = ImpedanceCache()
+    for update in sim.iter_impedance_simulation(clar, n_blocks=4):
+        break
+    assert sim.cache.get(sim.cache_key(clar)) is None
+    list(sim.iter_impedance_simulation(clar, n_blocks=4))
+    assert sim.cache.get(sim.cache_key(clar)) is not None
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from src.models.clarinet import Clarinet
+from src.simulation.archive import ResultArchive
+from src.simulation.cache import ImpedanceCache
+from src.simulation.physics import SimulationEngine
+from src.simulation.sweep import apply_parameters, run_sweep, sampled_sweep, sweep_points
+
+def _engine():
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.frequencies = np.arange(100, 600, 10)
+    return sim
+
+def test_sampled_sweeps_are_reproducible_and_in_range():
+    clar = Clarinet.default_clarinet()
+    ranges = {"hole.0.position": [0.48, 0.52], "bore.radius@0.3": [0.007, 0.008], "temperature": [15, 25]}
+    for method in ("lhs", "sobol"):
+        points = sampled_sweep(clar, ranges, 8, method, seed=3)
+        again = sampled_sweep(clar, ranges, 8, method, seed=3)
+        assert [p.values for p in points] == [p.values for p in again]
+        positions = [p.clarinet.holes[0].position for p in points]
+        assert min(positions) >= 0.48 and max(positions) <= 0.52 and len(set(positions)) == 8
+        assert all(15 <= p.overrides["temperature"] <= 25 for p in points)
+
+    # A bore station that is not a profile point is inserted
+    design, _ = apply_parameters(clar, {"bore.radius@0.3": 0.0072})
+    assert len(design.bore) == len(clar.bore) + 1 and design.bore[1].radius == 0.0072
+    # Stations at the ends change the end radius; beyond them would lengthen the bore
+    assert apply_parameters(clar, {"bore.radius@0.6": 0.008})[0].bore[-1].radius == 0.008
+    with pytest.raises(ValueError):
+        apply_parameters(clar, {"bore.radius@0.7": 0.008})
+
+    with pytest.raises(ValueError):
+        sweep_points(clar, {"method": "halton", "samples": 4, "parameters": ranges})
+
+def test_sweep_table_sensitivity_and_resume(tmp_path):
+    clar = Clarinet.default_clarinet()
+    spec = {"method": "lhs", "samples": 6, "parameters": {"hole.0.position": [0.47, 0.53], "temperature": [15, 30]}}
+    points = sweep_points(clar, spec)
+    archive = ResultArchive(str(tmp_path))
+
+    results = run_sweep(points[:4], _engine(), archive)   # "Interrupted" after 4 designs
+    assert results.status == ["ok"] * 4
+
+    calls = []
+    results = run_sweep(points, _engine(), ResultArchive(str(tmp_path)),
+                        progress=lambda done, total, message="": calls.append((done, total)))
+    assert results.status == ["archived"] * 4 + ["ok"] * 2
+    assert calls[0] == (4, 6) and calls[-1] == (6, 6)
+
+    table = results.table(n_modes=2)
+    assert list(table.columns[:4]) == ["sample", "name", "hole.0.position", "temperature"]
+    assert len(table) == 12 and set(table["mode"]) == {1, 2}
+
+    # Fundamental rises with temperature (speed of sound) and falls as the open hole moves down the bore
+    sens = results.sensitivity(mode=1)
+    assert sens["temperature"] > 0 and sens["hole.0.position"] < 0
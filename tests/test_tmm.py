@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from src.models.clarinet import Clarinet
+from src.simulation.cache import ImpedanceCache
+from src.simulation.physics import SimulationEngine
+from src.simulation.tmm import tmm_impedance
+from src.simulation.validation import compare_backends
+
+def _engine(backend, frequencies=np.arange(50, 1500, 5)):
+    sim = SimulationEngine(cache=ImpedanceCache())
+    sim.frequencies = frequencies
+    sim.backend = backend
+    return sim
+
+def test_tmm_matches_fem():
+    clar = Clarinet.default_clarinet()
+    clar.add_bore_point(0.66, 0.02)  # Conical bell
+    result = compare_backends(clar, _engine("fem"), n_modes=4)
+    assert np.all(np.isfinite(result.peak_error_cents))
+    assert result.max_peak_error_cents < 0.5
+    assert result.max_magnitude_error_db < 0.1
+    assert result.as_row()["Design"] == clar.name
+
+def test_backend_is_part_of_the_result_key():
+    clar = Clarinet.default_clarinet()
+    fem, tmm = _engine("fem"), _engine("tmm")
+    # FEM keys are unchanged, so existing caches and archives stay valid
+    assert fem.cache_key(clar) == ImpedanceCache.make_key(
+        clar.bore_array(), clar.holes_array(), fem.temperature, fem.losses, fem.frequencies)
+    assert tmm.cache_key(clar) != fem.cache_key(clar)
+    assert SimulationEngine.from_config(tmm.config()).backend == "tmm"
+
+    freqs, imp = tmm.run_impedance_simulation(clar)
+    updates = list(tmm.iter_impedance_simulation(clar))
+    assert len(updates) == 1 and updates[0].cached
+    assert np.array_equal(updates[0].impedance, imp)
+
+    tmm.backend = "bem"
+    with pytest.raises(ValueError):
+        tmm.cache_key(clar)
+
+def test_closed_holes_and_fingerings():
+    clar = Clarinet.default_clarinet()
+    clar.add_fingering("low", "xx")
+    clar.add_fingering("open", "oo")
+    sim = _engine("tmm")
+    freqs = sim.frequencies
+    closed = tmm_impedance(clar.bore_array(), clar.holes_array(), sim.temperature, freqs, open_holes=[False, False])
+    opened = tmm_impedance(clar.bore_array(), clar.holes_array(), sim.temperature, freqs)
+
+    results = sim.simulate_fingerings(clar)
+    assert np.allclose(results["low"].impedance, closed)
+    assert np.allclose(results["open"].impedance, opened)
+    # Closing the holes lengthens the air column
+    assert results["low"].peaks.frequency[0] < results["open"].peaks.frequency[0]
+
+    with pytest.raises(ValueError):
+        tmm_impedance(clar.bore_array(), [[0.7, 0.002, 0.005]], sim.temperature, freqs)
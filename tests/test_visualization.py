@@ -0,0 +1,18 @@
+import numpy as np
+from src.ui.visualization import decimate_minmax
+
+def test_decimation_keeps_peaks_and_dips():
+    freqs = np.linspace(20, 2500, 200_000)
+    signal = np.sin(freqs / 7.0) + 0.1 * np.sin(freqs * 3.1)
+    signal[123_457] = 5.0   # isolated narrow peak
+    signal[5] = -5.0        # and dip
+
+    x, y = decimate_minmax(freqs, signal, max_points=1000)
+    assert len(x) <= 1002
+    assert np.all(np.diff(x) > 0)
+    assert x[0] == freqs[0] and x[-1] == freqs[-1]
+    assert y.max() == 5.0 and y.min() == -5.0
+    assert freqs[123_457] in x
+
+    short_x, short_y = decimate_minmax(freqs[:50], signal[:50])
+    assert len(short_x) == 50